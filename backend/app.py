@@ -4,15 +4,45 @@ AI-powered virtual wardrobe with cloth changing capabilities
 Weather-based outfit suggestions
 """
 
-from flask import Flask, request, jsonify, send_from_directory # Import Flask framework and necessary modules
+from flask import Flask, Request, Response, g, request, jsonify, redirect, send_file, send_from_directory # Import Flask framework and necessary modules
 from flask_cors import CORS # Import CORS for cross-origin resource sharing
-from pymongo import MongoClient # Import MongoDB client for database operations
 import os # Import os module for file system operations
 import base64 # Import base64 for image encoding/decoding
-from io import BytesIO # Import BytesIO for handling binary data in memory
+from io import BytesIO # Import BytesIO for in-memory upload buffers
+import json # Import json for streaming job events
 from PIL import Image # Import PIL (Pillow) for image processing
 import hashlib # Import hashlib for generating file hashes
 from datetime import datetime # Import datetime for timestamp operations
+import threading # Import threading for lazily created shared executors
+import multiprocessing # Import multiprocessing to preload worker modules in the forkserver
+import time # Import time for request timing
+import logging # Import logging for structured log records
+import sys # Import sys to hand this module to the async server
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError # Import thread pool for batch rendering
+from result_cache import ResultCache, digest_bytes, make_cache_key # Import content-addressed result cache
+from storage import FileStore # Import sharded file storage with TTL/quota sweeping
+from imaging import OUTPUT_FORMATS, OUTPUT_FORMAT_ALIASES, render_cloth_change, render_cloth_change_batch # Import image processing pipeline
+from ingest import ImageTooLargeError, InvalidImageError, UploadTooLargeError, read_upload # Import upload validation
+from werkzeug.exceptions import RequestEntityTooLarge # Import 413 error raised while parsing uploads
+from werkzeug.security import safe_join # Import path joining that refuses to leave a directory
+from logs import configure_logging # Import queued JSON logging
+from metrics import LATENCY_BUCKETS, SIZE_BUCKETS, MetricsRegistry, stats_gauges, timed_stage # Import Prometheus-style metrics
+from static_files import StaticAssets # Import hashed, precompressed static file serving
+from variants import VariantCache, negotiate_format, snap_width, variant_key # Import resized image variants
+from pymongo.errors import ConnectionFailure # Import driver error for unreachable/timed out servers
+from jobs import JobQueue, QueueFullError # Import background job queue for try-on rendering
+from mongo import DatabaseUnavailableError, MongoConnection # Import lazy pooled MongoDB connection
+from wardrobe import QueryError, build_list_query, fetch_page, iter_documents # Import paginated wardrobe queries
+from wardrobe_cache import LocalGenerations, SharedGenerations, WardrobeCache # Import read-through wardrobe cache
+from outfits import OUTFIT_SLOTS, OutfitScorer # Import server-side outfit scoring
+from garment_analysis import ANALYSIS_VERSION, analyze_garment_file # Import garment color and pattern extraction
+from similarity import DUPLICATE_COLOR_DISTANCE, DUPLICATE_HASH_BITS, SimilarityIndex, image_features, image_features_file # Import memory-mapped image similarity index
+from outfit_generator import OutfitGenerator # Import vectorized top-K outfit generation
+from bulk import import_items, iter_array, iter_ndjson # Import batched wardrobe import
+from weather import MOCK_CITIES, WeatherService # Import indexed weather data and memoised suggestions
+from weather_providers import DatasetWeatherProvider, StaticWeatherProvider # Import offline weather sources
+from async_server import run_async_server # Import aiohttp server (Motor wardrobe routes, process-pool rendering)
+from wardrobe import EXPLAIN_PATTERNS, WARDROBE_INDEXES, ensure_indexes, explain_lookup, explain_query # Import index management and query diagnostics
 
 # Get base directories
 BASE_DIR = os.path.dirname(os.path.abspath(__file__)) # Get current file directory
@@ -20,201 +50,1130 @@ PROJECT_ROOT = os.path.dirname(BASE_DIR) # Get project root directory (one level
 FRONTEND_DIR = os.path.join(PROJECT_ROOT, 'frontend') # Get frontend directory path
 
 app = Flask(__name__, # Create Flask application instance
-            static_folder=FRONTEND_DIR, # Set static files directory
-            static_url_path='', # Set static URL path to root
+            static_folder=None, # Static files are served by serve_static (hashed, precompressed)
             template_folder=FRONTEND_DIR) # Set template directory
-CORS(app)  # Enable CORS for all routes to allow cross-origin requests
-
-# MongoDB Connection
-try: # Try to establish MongoDB connection
-    # Your MongoDB connection string
-    client = MongoClient("mongodb+srv://wardrobeUser:") # Connect to MongoDB Atlas
-    db = client["smartwardrobe"] # Get database instance
-    clothes = db["clothes"] # Get clothes collection
-    print("Successfully connected to MongoDB!") # Print success message
-except Exception as e: # Catch any connection errors
-    print(f"MongoDB connection failed: {e}") # Print error message
-    client = None # Set client to None if connection fails
-    db = None # Set database to None if connection fails
-    clothes = None # Set collection to None if connection fails
+CORS(app, expose_headers=['X-Next-Cursor', 'X-Result-Url', 'X-Cache', 'X-Total-Combinations'])  # Enable CORS for all routes to allow cross-origin requests
 
 # Configuration
 UPLOAD_FOLDER = os.path.join(PROJECT_ROOT, 'frontend', 'assets', 'uploads') # Path to upload directory
 RESULTS_FOLDER = os.path.join(PROJECT_ROOT, 'frontend', 'assets', 'results') # Path to results directory
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB - Maximum file size for uploads
+MAX_REQUEST_SIZE = int(os.environ.get('MAX_REQUEST_SIZE', 64 * 1024 * 1024)) # 64MB - Maximum request body (batch uploads)
+RETAIN_UPLOADS = os.environ.get('RETAIN_UPLOADS', '').lower() in ('1', 'true', 'yes') # Keep copies of uploads in UPLOAD_FOLDER
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp'} # Allowed image file extensions
+MAX_RESULT_WIDTH = 4096 # Largest result width a client may request
+RESULT_CACHE_MEMORY_BYTES = int(os.environ.get('RESULT_CACHE_MEMORY_BYTES', 64 * 1024 * 1024)) # 64MB - In-memory result cache budget
+RESULT_CACHE_DISK_BYTES = int(os.environ.get('RESULT_CACHE_DISK_BYTES', 1024 * 1024 * 1024)) # 1GB - Quota for RESULTS_FOLDER
+RESULTS_TTL_SECONDS = int(os.environ.get('RESULTS_TTL_SECONDS', 30 * 24 * 3600)) # 30 days - Unused results are deleted after this
+UPLOADS_MAX_BYTES = int(os.environ.get('UPLOADS_MAX_BYTES', 1024 * 1024 * 1024)) # 1GB - Quota for UPLOAD_FOLDER
+UPLOADS_TTL_SECONDS = int(os.environ.get('UPLOADS_TTL_SECONDS', 7 * 24 * 3600)) # 7 days - Retained uploads are deleted after this
+STORAGE_SWEEP_INTERVAL_SECONDS = int(os.environ.get('STORAGE_SWEEP_INTERVAL_SECONDS', 300)) # How often TTL/quota sweeps run
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', min(4, os.cpu_count() or 1))) # Number of try-on worker processes
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 32)) # Maximum unfinished jobs before returning 429
+JOB_START_METHOD = os.environ.get('JOB_START_METHOD', 'forkserver' if os.name == 'posix' else 'spawn') # How worker processes start (fork can deadlock on locks held by busy threads)
+JOB_TTL_SECONDS = 600 # How long finished jobs stay available for polling
+JOB_MAX_WAIT_SECONDS = 30 # Longest a single long-poll may block
+JOB_EVENT_INTERVAL_SECONDS = 1 # Heartbeat interval for the job event stream
+JOB_RETRY_AFTER_SECONDS = 2 # Retry-After hint sent with 429 responses
+MAX_BATCH_GARMENTS = 12 # Maximum garments per batch try-on request
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', os.cpu_count() or 1)) # Threads rendering batch garments in parallel
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 500)) # Items per insert_many during bulk imports
+MAX_IMPORT_ITEMS = int(os.environ.get('MAX_IMPORT_ITEMS', 50000)) # Largest number of items one import request may contain
+MONGO_URI = os.environ.get('MONGODB_URI', 'mongodb+srv://wardrobeUser:') # MongoDB Atlas connection string
+MONGO_DATABASE = os.environ.get('MONGO_DATABASE', 'smartwardrobe') # Database holding the clothes collection
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 20)) # Maximum pooled connections per process
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)) # Connections kept open while idle (0 = none, best for serverless)
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 3000)) # How long a request waits for a usable server
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000)) # TCP/TLS connect timeout
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 15000)) # Longest a single database operation may block
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 60000)) # Idle pooled connections are closed after this
+MONGO_RETRY_MAX_SECONDS = int(os.environ.get('MONGO_RETRY_MAX_SECONDS', 60)) # Longest backoff between failed client creations
+OUTFIT_DATA_PATH = os.path.join(FRONTEND_DIR, 'outfit-intelligence-data.js') # Outfit intelligence rules shared with the frontend
+MAX_OUTFIT_ITEMS = int(os.environ.get('MAX_OUTFIT_ITEMS', 5000)) # Largest wardrobe an outfit ranking request may use
+MAX_OUTFIT_RESULTS = 100 # Most outfits one ranking request may return
+MAX_GENERATED_OUTFITS = int(os.environ.get('MAX_GENERATED_OUTFITS', 10000)) # Most outfits one generate request may return
+OUTFIT_BLOCK_ELEMENTS = int(os.environ.get('OUTFIT_BLOCK_ELEMENTS', 2_000_000)) # Outfit combinations scored per NumPy block (bounds memory)
+OUTFIT_STREAM_CHUNK = 500 # Outfits scored and sent per chunk when streaming
+WEATHER_CACHE_SIZE = int(os.environ.get('WEATHER_CACHE_SIZE', 1024)) # Memoised weather suggestion responses
+WEATHER_CACHE_TTL_SECONDS = int(os.environ.get('WEATHER_CACHE_TTL_SECONDS', 600)) # 10 minutes - Age after which a suggestion is rebuilt
+MAX_WEATHER_BATCH_CITIES = 50 # Most cities one weather suggestion request may ask for
+MAX_CITY_SUGGESTIONS = 20 # Most names one city autocomplete request may return
+WEATHER_DATASET = os.environ.get('WEATHER_DATASET', '') # Memory-mapped weather dataset file (built-in cities when unset)
+MAX_FORECAST_DAYS = 16 # Most days one forecast request may ask for
+DERIVED_FOLDER = os.path.join(PROJECT_ROOT, 'frontend', 'assets', 'derived') # Path to resized image variants
+DERIVED_MAX_BYTES = int(os.environ.get('DERIVED_MAX_BYTES', 256 * 1024 * 1024)) # 256MB - Quota for DERIVED_FOLDER
+DERIVED_TTL_SECONDS = int(os.environ.get('DERIVED_TTL_SECONDS', 30 * 24 * 3600)) # 30 days - Unused variants are deleted after this
+VARIANT_WORKERS = int(os.environ.get('VARIANT_WORKERS', 2)) # Threads rendering image variants
+VARIANT_WAIT_SECONDS = 5 # Longest a request waits for a variant before redirecting to the original
+VARIANT_MAX_AGE_SECONDS = 365 * 24 * 3600 # Browser cache lifetime of variants of never-rewritten uploads/results
+VARIANT_REVALIDATE_SECONDS = 3600 # Browser cache lifetime of variants of other assets (then revalidated by ETag)
+GRID_VARIANT_WIDTHS = (240, 480) # Thumbnail widths of the wardrobe grid (1x and 2x), rendered when an item is added
+MAX_WARM_IMAGES = 200 # Most images one warm request may list
+MAX_WARM_WIDTHS = 16 # Most widths one warm request may list (they snap to the variant ladder)
+ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', 1)) # Worker processes extracting garment colors and patterns
+ANALYSIS_QUEUE_SIZE = int(os.environ.get('ANALYSIS_QUEUE_SIZE', 1000)) # Unfinished analyses before new ones are skipped (left for the backfill)
+MAX_ANALYZE_ITEMS = 1000 # Most items one analysis backfill request may queue
+SIMILARITY_INDEX_FILE = os.environ.get('SIMILARITY_INDEX_FILE', os.path.join(BASE_DIR, '.similarity-index')) # Feature rows of indexed images (memory-mapped)
+DEDUPLICATE_UPLOADS = os.environ.get('DEDUPLICATE_UPLOADS', '1').lower() in ('1', 'true', 'yes') # Name retained uploads by content so identical ones are stored once
+MAX_SIMILAR_RESULTS = 50 # Most neighbours one similarity query may return
+MAX_SIMILAR_QUERIES = 20 # Most images one batched similarity request may ask about
+WARDROBE_CACHE_ITEMS = int(os.environ.get('WARDROBE_CACHE_ITEMS', 10000)) # Wardrobe items kept in the read-through cache
+WARDROBE_CACHE_PAGES = int(os.environ.get('WARDROBE_CACHE_PAGES', 2000)) # Wardrobe listing pages kept in the read-through cache
+WARDROBE_CACHE_TTL_SECONDS = int(os.environ.get('WARDROBE_CACHE_TTL_SECONDS', 300)) # 5 minutes - Bounds staleness from writes made outside this app
+WARDROBE_CACHE_SHARED_FILE = os.environ.get('WARDROBE_CACHE_SHARED_FILE', '') # Invalidation file shared by worker processes (per process when unset)
+ENSURE_INDEXES = os.environ.get('ENSURE_INDEXES', '1').lower() in ('1', 'true', 'yes') # Create missing wardrobe indexes at startup
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO') # Minimum level of log records written
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json') # json (one object per line) or text
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', 2)) # Requests slower than this are logged as warnings
+SERVER_MODE = os.environ.get('SERVER_MODE', 'async') # async (aiohttp server, see async_server.py) or threaded (Flask's threaded WSGI server)
+SERVER_HOST = os.environ.get('HOST', '0.0.0.0') # Interface the server listens on
+SERVER_PORT = int(os.environ.get('PORT', 5000)) # Port the server listens on
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', min(4, os.cpu_count() or 1))) # Processes rendering change_cloth results (async server)
+RENDER_QUEUE_SIZE = int(os.environ.get('RENDER_QUEUE_SIZE', 64)) # Unfinished change_cloth renders before returning 429 (async server)
+WSGI_THREADS = int(os.environ.get('WSGI_THREADS', 8)) # Threads running the Flask routes the async server does not serve itself
 
-# Create necessary directories
-os.makedirs(UPLOAD_FOLDER, exist_ok=True) # Create upload directory if it doesn't exist
-os.makedirs(RESULTS_FOLDER, exist_ok=True) # Create results directory if it doesn't exist
+logger = logging.getLogger('smart_wardrobe')
 
+# Request, stage and MongoDB command timings, exposed on /metrics
+metrics = MetricsRegistry('smartwardrobe')
+REQUEST_SECONDS = metrics.histogram('http_request_duration_seconds', 'Time to produce a response (streamed bodies excluded)',
+                                    ('method', 'route', 'status'), LATENCY_BUCKETS)
+REQUEST_BYTES = metrics.histogram('http_request_size_bytes', 'Request body size', ('method', 'route'), SIZE_BUCKETS)
+RESPONSE_BYTES = metrics.histogram('http_response_size_bytes', 'Response body size (when known up front)',
+                                   ('method', 'route'), SIZE_BUCKETS)
+STAGE_SECONDS = metrics.histogram('stage_duration_seconds', 'Time spent in each stage of a request', ('route', 'stage'),
+                                  LATENCY_BUCKETS)
+MONGO_SECONDS = metrics.histogram('mongo_command_duration_seconds', 'MongoDB command round trips',
+                                  ('command', 'outcome'), LATENCY_BUCKETS)
 
-def allowed_file(filename): # Function to check if file extension is allowed
-    """Check if file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS # Check if file has valid extension
+# Worker pool for asynchronous try-on jobs (processes are started on first submit)
+job_queue = JobQueue(JOB_WORKERS, JOB_QUEUE_SIZE, JOB_TTL_SECONDS, JOB_START_METHOD)
 
+# Worker pool extracting colors and patterns of added garments (processes are started on first submit)
+analysis_queue = JobQueue(ANALYSIS_WORKERS, ANALYSIS_QUEUE_SIZE, JOB_TTL_SECONDS, JOB_START_METHOD)
 
-def generate_unique_filename(original_filename): # Function to generate unique filename
-    """Generate unique filename using hash and timestamp"""
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S') # Get current timestamp in YYYYMMDD_HHMMSS format
-    hash_obj = hashlib.md5(original_filename.encode()) # Create MD5 hash of original filename
-    hash_str = hash_obj.hexdigest()[:8] # Get first 8 characters of hash
-    ext = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else 'png' # Get file extension or default to png
-    return f"{timestamp}_{hash_str}.{ext}" # Return unique filename with timestamp and hash
+# Modules worker processes run; the forkserver imports them once and forks every worker from there
+WORKER_MODULES = ['imaging', 'garment_analysis', 'similarity']
+
+# Storage, caches, static assets, the similarity index and weather data are built by create_app(),
+# not at import, so nothing here opens files or starts threads in a process that merely imports the module
+upload_store = result_store = derived_store = None
+static_assets = None
+variant_cache = None
+result_cache = None
+similarity_index = None
+weather_provider = weather_service = None
+wardrobe_cache = None
+app_ready = False
+app_lock = threading.Lock()
+
+# Thread pool shared by batch requests (created on first use)
+batch_executor = None
+batch_executor_lock = threading.Lock()
+
+# Outfit scoring rules (compiled on first use)
+outfit_scorer = None
+outfit_scorer_lock = threading.Lock()
 
+# MongoDB connection, created on the first request that needs it
+mongo = MongoConnection(
+    MONGO_URI, MONGO_DATABASE,
+    retry_max_seconds=MONGO_RETRY_MAX_SECONDS,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+    appname='smart-wardrobe',
+    command_observer=lambda command, seconds, succeeded: MONGO_SECONDS.observe(
+        seconds, command, 'success' if succeeded else 'failure'))
 
-def mock_ai_cloth_change(person_image, garment_image):
+# Outcome of the index build, reported by /api/wardrobe/explain
+index_status = {'ensured': False, 'indexes': [], 'error': None}
+
+
+def ensure_wardrobe_indexes(database):
+    """Create missing wardrobe indexes; runs on a background thread so the first request is not delayed"""
+    try:
+        index_status['indexes'] = ensure_indexes(database['clothes'])
+        index_status['ensured'] = True
+        index_status['error'] = None
+        logger.info('Wardrobe indexes ready', extra={'indexes': index_status['indexes']})
+    except Exception as e:
+        index_status['error'] = str(e)
+        logger.exception('Creating wardrobe indexes failed')
+
+
+def create_app():
     """
-    Mock AI cloth changing function
-    In production, this would call a real AI model like:
-    - Stable Diffusion with ControlNet
-    - Virtual Try-On models (VITON, HR-VITON)
-    - Custom-trained models
-    
-    For now, it creates a simple composite image
+    Build the shared components once and return the Flask app
+    Used by serve.py, the async server and anything else that serves or
+    drives the app; later calls return the same app
     """
-    try:
-        # Open images
-        person = Image.open(person_image).convert('RGBA')
-        garment = Image.open(garment_image).convert('RGBA')
+    global upload_store, result_store, derived_store, static_assets, variant_cache, result_cache
+    global similarity_index, weather_provider, weather_service, wardrobe_cache, app_ready
+    with app_lock:
+        if app_ready:
+            return app
         
-        # Resize person image to max 1024px while maintaining aspect ratio
-        max_size = 1024
-        if person.width > max_size or person.height > max_size:
-            person.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        # Log records are formatted on the request thread and written by a background thread
+        configure_logging(LOG_LEVEL, LOG_FORMAT)
+        if JOB_START_METHOD == 'forkserver':
+            multiprocessing.set_forkserver_preload(WORKER_MODULES)
         
-        # Create a new image for the result
-        result = Image.new('RGBA', person.size, (255, 255, 255, 0))
-        result.paste(person, (0, 0))
+        # Create necessary directories
+        os.makedirs(UPLOAD_FOLDER, exist_ok=True) # Create upload directory if it doesn't exist
+        os.makedirs(RESULTS_FOLDER, exist_ok=True) # Create results directory if it doesn't exist
+        os.makedirs(DERIVED_FOLDER, exist_ok=True) # Create derived image directory if it doesn't exist
         
-        # Calculate garment position (center on torso area)
-        garment_width = int(person.width * 0.55)
-        garment_height = int(garment_width * garment.height / garment.width)
-        garment_resized = garment.resize((garment_width, garment_height), Image.Resampling.LANCZOS)
+        # Sharded, indexed storage for uploads and results, swept in the background
+        upload_store = FileStore(UPLOAD_FOLDER, UPLOADS_TTL_SECONDS, UPLOADS_MAX_BYTES)
+        result_store = FileStore(RESULTS_FOLDER, RESULTS_TTL_SECONDS, RESULT_CACHE_DISK_BYTES)
+        derived_store = FileStore(DERIVED_FOLDER, DERIVED_TTL_SECONDS, DERIVED_MAX_BYTES)
+        for store in (upload_store, result_store, derived_store):
+            store.start_sweeper(STORAGE_SWEEP_INTERVAL_SECONDS)
         
-        # Position garment on torso (roughly center-top area)
-        x_offset = (person.width - garment_width) // 2
-        y_offset = int(person.height * 0.32)
+        # Frontend pages and assets, hashed and compressed once (uploads/results/variants are served from disk)
+        static_assets = StaticAssets(FRONTEND_DIR, exclude=[UPLOAD_FOLDER, RESULTS_FOLDER, DERIVED_FOLDER])
         
-        # Create a semi-transparent version for blending
-        garment_layer = Image.new('RGBA', person.size, (255, 255, 255, 0))
-        garment_layer.paste(garment_resized, (x_offset, y_offset))
+        # Thumbnails and responsive variants of frontend/assets images, rendered on demand
+        variant_cache = VariantCache(derived_store, VARIANT_WORKERS)
         
-        # Blend the garment with the person image
-        result = Image.alpha_composite(result, garment_layer)
+        # Result cache keyed on the uploaded bytes of both images
+        result_cache = ResultCache(result_store, RESULT_CACHE_MEMORY_BYTES)
         
-        # Convert back to RGB
-        result_rgb = Image.new('RGB', result.size, (255, 255, 255))
-        result_rgb.paste(result, mask=result.split()[3])
+        # Features of garment images, uploads and results for "find similar" (mapped now, appended to as images arrive)
+        similarity_index = SimilarityIndex(SIMILARITY_INDEX_FILE)
+        # Swept uploads and results leave the index too, so their rows are compacted away
+        for store in (upload_store, result_store):
+            store.add_delete_listener(lambda name, store=store: similarity_index.remove(asset_path(store.path_for(name))))
         
-        return result_rgb
+        # City weather data and memoised suggestions (the dataset is mapped once and shared by worker processes)
+        weather_provider = DatasetWeatherProvider(WEATHER_DATASET) if WEATHER_DATASET else StaticWeatherProvider(MOCK_CITIES)
+        weather_service = WeatherService(weather_provider, WEATHER_CACHE_SIZE, WEATHER_CACHE_TTL_SECONDS)
         
-    except Exception as e:
-        print(f"Error in mock AI processing: {str(e)}")
-        raise
+        # Items and listing pages read through a cache; writes below invalidate exactly what they change
+        wardrobe_cache = WardrobeCache(
+            WARDROBE_CACHE_ITEMS, WARDROBE_CACHE_PAGES, WARDROBE_CACHE_TTL_SECONDS,
+            SharedGenerations(WARDROBE_CACHE_SHARED_FILE) if WARDROBE_CACHE_SHARED_FILE else LocalGenerations())
+        
+        if ENSURE_INDEXES:
+            mongo.add_connect_listener(lambda database: threading.Thread(
+                target=ensure_wardrobe_indexes, args=(database,), name='ensure-indexes', daemon=True).start())
+        
+        app_ready = True
+        return app
+
+
+def get_clothes_collection():
+    """The clothes collection; raises DatabaseUnavailableError (503) when MongoDB is unreachable"""
+    return mongo.collection('clothes')
+
+
+class SizeLimitedBuffer(BytesIO):
+    """In-memory upload buffer that aborts parsing once a file exceeds MAX_FILE_SIZE"""
+
+    def write(self, data):
+        if self.tell() + len(data) > MAX_FILE_SIZE:
+            raise RequestEntityTooLarge(f'Each image must be at most {MAX_FILE_SIZE // (1024 * 1024)}MB')
+        return super().write(data)
+
+
+class UploadRequest(Request):
+    """Request that keeps uploaded files in memory instead of spooling them to temp files"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SizeLimitedBuffer()
+
+
+app.request_class = UploadRequest # Parse uploads into size-limited in-memory buffers
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_SIZE # Reject oversized bodies before reading them
+
+# Upload problems that routes let through to the dedicated error handlers
+UPLOAD_ERRORS = (RequestEntityTooLarge, UploadTooLargeError, ImageTooLargeError, InvalidImageError)
+
+# Database problems that routes let through to the 503 handler
+DATABASE_ERRORS = (DatabaseUnavailableError, ConnectionFailure)
+
+
+def allowed_file(filename): # Function to check if file extension is allowed
+    """Check if file extension is allowed"""
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS # Check if file has valid extension
+
+
+def generate_unique_filename(original_filename): # Function to generate unique filename
+    """Generate unique filename using hash and timestamp"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S') # Get current timestamp in YYYYMMDD_HHMMSS format
+    hash_obj = hashlib.md5(original_filename.encode()) # Create MD5 hash of original filename
+    hash_str = hash_obj.hexdigest()[:8] # Get first 8 characters of hash
+    ext = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else 'png' # Get file extension or default to png
+    return f"{timestamp}_{hash_str}.{ext}" # Return unique filename with timestamp and hash
+
+
+def collect_component_stats():
+    """Cache, queue and storage counters of the shared components, read at scrape time"""
+    samples = stats_gauges('result_cache', result_cache.stats(), 'Result cache counters')
+    samples += stats_gauges('weather_cache', weather_service.suggestions.stats(), 'Weather suggestion cache counters')
+    samples += stats_gauges('variants', variant_cache.stats(), 'Image variant cache counters')
+    samples += stats_gauges('wardrobe_item_cache', wardrobe_cache.items.stats(), 'Wardrobe item cache counters')
+    samples += stats_gauges('wardrobe_page_cache', wardrobe_cache.pages.stats(), 'Wardrobe listing page cache counters')
+    samples += stats_gauges('jobs', job_queue.stats(), 'Try-on job queue counters')
+    samples += stats_gauges('analysis_jobs', analysis_queue.stats(), 'Garment analysis queue counters')
+    samples += stats_gauges('similarity_index', similarity_index.stats(), 'Image similarity index size and counters')
+    for name, store in (('uploads', upload_store), ('results', result_store)):
+        samples += stats_gauges(f'storage_{name}', store.stats(), f'{name.title()} storage usage')
+    return samples
+
+
+metrics.add_collector(collect_component_stats)
+
+
+@app.before_request
+def start_request_timer():
+    """Remember when the request started"""
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Observe latency and body sizes per route; log slow requests"""
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    
+    REQUEST_SECONDS.observe(elapsed, request.method, route, str(response.status_code))
+    REQUEST_BYTES.observe(request.content_length or 0, request.method, route)
+    if response.content_length is not None:
+        RESPONSE_BYTES.observe(response.content_length, request.method, route)
+    
+    if elapsed >= SLOW_REQUEST_SECONDS:
+        logger.warning('Slow request', extra={'method': request.method, 'route': route, 'path': request.path,
+                                              'status': response.status_code, 'seconds': round(elapsed, 3)})
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Request, stage and MongoDB timings plus component counters in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/')
 def index():
     """Serve the main landing page"""
-    return send_from_directory(FRONTEND_DIR, 'landing.html')
+    return serve_static('landing.html')
 
 
 @app.route('/<path:path>')
 def serve_static(path):
-    """Serve static files"""
-    return send_from_directory(FRONTEND_DIR, path)
+    """
+    Serve static files
+    Frontend files get strong ETags, precompressed encodings and immutable
+    caching when requested with their ?v= fingerprint; uploads, results and
+    variants are sent from disk as before
+    """
+    asset = static_assets.lookup(path)
+    if asset is None:
+        return send_from_directory(FRONTEND_DIR, path)
+    return static_assets.respond(asset, request)
 
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint; includes MongoDB ping latency and pool utilization"""
+    database = mongo.health()
     return jsonify({
-        'status': 'healthy',
+        'status': 'healthy' if database['connected'] else 'degraded',
         'message': 'Smart Wardrobe API is running',
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'database': database
     })
 
 
+def validate_upload_pair():
+    """
+    Pull the 'person' and 'garment' uploads out of the current request
+    Returns: (person_file, garment_file, None) or (None, None, error_response)
+    """
+    # Check if files are present
+    if 'person' not in request.files:
+        return None, None, (jsonify({'success': False, 'error': 'No person image provided'}), 400)
+    
+    if 'garment' not in request.files:
+        return None, None, (jsonify({'success': False, 'error': 'No garment image provided'}), 400)
+    
+    person_file = request.files['person']
+    garment_file = request.files['garment']
+    
+    # Validate files
+    if person_file.filename == '' or garment_file.filename == '':
+        return None, None, (jsonify({'success': False, 'error': 'Empty filename'}), 400)
+    
+    if not (allowed_file(person_file.filename) and allowed_file(garment_file.filename)):
+        return None, None, (jsonify({'success': False, 'error': 'Invalid file type. Only PNG, JPG, JPEG, WEBP allowed'}), 400)
+    
+    return person_file, garment_file, None
+
+
+def read_image_upload(file_storage):
+    """Read an upload into memory, checking its size limit and magic bytes"""
+    data, _ = read_upload(file_storage.stream, MAX_FILE_SIZE, file_storage.filename)
+    return data
+
+
+def asset_path(absolute):
+    """Path of a file under FRONTEND_DIR in the form item images use (assets/...)"""
+    return os.path.relpath(absolute, FRONTEND_DIR).replace(os.sep, '/')
+
+
+def retain_upload(file_storage, data):
+    """
+    Persist a copy of an upload when RETAIN_UPLOADS is enabled
+    With DEDUPLICATE_UPLOADS, uploads are named after the SHA-256 of their
+    bytes, so an upload byte-for-byte equal to a retained one is not stored
+    again (its TTL is renewed); a near-duplicate is stored and only logged
+    """
+    if not RETAIN_UPLOADS:
+        return
+    
+    features = None
+    if DEDUPLICATE_UPLOADS:
+        filename = f"{digest_bytes(data)}.{generate_unique_filename(file_storage.filename).rsplit('.', 1)[1]}"
+        if upload_store.contains(filename):
+            upload_store.touch(filename)
+            logger.info('Duplicate upload not stored', extra={'duplicate_of': filename})
+            return
+        features = image_features(data)
+        uploads = asset_path(UPLOAD_FOLDER) + '/'
+        retained = lambda key: key.startswith(uploads) and upload_store.contains(os.path.basename(key))
+        near = similarity_index.find_duplicate(features, live=retained)
+        if near:
+            logger.info('Near-duplicate upload stored', extra={'near_duplicate_of': near[0]})
+    else:
+        filename = generate_unique_filename(file_storage.filename)
+    
+    relative = upload_store.put(filename, data)
+    path = asset_path(os.path.join(UPLOAD_FOLDER, relative))
+    if features is None:
+        index_image(path)
+    else:
+        similarity_index.add(path, features)
+
+
+def get_batch_executor():
+    """Return the shared batch rendering thread pool, creating it on first use"""
+    global batch_executor
+    with batch_executor_lock:
+        if batch_executor is None:
+            batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='batch-render')
+        return batch_executor
+
+
+def get_outfit_scorer():
+    """Return the shared outfit scorer, loading the intelligence rules on first use"""
+    global outfit_scorer
+    with outfit_scorer_lock:
+        if outfit_scorer is None:
+            outfit_scorer = OutfitScorer.from_file(OUTFIT_DATA_PATH)
+        return outfit_scorer
+
+
+def parse_output_options():
+    """
+    Read result encoding options from the query string
+    - format: png (default), webp or jpeg
+    - quality: 1-100, lossy formats only
+    - width: maximum result width in pixels
+    Returns: (options, None) or (None, error_response)
+    """
+    options, error = read_output_options(request.args)
+    if error:
+        return None, (jsonify({'success': False, 'error': error}), 400)
+    return options, None
+
+
+def int_arg(args, name, default=None):
+    """Integer query parameter, or default when absent or not a number (shared with the async server)"""
+    try:
+        return int(args[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def read_output_options(args):
+    """
+    parse_output_options for any mapping of query parameters (shared with the async server)
+    Returns: (options, None) or (None, error message)
+    """
+    output_format = args.get('format', 'png').lower()
+    output_format = OUTPUT_FORMAT_ALIASES.get(output_format, output_format)
+    if output_format not in OUTPUT_FORMATS:
+        return None, f"Unsupported format '{output_format}'. Use png, webp or jpeg"
+    
+    quality = int_arg(args, 'quality')
+    if quality is not None and not 1 <= quality <= 100:
+        return None, 'Quality must be between 1 and 100'
+    if OUTPUT_FORMATS[output_format][3] is None:
+        quality = None  # Lossless format, quality would only fragment the cache
+    
+    width = int_arg(args, 'width')
+    if width is not None and not 1 <= width <= MAX_RESULT_WIDTH:
+        return None, f'Width must be between 1 and {MAX_RESULT_WIDTH}'
+    
+    return {'format': output_format, 'quality': quality, 'width': width}, None
+
+
+def arg_flag(name):
+    """Interpret a query string parameter as a boolean flag"""
+    return request.args.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+def result_key_for(person_bytes, garment_bytes, options):
+    """Cache key (and result filename) for a pair of uploads and output options"""
+    digest = make_cache_key(digest_bytes(person_bytes), digest_bytes(garment_bytes),
+                            options['format'], options['quality'], options['width'])
+    return f"{digest}.{OUTPUT_FORMATS[options['format']][2]}"
+
+
+def result_url_for(cache_key):
+    """Public URL of a cached result image"""
+    return f'/results/{result_cache.relative_path(cache_key)}'
+
+
+def index_result(cache_key):
+    """
+    Queue a stored result for the similarity index (the result history is searchable too)
+    Other formats, widths and qualities of a render already indexed are near-duplicates
+    of it and are left out, so each result is indexed once
+    """
+    path = asset_path(result_store.path_for(cache_key))
+    
+    def add(features):
+        if not similarity_index.find_duplicate(features, live=indexed_file_exists):
+            similarity_index.add(path, features)
+    
+    index_image(path, add)
+
+
+def cloth_change_response(cache_key, result_bytes, options, cached, timings=None):
+    """
+    Build the change_cloth response from the already-encoded result
+    - default: JSON with the result URL only
+    - ?include_base64=1: also inline the same bytes as a data URL
+    - ?response=image: return the encoded bytes as the response body
+    timings, if given, receives the base64 stage
+    """
+    mimetype = OUTPUT_FORMATS[options['format']][1]
+    result_url = result_url_for(cache_key)
+    
+    if request.args.get('response') == 'image':
+        return Response(result_bytes, mimetype=mimetype, headers={
+            'X-Result-Url': result_url,
+            'X-Cache': 'HIT' if cached else 'MISS'
+        })
+    
+    return jsonify(cloth_change_payload(cache_key, result_bytes, options, cached, arg_flag('include_base64'), timings))
+
+
+def cloth_change_payload(cache_key, result_bytes, options, cached, include_base64=False, timings=None):
+    """JSON body of a change_cloth response (shared with the async server)"""
+    payload = {
+        'success': True,
+        'message': 'Cloth change successful',
+        'cached': cached,
+        'result_url': result_url_for(cache_key),
+        'format': options['format'],
+        'size_bytes': len(result_bytes)
+    }
+    if include_base64:
+        with timed_stage(timings, 'base64'):
+            img_str = base64.b64encode(result_bytes).decode()
+            payload['result_base64'] = f"data:{OUTPUT_FORMATS[options['format']][1]};base64,{img_str}"
+    return payload
+
+
 @app.route('/api/change_cloth', methods=['POST'])
 def change_cloth():
     """
     Main endpoint for AI cloth changing
     Expects: multipart/form-data with 'person' and 'garment' image files
-    Returns: JSON with result image URL or base64 data
+    Query: format, quality, width, include_base64, response (see parse_output_options)
+    Returns: JSON with result image URL (base64 data on request) or the image itself
+    Stage durations (upload, cache, decode, resize, composite, encode, base64) go to /metrics
+    """
+    timings = {}
+    try:
+        person_file, garment_file, error = validate_upload_pair()
+        if error:
+            return error
+        
+        options, error = parse_output_options()
+        if error:
+            return error
+        
+        # Look up the result by the content of both uploads
+        with timed_stage(timings, 'upload'):
+            person_bytes = read_image_upload(person_file)
+            garment_bytes = read_image_upload(garment_file)
+        with timed_stage(timings, 'cache'):
+            cache_key = result_key_for(person_bytes, garment_bytes, options)
+            result_bytes = result_cache.get(cache_key)
+        if result_bytes is not None:
+            return cloth_change_response(cache_key, result_bytes, options, cached=True, timings=timings)
+        
+        # Uploads are decoded from memory; keep copies only if retention is enabled
+        with timed_stage(timings, 'upload'):
+            retain_upload(person_file, person_bytes)
+            retain_upload(garment_file, garment_bytes)
+        
+        # Process with mock AI, encode once, and write those bytes to the cache (memory + disk)
+        result_bytes = render_cloth_change(person_bytes, garment_bytes,
+                                           options['format'], options['quality'], options['width'], timings)
+        with timed_stage(timings, 'cache'):
+            result_cache.put(cache_key, result_bytes)
+        index_result(cache_key)
+        
+        return cloth_change_response(cache_key, result_bytes, options, cached=False, timings=timings)
+        
+    except UPLOAD_ERRORS:
+        raise
+    except Exception as e:
+        logger.exception('Cloth change failed')
+        return jsonify({
+            'success': False,
+            'error': f'Processing failed: {str(e)}'
+        }), 500
+    finally:
+        for stage, seconds in timings.items():
+            STAGE_SECONDS.observe(seconds, 'change_cloth', stage)
+
+
+@app.route('/api/change_cloth/batch', methods=['POST'])
+def change_cloth_batch():
+    """
+    Dress one person image in several garments in a single request
+    Expects: multipart/form-data with one 'person' file and up to
+             MAX_BATCH_GARMENTS 'garment' files (repeat the field)
+    Query: format, quality, width (see parse_output_options)
+    Returns: JSON with one result (URL or error) per garment, in upload order
     """
     try:
-        # Check if files are present
         if 'person' not in request.files:
             return jsonify({'success': False, 'error': 'No person image provided'}), 400
         
-        if 'garment' not in request.files:
-            return jsonify({'success': False, 'error': 'No garment image provided'}), 400
-        
         person_file = request.files['person']
-        garment_file = request.files['garment']
+        garment_files = request.files.getlist('garment')
+        
+        if not garment_files:
+            return jsonify({'success': False, 'error': 'No garment images provided'}), 400
+        
+        if len(garment_files) > MAX_BATCH_GARMENTS:
+            return jsonify({'success': False, 'error': f'At most {MAX_BATCH_GARMENTS} garments per batch'}), 400
         
-        # Validate files
-        if person_file.filename == '' or garment_file.filename == '':
+        filenames = [person_file.filename] + [garment_file.filename for garment_file in garment_files]
+        if any(filename == '' for filename in filenames):
             return jsonify({'success': False, 'error': 'Empty filename'}), 400
         
-        if not (allowed_file(person_file.filename) and allowed_file(garment_file.filename)):
+        if not all(allowed_file(filename) for filename in filenames):
             return jsonify({'success': False, 'error': 'Invalid file type. Only PNG, JPG, JPEG, WEBP allowed'}), 400
         
-        # Save uploaded files temporarily
-        person_filename = generate_unique_filename(person_file.filename)
-        garment_filename = generate_unique_filename(garment_file.filename)
+        options, error = parse_output_options()
+        if error:
+            return error
         
-        person_path = os.path.join(UPLOAD_FOLDER, person_filename)
-        garment_path = os.path.join(UPLOAD_FOLDER, garment_filename)
+        person_bytes = read_image_upload(person_file)
+        garment_bytes_list = [read_image_upload(garment_file) for garment_file in garment_files]
+        cache_keys = [result_key_for(person_bytes, garment_bytes, options) for garment_bytes in garment_bytes_list]
         
-        person_file.save(person_path)
-        garment_file.save(garment_path)
+        # Only render garments whose result is not cached yet (duplicates rendered once)
+        missing = {}
+        for index, cache_key in enumerate(cache_keys):
+            if cache_key not in missing and not result_cache.contains(cache_key):
+                missing[cache_key] = index
         
-        # Process with mock AI
-        result_image = mock_ai_cloth_change(person_path, garment_path)
+        rendered = {}
+        if missing:
+            retain_upload(person_file, person_bytes)
+            for index in missing.values():
+                retain_upload(garment_files[index], garment_bytes_list[index])
+            
+            outputs = render_cloth_change_batch(
+                person_bytes, [garment_bytes_list[index] for index in missing.values()],
+                options['format'], options['quality'], options['width'], executor=get_batch_executor())
+            for cache_key, output in zip(missing, outputs):
+                if not isinstance(output, Exception):
+                    result_cache.put(cache_key, output)
+                    index_result(cache_key)
+                rendered[cache_key] = output
         
-        # Save result
-        result_filename = f"result_{generate_unique_filename('output.png')}"
-        result_path = os.path.join(RESULTS_FOLDER, result_filename)
-        result_image.save(result_path, 'PNG', quality=95)
+        results = []
+        for index, (garment_file, cache_key) in enumerate(zip(garment_files, cache_keys)):
+            item = {'index': index, 'garment': garment_file.filename}
+            output = rendered.get(cache_key)
+            if isinstance(output, Exception):
+                item.update({'success': False, 'error': f'Processing failed: {str(output)}'})
+            else:
+                item.update({
+                    'success': True,
+                    'cached': cache_key not in missing or missing[cache_key] != index,
+                    'result_url': result_url_for(cache_key),
+                    'format': options['format']
+                })
+            results.append(item)
         
-        # Convert to base64 for immediate display
-        buffered = BytesIO()
-        result_image.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
+        return jsonify({
+            'success': any(item['success'] for item in results),
+            'message': f"{sum(item['success'] for item in results)} of {len(results)} cloth changes successful",
+            'results': results
+        })
         
-        # Clean up uploaded files (optional - comment out to keep uploads)
-        # os.remove(person_path)
-        # os.remove(garment_path)
+    except UPLOAD_ERRORS:
+        raise
+    except Exception as e:
+        logger.exception('Batch cloth change failed')
+        return jsonify({
+            'success': False,
+            'error': f'Processing failed: {str(e)}'
+        }), 500
+
+
+@app.route('/api/change_cloth/jobs', methods=['POST'])
+def submit_cloth_change_job():
+    """
+    Queue an AI cloth change on the worker pool
+    Expects: multipart/form-data with 'person' and 'garment' image files
+    Query: format, quality, width (see parse_output_options)
+    Returns: 202 with a job id to poll, or 429 when the queue is full
+    """
+    try:
+        person_file, garment_file, error = validate_upload_pair()
+        if error:
+            return error
+        
+        options, error = parse_output_options()
+        if error:
+            return error
+        
+        person_bytes = read_image_upload(person_file)
+        garment_bytes = read_image_upload(garment_file)
+        cache_key = result_key_for(person_bytes, garment_bytes, options)
+        result_url = result_url_for(cache_key)
+        
+        # Cached results complete immediately without touching the pool
+        if result_cache.contains(cache_key):
+            job_id = job_queue.add_completed({'result_url': result_url, 'cached': True,
+                                              'format': options['format']})
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'status': 'done',
+                'status_url': f'/api/jobs/{job_id}'
+            }), 200
+        
+        def store_result(result_bytes):
+            result_cache.put(cache_key, result_bytes)
+            index_result(cache_key)
+            return {'result_url': result_url, 'cached': False, 'format': options['format'],
+                    'size_bytes': len(result_bytes)}
+        
+        try:
+            job_id = job_queue.submit(render_cloth_change, person_bytes, garment_bytes,
+                                      options['format'], options['quality'], options['width'],
+                                      on_success=store_result)
+        except QueueFullError as e:
+            response = jsonify({'success': False, 'error': str(e)})
+            response.headers['Retry-After'] = str(JOB_RETRY_AFTER_SECONDS)
+            return response, 429
+        
+        retain_upload(person_file, person_bytes)
+        retain_upload(garment_file, garment_bytes)
         
         return jsonify({
             'success': True,
-            'message': 'Cloth change successful',
-            'result_url': f'/results/{result_filename}',
-            'result_base64': f'data:image/png;base64,{img_str}'
-        })
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f'/api/jobs/{job_id}',
+            'events_url': f'/api/jobs/{job_id}/events'
+        }), 202
         
+    except UPLOAD_ERRORS:
+        raise
     except Exception as e:
-        print(f"Error processing cloth change: {str(e)}")
+        logger.exception('Submitting cloth change job failed')
         return jsonify({
             'success': False,
-            'error': f'Processing failed: {str(e)}'
+            'error': f'Job submission failed: {str(e)}'
         }), 500
 
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Poll a job's status
+    Optional ?wait=<seconds> long-polls until the job finishes (capped)
+    """
+    wait = request.args.get('wait', type=float)
+    if wait:
+        job = job_queue.wait(job_id, timeout=min(wait, JOB_MAX_WAIT_SECONDS))
+    else:
+        job = job_queue.get(job_id)
+    
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    return jsonify({'success': True, **job})
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_job(job_id):
+    """Stream a job's status as Server-Sent Events until it finishes"""
+    if job_queue.get(job_id) is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    def generate():
+        last_status = None
+        while True:
+            job = job_queue.wait(job_id, timeout=JOB_EVENT_INTERVAL_SECONDS)
+            if job is None:
+                return
+            if job['status'] != last_status or job['finished_at'] is None:
+                yield f"data: {json.dumps(job)}\n\n"
+                last_status = job['status']
+            if job['finished_at'] is not None:
+                return
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/jobs/stats', methods=['GET'])
+def job_stats():
+    """Report worker pool queue depth and counters"""
+    return jsonify({'success': True, 'jobs': job_queue.stats()})
+
+
+def wants_ndjson():
+    """Whether the client asked for a streamed NDJSON listing"""
+    return (request.args.get('format') == 'ndjson'
+            or 'application/x-ndjson' in request.headers.get('Accept', ''))
+
+
+def stream_ndjson(documents, download_name=None):
+    """Stream documents as newline-delimited JSON while the cursor produces them"""
+    def generate():
+        for document in documents:
+            yield json.dumps(document, default=str) + '\n'
+    response = Response(generate(), mimetype='application/x-ndjson')
+    if download_name:
+        response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+    return response
+
+
+def cached_page(args):
+    """One listing page for request args, read through the wardrobe cache"""
+    query = build_list_query(args)
+    return wardrobe_cache.get_page(args, lambda: fetch_page(get_clothes_collection(), query))
+
+
 @app.route('/api/wardrobe/items', methods=['GET'])
 def get_wardrobe_items():
     """
-    Get wardrobe items from MongoDB
+    Get wardrobe items from MongoDB, one page at a time
+    Query: limit, cursor, fields, sort, category, color, season (see wardrobe.build_list_query)
+           format=ndjson streams every matching item instead of returning a page
     """
     try:
-        if not clothes:
-            return jsonify({'success': False, 'error': 'Database not connected'}), 500
-            
-        # Get all clothes from MongoDB, exclude _id field
-        items = list(clothes.find({}, {"_id": 0}))
-        return jsonify({'success': True, 'items': items})
+        if wants_ndjson():
+            query = build_list_query(request.args, default_limit=None)
+            return stream_ndjson(iter_documents(get_clothes_collection(), query))
+        
+        items, next_cursor = cached_page(request.args)
+        return jsonify({'success': True, 'items': items, 'next_cursor': next_cursor})
+    except QueryError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except DATABASE_ERRORS:
+        raise
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/wardrobe/import', methods=['POST'])
+def import_wardrobe_items():
+    """
+    Import many wardrobe items in one request
+    Body: NDJSON (Content-Type application/x-ndjson, one item per line) or a
+          JSON array of items; each item needs a name and a category
+    Items are written in unordered batches of IMPORT_BATCH_SIZE; invalid or
+    failed items are listed in 'errors' by index and the rest are stored
+    """
+    try:
+        clothes = get_clothes_collection()
+        
+        if request.mimetype == 'application/x-ndjson':
+            entries = iter_ndjson(request.stream)
+        else:
+            items = request.get_json(silent=True)
+            if not isinstance(items, list):
+                return jsonify({'success': False, 'error': 'Send a JSON array of items or NDJSON (application/x-ndjson)'}), 400
+            entries = iter_array(items)
+        
+        try:
+            summary = import_items(clothes, entries, IMPORT_BATCH_SIZE, MAX_IMPORT_ITEMS)
+        finally:
+            # Batches may have been written even if the import failed part way
+            wardrobe_cache.invalidate_all()
+        return jsonify({'success': summary['failed'] == 0, **summary})
+    except RequestEntityTooLarge:
+        raise
+    except DATABASE_ERRORS:
+        raise
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/wardrobe/export', methods=['GET'])
+def export_wardrobe_items():
+    """
+    Stream wardrobe items as an NDJSON download (the format /api/wardrobe/import accepts)
+    Query: the filters, fields and sort of /api/wardrobe/items; limit is optional
+    """
+    try:
+        clothes = get_clothes_collection()
+        
+        query = build_list_query(request.args, default_limit=None)
+        return stream_ndjson(iter_documents(clothes, query), download_name='wardrobe.ndjson')
+    except QueryError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except DATABASE_ERRORS:
+        raise
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/wardrobe/analyze', methods=['POST'])
+def analyze_wardrobe_items():
+    """
+    Queue color/pattern analysis for items that have none yet (or an older version),
+    and similarity features for their images if those are not indexed
+    Body (JSON): owner (optional), limit (default and max MAX_ANALYZE_ITEMS),
+                 force (re-analyse every item with an image)
+    Results are stored on the items as they finish; call again until queued is 0
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        limit = data.get('limit', MAX_ANALYZE_ITEMS)
+        if not isinstance(limit, int) or not 0 < limit <= MAX_ANALYZE_ITEMS:
+            return jsonify({'success': False, 'error': f'limit must be between 1 and {MAX_ANALYZE_ITEMS}'}), 400
+        
+        query = {'image': {'$type': 'string'}}
+        if data.get('owner'):
+            query['owner'] = data['owner']
+        if not data.get('force'):
+            query['$or'] = [{'analysis': {'$exists': False}}, {'analysis.version': {'$lt': ANALYSIS_VERSION}}]
+        
+        queued = skipped = 0
+        for document in get_clothes_collection().find(query, {'image': 1, 'owner': 1}).limit(limit):
+            if analysis_queue.stats()['pending'] >= ANALYSIS_QUEUE_SIZE:
+                break
+            if queue_garment_analysis(document['_id'], document['image'], document.get('owner')):
+                index_image(document['image'])
+                queued += 1
+            else:
+                skipped += 1
+        return jsonify({'success': True, 'queued': queued, 'skipped': skipped,
+                        'pending': analysis_queue.stats()['pending']}), 202
+    except DATABASE_ERRORS:
+        raise
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/wardrobe/explain', methods=['GET'])
+def explain_wardrobe_queries():
+    """
+    Diagnostics: explain the wardrobe queries and report whether indexes serve them
+    With listing parameters (same as /api/wardrobe/items) only that query is
+    explained; otherwise every pattern in EXPLAIN_PATTERNS plus the by-id lookup
+    """
+    try:
+        clothes = get_clothes_collection()
+        
+        if request.args:
+            patterns = {'query': request.args}
+        else:
+            patterns = dict(EXPLAIN_PATTERNS)
+        
+        from bson import ObjectId
+        queries = {}
+        for name, args in patterns.items():
+            try:
+                queries[name] = explain_query(clothes, build_list_query(args))
+            except QueryError:
+                raise
+            except Exception as e:
+                queries[name] = {'error': str(e)}
+        if not request.args:
+            try:
+                queries['get_by_id'] = explain_lookup(clothes, ObjectId())
+            except Exception as e:
+                queries['get_by_id'] = {'error': str(e)}
+        
+        return jsonify({
+            'success': True,
+            'index_status': index_status,
+            'declared_indexes': [model.document['name'] for model in WARDROBE_INDEXES],
+            'existing_indexes': sorted(clothes.index_information()),
+            'queries': queries
+        })
+    except QueryError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except DATABASE_ERRORS:
+        raise
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def load_outfit_items(owner=None):
+    """Fetch the wardrobe items outfits are built from (tops, bottoms and footwear)"""
+    query = {'category': {'$in': list(OUTFIT_SLOTS)}}
+    if owner:
+        query['owner'] = owner
+    projection = {'name': 1, 'category': 1, 'color': 1, 'season': 1, 'image': 1, 'analysis.color': 1, 'analysis.pattern': 1}
+    items = []
+    for document in get_clothes_collection().find(query, projection).limit(MAX_OUTFIT_ITEMS + 1):
+        document['id'] = str(document.pop('_id'))
+        items.append(document)
+    return items
+
+
+def outfit_request_items(data):
+    """
+    Wardrobe items an outfit request works on: body 'items', or the database
+    wardrobe narrowed by 'owner'
+    Returns: (items, None) or (None, error_response)
+    """
+    items = data.get('items')
+    if items is None:
+        items = load_outfit_items(data.get('owner'))
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return None, (jsonify({'success': False, 'error': 'items must be a list of objects'}), 400)
+    if len(items) > MAX_OUTFIT_ITEMS:
+        return None, (jsonify({'success': False, 'error': f'At most {MAX_OUTFIT_ITEMS} items can be ranked'}), 400)
+    return items, None
+
+
+def outfit_response(outfit, score, reason, scorer):
+    """JSON shape of one scored outfit"""
+    return {
+        'items': list(outfit),
+        'score': score,
+        'rating': scorer.rating(score),
+        'reason': reason
+    }
+
+
+@app.route('/api/outfits/rank', methods=['POST'])
+def rank_outfits():
+    """
+    Score every top x bottom x footwear combination and return the best ones
+    Body (JSON, all optional):
+    - items: wardrobe items (name, category, color, season); defaults to the
+      database wardrobe, narrowed by owner
+    - temperature or season, event: scoring context
+    - limit: number of outfits to return (default 10)
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        limit = data.get('limit', 10)
+        if not isinstance(limit, int) or not 1 <= limit <= MAX_OUTFIT_RESULTS:
+            return jsonify({'success': False, 'error': f'limit must be between 1 and {MAX_OUTFIT_RESULTS}'}), 400
+        
+        items, error_response = outfit_request_items(data)
+        if error_response:
+            return error_response
+        
+        scorer = get_outfit_scorer()
+        try:
+            context = scorer.context(data.get('temperature'), data.get('season'), data.get('event'))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'temperature must be a number'}), 400
+        
+        total, best = scorer.rank(items, context, limit)
+        return jsonify({
+            'success': True,
+            'total_combinations': total,
+            'context': context._asdict(),
+            'outfits': [outfit_response(outfit, score, reason, scorer) for score, reason, outfit in best]
+        })
+    except DATABASE_ERRORS:
+        raise
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/outfits/generate', methods=['POST'])
+def generate_outfits():
+    """
+    Best k outfits for a city's weather (or a temperature/season) and an event
+    Body (JSON): city or temperature/season, event, k (default 10), and
+    items/owner as for /api/outfits/rank
+    With ?format=ndjson (or Accept: application/x-ndjson) the outfits are
+    streamed one per line as they are scored, for large k
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        k = data.get('k', 10)
+        if not isinstance(k, int) or not 1 <= k <= MAX_GENERATED_OUTFITS:
+            return jsonify({'success': False, 'error': f'k must be between 1 and {MAX_GENERATED_OUTFITS}'}), 400
+        
+        weather = None
+        temperature = data.get('temperature')
+        city = (data.get('city') or '').strip()
+        if city:
+            weather_data = weather_service.get_weather(city)
+            if not weather_data:
+                return jsonify({'success': False, 'error': f"City '{city}' not found"}), 404
+            temperature = weather_data['main']['temp']
+            weather = {
+                'city': city,
+                'temperature': temperature,
+                'condition': weather_data['weather'][0]['main']
+            }
+        
+        items, error_response = outfit_request_items(data)
+        if error_response:
+            return error_response
+        
+        scorer = get_outfit_scorer()
+        try:
+            context = scorer.context(temperature, data.get('season'), data.get('event'))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'temperature must be a number'}), 400
+        
+        generator = OutfitGenerator(scorer, items, context, OUTFIT_BLOCK_ELEMENTS)
+        chunks = generator.iter_outfits(k, OUTFIT_STREAM_CHUNK)
+        
+        if wants_ndjson():
+            response = stream_ndjson(outfit_response(outfit, score, reason, scorer)
+                                     for chunk in chunks for score, reason, outfit in chunk)
+            response.headers['X-Total-Combinations'] = str(generator.total)
+            return response
+        
+        return jsonify({
+            'success': True,
+            'total_combinations': generator.total,
+            'context': context._asdict(),
+            'weather': weather,
+            'outfits': [outfit_response(outfit, score, reason, scorer)
+                        for chunk in chunks for score, reason, outfit in chunk]
+        })
+    except DATABASE_ERRORS:
+        raise
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -224,8 +1183,7 @@ def get_wardrobe_items():
 def add_clothes():
     """Add new clothes to MongoDB"""
     try:
-        if not clothes:
-            return jsonify({"error": "Database not connected"}), 500
+        clothes = get_clothes_collection()
             
         data = request.get_json()
         
@@ -234,24 +1192,44 @@ def add_clothes():
         
         # Insert into MongoDB
         result = clothes.insert_one(data)
+        wardrobe_cache.invalidate(owners=[data.get('owner')])
+        
+        # Render the grid thumbnails now, so the wardrobe page does not wait for them
+        if isinstance(data.get('image'), str):
+            warm_variants([data['image']])
+            queue_garment_analysis(result.inserted_id, data['image'], data.get('owner'))
+            index_image(data['image'])
         
         return jsonify({
             "message": "Cloth added successfully!",
             "id": str(result.inserted_id)
         })
+    except DATABASE_ERRORS:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/clothes', methods=['GET'])
 def get_clothes():
-    """Get all clothes from MongoDB"""
+    """
+    Get clothes from MongoDB as a JSON list, one page at a time
+    Query: same as /api/wardrobe/items; the next page's cursor is sent in
+           the X-Next-Cursor header (absent on the last page)
+    """
     try:
-        if not clothes:
-            return jsonify({"error": "Database not connected"}), 500
-            
-        # Get all clothes, exclude MongoDB's _id field
-        data = list(clothes.find({}, {"_id": 0}))
-        return jsonify(data)
+        if wants_ndjson():
+            query = build_list_query(request.args, default_limit=None)
+            return stream_ndjson(iter_documents(get_clothes_collection(), query))
+        
+        data, next_cursor = cached_page(request.args)
+        response = jsonify(data)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
+    except DATABASE_ERRORS:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -259,16 +1237,17 @@ def get_clothes():
 def get_cloth(cloth_id):
     """Get specific cloth by ID"""
     try:
-        if not clothes:
-            return jsonify({"error": "Database not connected"}), 500
-            
         from bson import ObjectId
-        cloth = clothes.find_one({"_id": ObjectId(cloth_id)}, {"_id": 0})
+        object_id = ObjectId(cloth_id)
+        cloth = wardrobe_cache.get_item(
+            str(object_id), lambda: get_clothes_collection().find_one({"_id": object_id}, {"_id": 0}))
         
         if cloth:
             return jsonify(cloth)
         else:
             return jsonify({"error": "Cloth not found"}), 404
+    except DATABASE_ERRORS:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -276,22 +1255,30 @@ def get_cloth(cloth_id):
 def update_cloth(cloth_id):
     """Update specific cloth by ID"""
     try:
-        if not clothes:
-            return jsonify({"error": "Database not connected"}), 500
+        clothes = get_clothes_collection()
             
         from bson import ObjectId
+        object_id = ObjectId(cloth_id)
         data = request.get_json()
         data['updated_at'] = datetime.now().isoformat()
         
-        result = clothes.update_one(
-            {"_id": ObjectId(cloth_id)}, 
-            {"$set": data}
+        # The previous owner is returned too, so both owners' cached listings are invalidated
+        previous = clothes.find_one_and_update(
+            {"_id": object_id},
+            {"$set": data},
+            projection={"owner": 1}
         )
         
-        if result.modified_count > 0:
+        if previous is not None:
+            wardrobe_cache.invalidate(str(object_id), [previous.get('owner'), data.get('owner')])
+            if isinstance(data.get('image'), str):
+                queue_garment_analysis(object_id, data['image'], data.get('owner', previous.get('owner')))
+                index_image(data['image'])
             return jsonify({"message": "Cloth updated successfully!"})
         else:
             return jsonify({"error": "Cloth not found"}), 404
+    except DATABASE_ERRORS:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -299,16 +1286,19 @@ def update_cloth(cloth_id):
 def delete_cloth(cloth_id):
     """Delete specific cloth by ID"""
     try:
-        if not clothes:
-            return jsonify({"error": "Database not connected"}), 500
+        clothes = get_clothes_collection()
             
         from bson import ObjectId
-        result = clothes.delete_one({"_id": ObjectId(cloth_id)})
+        object_id = ObjectId(cloth_id)
+        deleted = clothes.find_one_and_delete({"_id": object_id}, projection={"owner": 1})
         
-        if result.deleted_count > 0:
+        if deleted is not None:
+            wardrobe_cache.invalidate(str(object_id), [deleted.get('owner')])
             return jsonify({"message": "Cloth deleted successfully!"})
         else:
             return jsonify({"error": "Cloth not found"}), 404
+    except DATABASE_ERRORS:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -318,213 +1308,409 @@ def weather_suggest():
     Get weather-based outfit suggestions
     Uses local mock weather data - 100% OFFLINE - no external APIs
     Returns outfit recommendations based on temperature and conditions
+    Body (JSON): {"city": "..."} or {"cities": [...]} for up to
+    MAX_WEATHER_BATCH_CITIES cities at once
     """
     try:
-        data = request.get_json()
-        city = data.get('city', '').strip()
-        print(f"DEBUG: Received city: {city}")
-        
-        if not city:
-            return jsonify({'success': False, 'error': 'City name is required'}), 400
-        
-        # Get local weather data (no external API calls)
-        print("DEBUG: Calling get_mock_weather...")
-        weather_data = get_mock_weather(city)
-        print(f"DEBUG: weather_data type: {type(weather_data)}, value: {weather_data}")
+        data = request.get_json(silent=True) or {}
         
-        if not weather_data:
-            print("DEBUG: No weather data found")
+        cities = data.get('cities')
+        if cities is not None:
+            if not isinstance(cities, list) or not all(isinstance(city, str) for city in cities):
+                return jsonify({'success': False, 'error': 'cities must be a list of city names'}), 400
+            if len(cities) > MAX_WEATHER_BATCH_CITIES:
+                return jsonify({'success': False, 'error': f'At most {MAX_WEATHER_BATCH_CITIES} cities per request'}), 400
             return jsonify({
-                'success': False,
-                'error': f"City '{city}' not found. Try: London, New York, Tokyo, Paris, Dubai, Mumbai, Sydney, Moscow, Singapore, Los Angeles"
-            }), 404
-        
-        # Extract weather data
-        print("DEBUG: Extracting temperature...")
-        temp = weather_data["main"]["temp"]
-        feels_like = weather_data["main"]["feels_like"]
-        condition = weather_data["weather"][0]["main"]
-        description = weather_data["weather"][0]["description"]
-        humidity = weather_data["main"]["humidity"]
-        wind_speed = weather_data["wind"]["speed"]
-        
-        # AI outfit suggestion logic based on temperature and conditions
-        suggestions = []
-        outfit_items = []
-        
-        # Temperature-based suggestions
-        if temp < 0:
-            suggestions.append("It's freezing! Bundle up warm.")
-            outfit_items.extend(['Heavy winter coat', 'Thermal layers', 'Wool scarf', 'Gloves', 'Winter boots'])
-        elif temp < 10:
-            suggestions.append("It's quite cold. Wear warm layers.")
-            outfit_items.extend(['Warm jacket or coat', 'Sweater', 'Long pants', 'Closed shoes', 'Light scarf'])
-        elif temp < 15:
-            suggestions.append("Cool weather. A jacket would be perfect.")
-            outfit_items.extend(['Light jacket', 'Long-sleeve shirt', 'Jeans', 'Sneakers'])
-        elif temp < 20:
-            suggestions.append("Mild and pleasant. Comfortable clothing recommended.")
-            outfit_items.extend(['Hoodie or cardigan', 'T-shirt', 'Jeans or casual pants', 'Comfortable shoes'])
-        elif temp < 25:
-            suggestions.append("Nice weather! Light clothing is ideal.")
-            outfit_items.extend(['T-shirt or polo', 'Light pants or shorts', 'Sneakers', 'Sunglasses'])
-        elif temp < 30:
-            suggestions.append("Warm weather. Stay cool and comfortable.")
-            outfit_items.extend(['Light t-shirt', 'Shorts or summer dress', 'Sandals', 'Sun hat', 'Sunglasses'])
-        else:
-            suggestions.append("Very hot! Wear minimal, breathable clothing.")
-            outfit_items.extend(['Tank top or light shirt', 'Shorts', 'Sandals', 'Sun protection', 'Stay hydrated!'])
-        
-        # Condition-based suggestions
-        if 'rain' in condition.lower() or 'drizzle' in condition.lower():
-            suggestions.append("It's rainy! Don't forget rain gear.")
-            outfit_items.extend(['Waterproof jacket', 'Umbrella', 'Water-resistant shoes'])
-        elif 'snow' in condition.lower():
-            suggestions.append("Snowy conditions! Wear waterproof winter gear.")
-            outfit_items.extend(['Snow boots', 'Waterproof coat', 'Warm gloves'])
-        elif 'cloud' in condition.lower():
-            suggestions.append("Cloudy skies. Layer up just in case.")
-        elif 'clear' in condition.lower() or 'sun' in condition.lower():
-            suggestions.append("Clear skies! Perfect weather to go out.")
-            outfit_items.extend(['Sunglasses', 'Light colors'])
-        
-        # Wind-based suggestions
-        if wind_speed > 10:
-            suggestions.append("It's windy! Consider a windbreaker.")
-            outfit_items.append('Windbreaker or wind-resistant jacket')
-        
-        # Humidity-based suggestions
-        if humidity > 80:
-            suggestions.append("High humidity. Choose breathable fabrics.")
-            outfit_items.append('Breathable cotton or moisture-wicking fabrics')
+                'success': True,
+                'results': [city_suggestion(city.strip())[0] for city in cities]
+            })
         
-        return jsonify({
-            'success': True,
-            'city': city,
-            'weather': {
-                'temperature': round(temp, 1),
-                'feels_like': round(feels_like, 1),
-                'condition': condition,
-                'description': description.capitalize(),
-                'humidity': humidity,
-                'wind_speed': wind_speed
-            },
-            'suggestions': suggestions,
-            'outfit_items': list(set(outfit_items)),  # Remove duplicates
-            'emoji': get_weather_emoji(condition, temp)
-        })
+        city = data.get('city', '')
+        if not isinstance(city, str) or not city.strip():
+            return jsonify({'success': False, 'error': 'City name is required'}), 400
+        
+        response, status = city_suggestion(city.strip())
+        return jsonify(response), status
         
     except Exception as e:
-        print(f"Error in weather suggestion: {str(e)}")
+        logger.exception('Weather suggestion failed')
         return jsonify({
             'success': False,
             'error': f'An error occurred: {str(e)}'
         }), 500
 
 
-def get_weather_emoji(condition, temp):
-    """Get emoji based on weather condition and temperature"""
-    condition = condition.lower()
-    
-    if 'thunder' in condition:
-        return 'Storm'
-    elif 'rain' in condition or 'drizzle' in condition:
-        return 'Rain'
-    elif 'snow' in condition:
-        return 'Snow'
-    elif 'cloud' in condition:
-        return 'Cloudy'
-    elif temp > 30:
-        return 'Hot'
-    elif 'clear' in condition:
-        return 'Sunny'
+@app.route('/api/weather/cities', methods=['GET'])
+def weather_cities():
+    """
+    Autocomplete city names for the weather stylist
+    Query: q (partly typed name), limit (default 8)
+    Matches are ranked exact, prefix, word prefix (e.g. "york"), then typo-tolerant
+    """
+    query = request.args.get('q', '')
+    limit = int_arg(request.args, 'limit', 8)
+    if not 1 <= limit <= MAX_CITY_SUGGESTIONS:
+        return jsonify({'success': False, 'error': f'limit must be between 1 and {MAX_CITY_SUGGESTIONS}'}), 400
+    
+    return jsonify({
+        'success': True,
+        'query': query,
+        'cities': weather_service.autocomplete(query, limit)
+    })
+
+
+@app.route('/api/weather/forecast', methods=['GET'])
+def weather_forecast():
+    """
+    Per-day outfit suggestions for a city
+    Query: city, days (default 7, at most MAX_FORECAST_DAYS)
+    Only as many days as the weather data covers are returned
+    """
+    city = request.args.get('city', '').strip()
+    days = int_arg(request.args, 'days', 7)
+    if not city:
+        return jsonify({'success': False, 'error': 'City name is required'}), 400
+    if not 1 <= days <= MAX_FORECAST_DAYS:
+        return jsonify({'success': False, 'error': f'days must be between 1 and {MAX_FORECAST_DAYS}'}), 400
+    
+    forecast = weather_service.forecast(city, days)
+    if forecast is None:
+        return jsonify({'success': False, 'error': f"City '{city}' not found"}), 404
+    return jsonify(forecast)
+
+
+def city_suggestion(city):
+    """Suggestion response and status code for one city"""
+    if not city:
+        return {'success': False, 'city': city, 'error': 'City name is required'}, 400
+    
+    suggestion = weather_service.suggest(city)
+    if suggestion is None:
+        return {
+            'success': False,
+            'city': city,
+            'error': f"City '{city}' not found. Try: {', '.join(weather_service.known_cities())}"
+        }, 404
+    return suggestion, 200
+
+
+def variant_source(path):
+    """Absolute path of an image under frontend/assets, or None if it is not one"""
+    source = safe_join(FRONTEND_DIR, path)
+    if source is None or not path.startswith('assets/') or source.startswith(DERIVED_FOLDER + os.sep):
+        return None
+    if not allowed_file(source) or not os.path.isfile(source):
+        return None
+    return source
+
+
+@app.route('/api/images/<path:path>', methods=['GET'])
+def serve_variant(path):
+    """
+    Resized variant of an image under frontend/assets (e.g. assets/uploads/x.jpg)
+    Query: w (target width, rounded up to the variant ladder), format
+           (png/webp/jpeg; default: webp when accepted, else jpeg)
+    Variants carry a strong ETag; ones of uploads/results (never rewritten)
+    are cacheable for a year
+    """
+    source = variant_source(path)
+    if source is None:
+        return jsonify({'success': False, 'error': 'Image not found'}), 404
+    
+    width = snap_width(request.args.get('w', GRID_VARIANT_WIDTHS[0], type=int))
+    requested_format = request.args.get('format', '').lower()
+    output_format = OUTPUT_FORMAT_ALIASES.get(requested_format, requested_format)
+    if output_format and output_format not in OUTPUT_FORMATS:
+        return jsonify({'success': False, 'error': f"format must be one of: {', '.join(OUTPUT_FORMATS)}"}), 400
+    negotiated = not output_format
+    output_format = output_format or negotiate_format(request.headers.get('Accept'))
+    
+    key = variant_key(source, width, output_format)
+    etag = key.split('.')[0]
+    if source.startswith((UPLOAD_FOLDER + os.sep, RESULTS_FOLDER + os.sep)):
+        cache_headers = {'Cache-Control': f'public, max-age={VARIANT_MAX_AGE_SECONDS}, immutable'}
     else:
-        return 'Partly Cloudy'
-
-
-def get_mock_weather(city):
-    """
-    Return local weather data - completely offline, no external dependencies
-    All weather data is stored locally for instant access
-    """
-    city_lower = city.lower().strip()
-    
-    # Mock weather database
-    mock_cities = {
-        'london': {
-            'main': {'temp': 15, 'feels_like': 13, 'humidity': 75},
-            'weather': [{'main': 'Clouds', 'description': 'overcast clouds'}],
-            'wind': {'speed': 5.5}
-        },
-        'new york': {
-            'main': {'temp': 22, 'feels_like': 21, 'humidity': 60},
-            'weather': [{'main': 'Clear', 'description': 'clear sky'}],
-            'wind': {'speed': 3.2}
-        },
-        'tokyo': {
-            'main': {'temp': 18, 'feels_like': 17, 'humidity': 70},
-            'weather': [{'main': 'Rain', 'description': 'light rain'}],
-            'wind': {'speed': 4.1}
-        },
-        'paris': {
-            'main': {'temp': 16, 'feels_like': 15, 'humidity': 68},
-            'weather': [{'main': 'Clouds', 'description': 'few clouds'}],
-            'wind': {'speed': 4.5}
-        },
-        'dubai': {
-            'main': {'temp': 35, 'feels_like': 38, 'humidity': 55},
-            'weather': [{'main': 'Clear', 'description': 'clear sky'}],
-            'wind': {'speed': 2.8}
-        },
-        'mumbai': {
-            'main': {'temp': 28, 'feels_like': 30, 'humidity': 85},
-            'weather': [{'main': 'Rain', 'description': 'moderate rain'}],
-            'wind': {'speed': 6.2}
-        },
-        'sydney': {
-            'main': {'temp': 20, 'feels_like': 19, 'humidity': 65},
-            'weather': [{'main': 'Clear', 'description': 'sunny'}],
-            'wind': {'speed': 3.5}
-        },
-        'moscow': {
-            'main': {'temp': 5, 'feels_like': 2, 'humidity': 80},
-            'weather': [{'main': 'Snow', 'description': 'light snow'}],
-            'wind': {'speed': 7.1}
-        },
-        'singapore': {
-            'main': {'temp': 31, 'feels_like': 35, 'humidity': 90},
-            'weather': [{'main': 'Rain', 'description': 'tropical rain'}],
-            'wind': {'speed': 4.0}
-        },
-        'los angeles': {
-            'main': {'temp': 25, 'feels_like': 24, 'humidity': 50},
-            'weather': [{'main': 'Clear', 'description': 'sunny and warm'}],
-            'wind': {'speed': 2.5}
-        }
-    }
+        cache_headers = {'Cache-Control': f'public, max-age={VARIANT_REVALIDATE_SECONDS}'}
+    if negotiated:
+        cache_headers['Vary'] = 'Accept'
+    
+    # Revalidation never touches the variant file
+    if etag in request.if_none_match:
+        response = Response(status=304, headers=cache_headers)
+        response.set_etag(etag)
+        return response
+    
+    try:
+        variant_path = variant_cache.request(key, source, width, output_format).result(timeout=VARIANT_WAIT_SECONDS)
+    except FutureTimeoutError:
+        # Still rendering: show the original now, the variant is ready next time
+        response = redirect('/' + path, code=307)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    except (OSError, ValueError) as e:
+        return jsonify({'success': False, 'error': f'Cannot render image: {str(e)}'}), 422
+    
+    response = send_file(variant_path, mimetype=OUTPUT_FORMATS[output_format][1], etag=etag, conditional=True)
+    response.headers.update(cache_headers)
+    return response
+
+
+def warm_variants(paths, widths=GRID_VARIANT_WIDTHS, output_format='webp'):
+    """Queue variant renders for frontend/assets images without waiting; returns how many distinct variants were queued"""
+    # Many requested widths snap to the same ladder width; each variant is requested once
+    widths = {snap_width(width) for width in widths}
+    queued = set()
+    for path in paths:
+        source = variant_source(path) if isinstance(path, str) else None
+        if source is None:
+            continue
+        for width in widths:
+            key = variant_key(source, width, output_format)
+            if key not in queued:
+                variant_cache.request(key, source, width, output_format)
+                queued.add(key)
+    return len(queued)
+
+
+def queue_garment_analysis(object_id, image, owner=None):
+    """
+    Extract an item's colors and pattern on the analysis pool, then store them
+    as its 'analysis' field; returns whether the work was queued
+    """
+    source = variant_source(image)
+    if source is None:
+        return False
+    
+    def store(analysis):
+        analysis['analyzed_at'] = datetime.now().isoformat()
+        try:
+            get_clothes_collection().update_one({'_id': object_id}, {'$set': {'analysis': analysis}})
+        except Exception as e:
+            # The job only records the error; the log is what points the backfill at this item
+            logger.error('Storing garment analysis failed; item left for the backfill',
+                         extra={'item_id': str(object_id)}, exc_info=e)
+            raise
+        wardrobe_cache.invalidate(str(object_id), [owner])
+        return analysis
+    
+    try:
+        analysis_queue.submit(analyze_garment_file, source, on_success=store)
+    except QueueFullError:
+        logger.warning('Garment analysis queue is full; item left for the backfill', extra={'item_id': str(object_id)})
+        return False
+    return True
+
+
+def index_image(path, add=None):
+    """
+    Queue similarity features of a frontend/assets image unless it is indexed; returns whether it was queued
+    add(features) stores them (default: index them under path)
+    """
+    source = variant_source(path)
+    if source is None or path in similarity_index:
+        return False
+    try:
+        analysis_queue.submit(image_features_file, source,
+                              on_success=add or (lambda features: similarity_index.add(path, features)))
+    except QueueFullError:
+        return False
+    return True
+
+
+@app.route('/api/images/warm', methods=['POST'])
+def warm_images():
+    """
+    Render variants ahead of time (e.g. for a grid about to be shown)
+    Body (JSON): images (paths under frontend/assets), widths (default: grid widths)
+    """
+    data = request.get_json(silent=True) or {}
+    images = data.get('images')
+    widths = data.get('widths', list(GRID_VARIANT_WIDTHS))
+    if not isinstance(images, list) or len(images) > MAX_WARM_IMAGES:
+        return jsonify({'success': False, 'error': f'images must be a list of at most {MAX_WARM_IMAGES} paths'}), 400
+    if not isinstance(widths, list) or not 0 < len(widths) <= MAX_WARM_WIDTHS \
+            or not all(isinstance(width, int) and width > 0 for width in widths):
+        return jsonify({'success': False, 'error': f'widths must be a list of 1 to {MAX_WARM_WIDTHS} positive integers'}), 400
     
-    # Check if city exists in mock database
-    for city_name, weather_data in mock_cities.items():
-        if city_name in city_lower or city_lower in city_name:
-            weather_data['cod'] = 200
-            return weather_data
+    output_format = str(data.get('format') or negotiate_format(request.headers.get('Accept'))).lower()
+    output_format = OUTPUT_FORMAT_ALIASES.get(output_format, output_format)
+    if output_format not in OUTPUT_FORMATS:
+        return jsonify({'success': False, 'error': f"format must be one of: {', '.join(OUTPUT_FORMATS)}"}), 400
+    return jsonify({'success': True, 'queued': warm_variants(images, widths, output_format)}), 202
+
+
+def indexed_file_exists(key):
+    """Whether the image of a similarity index key is still on disk (rows outlive swept files)"""
+    return os.path.isfile(os.path.join(FRONTEND_DIR, key))
+
+
+def similar_images(paths, k):
+    """
+    Up to k indexed images like each of paths (which need not be indexed), closest first
+    Returns {path: [{'image', 'distance', 'duplicate'}]}; images whose files
+    were deleted since they were indexed are skipped
+    """
+    sources = [variant_source(path) for path in paths]
+    queries = [similarity_index.features(path) or image_features_file(source) for path, source in zip(paths, sources)]
+    for path in paths:
+        index_image(path)
     
-    return None
+    results = {}
+    # One spare neighbour stands in for the query itself
+    for path, matches in zip(paths, similarity_index.search_live(queries, k + 1, indexed_file_exists)):
+        results[path] = [{'image': key, 'distance': distance,
+                          'duplicate': hash_bits <= DUPLICATE_HASH_BITS and color <= DUPLICATE_COLOR_DISTANCE}
+                         for key, distance, hash_bits, color in matches if key != path][:k]
+    return results
 
 
-@app.route('/results/<filename>')
+def attach_items(neighbours):
+    """Add the wardrobe item (id, name, category, owner) of each neighbour image that belongs to one"""
+    images = {neighbour['image'] for neighbour in neighbours}
+    items = {}
+    for document in get_clothes_collection().find({'image': {'$in': list(images)}},
+                                                  {'image': 1, 'name': 1, 'category': 1, 'owner': 1}):
+        document['id'] = str(document.pop('_id'))
+        items.setdefault(document.pop('image'), document)
+    for neighbour in neighbours:
+        neighbour['item'] = items.get(neighbour['image'])
+
+
+@app.route('/api/similar', methods=['GET', 'POST'])
+def find_similar():
+    """
+    Images that look like a given one, from wardrobe images, retained uploads and results
+    GET query: image (path under frontend/assets) or item (wardrobe item id), k (default 10)
+    POST body (JSON): images (list of paths), k - one batched pass over the index
+    items=1 adds the wardrobe item each neighbour image belongs to
+    """
+    try:
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            paths = data.get('images')
+            k = data.get('k', 10)
+            if not isinstance(paths, list) or not 0 < len(paths) <= MAX_SIMILAR_QUERIES \
+                    or not all(isinstance(path, str) for path in paths):
+                return jsonify({'success': False, 'error': f'images must be a list of 1 to {MAX_SIMILAR_QUERIES} paths'}), 400
+        else:
+            k = request.args.get('k', 10, type=int)
+            path = request.args.get('image')
+            if request.args.get('item'):
+                from bson import ObjectId
+                item = get_clothes_collection().find_one({'_id': ObjectId(request.args['item'])}, {'image': 1})
+                if item is None:
+                    return jsonify({'success': False, 'error': 'Item not found'}), 404
+                path = item.get('image')
+            paths = [path] if isinstance(path, str) else []
+            if not paths:
+                return jsonify({'success': False, 'error': 'Give an image path or an item with an image'}), 400
+        
+        if not isinstance(k, int) or not 0 < k <= MAX_SIMILAR_RESULTS:
+            return jsonify({'success': False, 'error': f'k must be between 1 and {MAX_SIMILAR_RESULTS}'}), 400
+        missing = [path for path in paths if variant_source(path) is None]
+        if missing:
+            return jsonify({'success': False, 'error': f"Image not found: {missing[0]}"}), 404
+        
+        results = similar_images(paths, k)
+        if arg_flag('items'):
+            attach_items([neighbour for neighbours in results.values() for neighbour in neighbours])
+        if request.method == 'POST':
+            return jsonify({'success': True, 'results': results})
+        return jsonify({'success': True, 'image': paths[0], 'results': results[paths[0]]})
+    except (OSError, ValueError) as e:
+        return jsonify({'success': False, 'error': f'Cannot read image: {str(e)}'}), 422
+    except DATABASE_ERRORS:
+        raise
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/similar/index', methods=['POST'])
+def index_images():
+    """
+    Add images to the similarity index (e.g. results and uploads from before it existed)
+    Body (JSON): images (paths under frontend/assets)
+    """
+    data = request.get_json(silent=True) or {}
+    images = data.get('images')
+    if not isinstance(images, list) or len(images) > MAX_WARM_IMAGES or not all(isinstance(path, str) for path in images):
+        return jsonify({'success': False, 'error': f'images must be a list of at most {MAX_WARM_IMAGES} paths'}), 400
+    return jsonify({'success': True, 'queued': sum(index_image(path) for path in images),
+                    'indexed': similarity_index.stats()['rows']}), 202
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Report result, weather suggestion and wardrobe cache hit/miss counts and sizes, and the similarity index size"""
+    return jsonify({
+        'success': True,
+        'result_cache': result_cache.stats(),
+        'weather_suggestions': weather_service.stats(),
+        'wardrobe': wardrobe_cache.stats(),
+        'similarity_index': similarity_index.stats()
+    })
+
+
+@app.route('/results/<path:filename>')
 def serve_result(filename):
     """Serve generated result images"""
     return send_from_directory(RESULTS_FOLDER, filename)
 
 
-@app.route('/uploads/<filename>')
+@app.route('/api/storage/stats', methods=['GET'])
+def storage_stats():
+    """Report file counts, sizes and sweep counters for uploads and results"""
+    return jsonify({
+        'success': True,
+        'uploads': upload_store.stats(),
+        'results': result_store.stats(),
+        'derived': variant_cache.stats(),
+        'static': static_assets.stats()
+    })
+
+
+@app.route('/api/storage/sweep', methods=['POST'])
+def storage_sweep():
+    """Run the TTL/quota sweep now instead of waiting for the background sweeper"""
+    swept = {}
+    for name, store in (('uploads', upload_store), ('results', result_store), ('derived', derived_store)):
+        expired, evicted = store.sweep()
+        swept[name] = {'expired': expired, 'evicted': evicted}
+    return jsonify({'success': True, 'swept': swept})
+
+
+@app.route('/uploads/<path:filename>')
 def serve_upload(filename):
     """Serve uploaded images"""
     return send_from_directory(UPLOAD_FOLDER, filename)
 
 
 # Error handlers
+@app.errorhandler(RequestEntityTooLarge)
+@app.errorhandler(UploadTooLargeError)
+@app.errorhandler(ImageTooLargeError)
+def upload_too_large(e):
+    message = e.description if isinstance(e, RequestEntityTooLarge) else str(e)
+    return jsonify({'success': False, 'error': message}), 413
+
+
+@app.errorhandler(InvalidImageError)
+def invalid_image(e):
+    return jsonify({'success': False, 'error': str(e)}), 400
+
+
+def database_error_message(e):
+    return str(e) if isinstance(e, DatabaseUnavailableError) else f'Database unavailable: {e}'
+
+
+@app.errorhandler(DatabaseUnavailableError)
+@app.errorhandler(ConnectionFailure)
+def database_unavailable(e):
+    response = jsonify({'success': False, 'error': database_error_message(e)})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+
 @app.errorhandler(404)
 def not_found(e):
     return jsonify({'success': False, 'error': 'Endpoint not found'}), 404
@@ -535,16 +1721,18 @@ def server_error(e):
     return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
 
-if __name__ == '__main__':
-    print("""
+def main():
+    """Build the app and serve it in SERVER_MODE (run through serve.py)"""
+    create_app()
+    print(f"""
     ===========================================================
          Smart Wardrobe - Flask Backend Server
     ===========================================================
     
-    Server running at: http://localhost:5000
+    Server running at: http://localhost:{SERVER_PORT} ({SERVER_MODE} server)
     
     100% Offline - No External Dependencies!
-    MongoDB Status: """ + ("Connected" if client else "Failed") + """
+    MongoDB Status: Connects on first use (see /api/health)
     
     Features:
     - Virtual Cloth Try-On
@@ -555,22 +1743,43 @@ if __name__ == '__main__':
     
     API Endpoints:
     - POST /add_clothes - Add new clothes to database
-    - GET /clothes - Get all clothes from database
+    - POST /api/wardrobe/import - Bulk import (NDJSON or JSON array)
+    - GET /api/wardrobe/export - Stream all clothes as NDJSON
+    - GET /clothes - Get clothes from database (paginated, X-Next-Cursor)
     - GET /clothes/<id> - Get specific cloth by ID
     - PUT /clothes/<id> - Update cloth by ID
     - DELETE /clothes/<id> - Delete cloth by ID
     - GET /health - Health check with MongoDB status
+    - GET /api/cache/stats - Result cache hit/miss statistics
+    - GET /metrics - Prometheus metrics (latency, sizes, stages, MongoDB)
+    - GET /api/wardrobe/explain - Query plans and index coverage
+    - POST /api/outfits/rank - Best outfits from the wardrobe
+    - POST /api/outfits/generate - Top-K outfits for a city's weather
+    - GET /api/weather/cities?q= - City name autocomplete
+    - GET /api/weather/forecast?city= - Per-day suggestions
+    - GET /api/images/<path>?w= - Resized image variants
+    - GET /api/storage/stats - Upload/result storage usage
+    - POST /api/change_cloth/batch - One person, many garments
+    - POST /api/change_cloth/jobs - Queue a cloth change job
+    - GET /api/jobs/<id> - Poll job status (/events to stream)
     
     Main Pages:
-    - http://localhost:5000/landing.html
-    - http://localhost:5000/index.html
-    - http://localhost:5000/ai-cloth-changer.html
-    - http://localhost:5000/ai-stylist.html
+    - http://localhost:{SERVER_PORT}/landing.html
+    - http://localhost:{SERVER_PORT}/index.html
+    - http://localhost:{SERVER_PORT}/ai-cloth-changer.html
+    - http://localhost:{SERVER_PORT}/ai-stylist.html
     
     ===========================================================
     """)
     
-    # Run the Flask app
-    # Use debug=True for development, debug=False for production
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    if SERVER_MODE == 'threaded':
+        # Flask's own server, one thread per connection (for debugging and comparison)
+        app.run(host=SERVER_HOST, port=SERVER_PORT, threaded=True)
+    else:
+        # aiohttp: async wardrobe/weather routes, pooled rendering, everything else through Flask
+        run_async_server(sys.modules[__name__], SERVER_HOST, SERVER_PORT)
+
 
+if __name__ == '__main__':
+    # Worker processes import the main script again; serve.py keeps that to a few lines instead of this module
+    os.execv(sys.executable, [sys.executable, os.path.join(BASE_DIR, 'serve.py')] + sys.argv[1:])
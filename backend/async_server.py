@@ -0,0 +1,681 @@
+"""
+Smart Wardrobe - Async Server
+aiohttp server in front of the Flask app (app.py), the default way to run it
+- Wardrobe CRUD routes (/add_clothes, /clothes, /clothes/<id>,
+  /api/wardrobe/items) use Motor, so a request waiting on MongoDB holds a
+  coroutine rather than a thread
+- Weather routes answer on the event loop (they only read memory)
+- /api/change_cloth reads its uploads on the loop and renders in a
+  process pool; more than RENDER_QUEUE_SIZE unfinished renders get a 429
+- Every other route runs in the Flask app on a fixed thread pool through a
+  small WSGI bridge, so both servers expose the same API; request bodies
+  are streamed to it, not read up front
+Native routes return the same bodies and status codes as their Flask
+versions and share the app's caches, queues and metrics
+"""
+
+import asyncio
+import json
+import logging
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from io import RawIOBase
+from multiprocessing import get_context
+from urllib.parse import unquote_to_bytes
+
+from aiohttp import web
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from imaging import OUTPUT_FORMATS, render_cloth_change_timed
+from ingest import READ_CHUNK_SIZE, ImageTooLargeError, InvalidImageError, UploadTooLargeError, sniff_image_type
+from metrics import timed_stage
+from mongo import MongoConnection
+from wardrobe import QueryError, build_list_query, fetch_page_async, iter_documents_async
+
+logger = logging.getLogger('smart_wardrobe')
+
+# Response headers of the Flask app that aiohttp manages itself
+HOP_BY_HOP_HEADERS = {'connection', 'keep-alive', 'proxy-connection', 'te', 'trailer', 'transfer-encoding', 'upgrade'}
+
+# A bridged response body up to this size is read on the worker thread in one go;
+# longer or unsized bodies are pulled chunk by chunk as the client takes them
+EAGER_BODY_BYTES = 1024 * 1024
+
+
+class Upload:
+    """A multipart file read into memory (has the filename app.retain_upload expects)"""
+
+    def __init__(self, filename, data):
+        self.filename = filename
+        self.data = data
+
+
+def json_response(payload, status=200, headers=None):
+    return web.Response(text=json.dumps(payload, default=str), status=status,
+                        content_type='application/json', headers=headers)
+
+
+def query_flag(request, name):
+    """Interpret a query string parameter as a boolean flag (app.arg_flag)"""
+    return request.query.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+async def read_uploads(request, names, max_bytes):
+    """
+    Read the named file fields of a multipart body into memory, stopping as
+    soon as one exceeds max_bytes; other fields are skipped
+    Returns: {field name: Upload}
+    """
+    uploads = {}
+    if not request.content_type.startswith('multipart/'):
+        return uploads
+    reader = await request.multipart()
+    while True:
+        part = await reader.next()
+        if part is None:
+            return uploads
+        if part.name not in names or part.name in uploads or part.filename is None:
+            await part.release()
+            continue
+        chunks = []
+        total = 0
+        while True:
+            chunk = await part.read_chunk(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > max_bytes:
+                raise UploadTooLargeError(f"'{part.filename}' is larger than {max_bytes // (1024 * 1024)}MB")
+            chunks.append(chunk)
+        uploads[part.name] = Upload(part.filename, b''.join(chunks))
+
+
+class RequestInput(RawIOBase):
+    """
+    wsgi.input of a bridged request: the WSGI thread reads the body from the
+    aiohttp stream as the app consumes it, so large uploads and NDJSON
+    imports are never held in memory whole
+    """
+
+    def __init__(self, content, loop):
+        super().__init__()
+        self.content = content
+        self.loop = loop
+        self.chunk = memoryview(b'')
+        self.eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self.chunk:
+            if self.eof:
+                return 0
+            # Runs on the event loop, which is free while the WSGI thread waits
+            chunk = asyncio.run_coroutine_threadsafe(self.content.readany(), self.loop).result()
+            if not chunk:
+                self.eof = True
+                return 0
+            self.chunk = memoryview(chunk)
+        size = min(len(buffer), len(self.chunk))
+        buffer[:size] = self.chunk[:size]
+        self.chunk = self.chunk[size:]
+        return size
+
+
+def wsgi_environ(request, loop):
+    """WSGI environ of an aiohttp request; the body is read from the request stream on demand"""
+    environ = {
+        'REQUEST_METHOD': request.method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': unquote_to_bytes(request.rel_url.raw_path).decode('latin-1'),
+        'QUERY_STRING': request.rel_url.raw_query_string,
+        'SERVER_NAME': request.url.host or 'localhost',
+        'SERVER_PORT': str(request.url.port or ''),
+        'SERVER_PROTOCOL': f'HTTP/{request.version.major}.{request.version.minor}',
+        'REMOTE_ADDR': request.remote or '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': request.scheme,
+        'wsgi.input': RequestInput(request.content, loop),
+        'wsgi.input_terminated': True,  # The stream ends with the body (also for chunked requests)
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    if 'Content-Type' in request.headers:
+        environ['CONTENT_TYPE'] = request.headers['Content-Type']
+    if request.content_length is not None:
+        environ['CONTENT_LENGTH'] = str(request.content_length)
+    for name, value in request.headers.items():
+        key = 'HTTP_' + name.upper().replace('-', '_')
+        if key in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH'):
+            continue
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def start_wsgi(wsgi_app, environ):
+    """
+    Call a WSGI app (on a worker thread) and read the start of its body
+    Returns: (status, headers, chunks read, iterator for the rest or None)
+    """
+    started = []
+    written = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+        return written.append
+
+    result = wsgi_app(environ, start_response)
+    iterator = iter(result)
+    # Nothing is read ahead from bodies without a length (streams may block between chunks)
+    length = next((int(value) for name, value in started[1] if name.lower() == 'content-length'), None)
+    complete = length == 0
+    if length:
+        total = sum(len(chunk) for chunk in written)
+        for chunk in iterator:
+            written.append(chunk)
+            total += len(chunk)
+            if total >= min(length, EAGER_BODY_BYTES):
+                complete = total >= length
+                break
+        else:
+            complete = True
+    if complete and hasattr(result, 'close'):
+        result.close()
+    return started[0], started[1], written, (None if complete else (iterator, result))
+
+
+class AsyncServer:
+    """Routes, pools and the Motor connection of the aiohttp server; backend is the app module"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.mongo = MongoConnection(
+            backend.mongo.uri, backend.mongo.database_name,
+            retry_initial_seconds=backend.mongo.retry_initial_seconds,
+            retry_max_seconds=backend.mongo.retry_max_seconds,
+            client_class=AsyncIOMotorClient,
+            command_observer=backend.mongo.command_observer,
+            **backend.mongo.client_options)
+        self.render_pool = None
+        self.wsgi_pool = None
+        self.renders = 0  # Renders submitted and not finished
+        self.routes = {}  # Resource -> Flask rule of natively served routes, for metrics
+
+    def get_render_pool(self):
+        """The change_cloth process pool, created on first use (event loop thread only)"""
+        if self.render_pool is None:
+            # Workers only load imaging: backend.create_app() set the forkserver preload, and the
+            # server is started from serve.py, which is all a spawned worker re-imports
+            self.render_pool = ProcessPoolExecutor(max_workers=self.backend.RENDER_WORKERS,
+                                                   mp_context=get_context(self.backend.JOB_START_METHOD))
+        return self.render_pool
+
+    def get_wsgi_pool(self):
+        """The thread pool running bridged Flask requests, created on first use"""
+        if self.wsgi_pool is None:
+            self.wsgi_pool = ThreadPoolExecutor(max_workers=self.backend.WSGI_THREADS, thread_name_prefix='wsgi')
+        return self.wsgi_pool
+
+    def clothes(self):
+        """The Motor clothes collection; raises DatabaseUnavailableError (503) when MongoDB is unreachable"""
+        return self.mongo.collection('clothes')
+
+    def create_app(self):
+        application = web.Application(client_max_size=self.backend.MAX_REQUEST_SIZE, middlewares=[self.observe])
+        for method, rule, handler in (
+                ('POST', '/add_clothes', self.add_clothes),
+                ('GET', '/clothes', self.get_clothes),
+                ('GET', '/clothes/<cloth_id>', self.get_cloth),
+                ('PUT', '/clothes/<cloth_id>', self.update_cloth),
+                ('DELETE', '/clothes/<cloth_id>', self.delete_cloth),
+                ('GET', '/api/wardrobe/items', self.get_wardrobe_items),
+                ('POST', '/api/weather/suggest', self.weather_suggest),
+                ('GET', '/api/weather/cities', self.weather_cities),
+                ('GET', '/api/weather/forecast', self.weather_forecast),
+                ('POST', '/api/change_cloth', self.change_cloth)):
+            route = application.router.add_route(method, re.sub(r'<(\w+)>', r'{\1}', rule), handler)
+            self.routes[route.resource] = rule
+        # Methods a native path does not handle fall through to Flask too (405s and all)
+        application.router.add_route('*', '/{path:.*}', self.wsgi)
+        application.on_startup.append(self.on_startup)
+        application.on_cleanup.append(self.on_cleanup)
+        return application
+
+    async def on_startup(self, application):
+        if self.backend.ENSURE_INDEXES:
+            asyncio.get_running_loop().run_in_executor(None, self.connect_sync_client)
+
+    def connect_sync_client(self):
+        """Connect the app's pymongo client now, so its connect listener builds the wardrobe indexes"""
+        try:
+            self.backend.mongo.database()
+        except self.backend.DATABASE_ERRORS:
+            pass  # Logged by MongoConnection; the first Flask route using the database retries
+
+    async def on_cleanup(self, application):
+        if self.render_pool is not None:
+            self.render_pool.shutdown(wait=False, cancel_futures=True)
+        if self.wsgi_pool is not None:
+            self.wsgi_pool.shutdown(wait=False, cancel_futures=True)
+        self.mongo.close()
+
+    @web.middleware
+    async def observe(self, request, handler):
+        """Error handling and request metrics for the native routes (Flask observes its own)"""
+        rule = self.routes.get(request.match_info.route.resource)
+        if rule is None:
+            return await handler(request)
+
+        started = time.perf_counter()
+        try:
+            response = await handler(request)
+        except web.HTTPException:
+            raise
+        except Exception as e:
+            response = self.error_response(e)
+        elapsed = time.perf_counter() - started
+
+        backend = self.backend
+        backend.REQUEST_SECONDS.observe(elapsed, request.method, rule, str(response.status))
+        backend.REQUEST_BYTES.observe(request.content_length or 0, request.method, rule)
+        if response.content_length is not None:
+            backend.RESPONSE_BYTES.observe(response.content_length, request.method, rule)
+        if elapsed >= backend.SLOW_REQUEST_SECONDS:
+            logger.warning('Slow request', extra={'method': request.method, 'route': rule, 'path': request.path,
+                                                  'status': response.status, 'seconds': round(elapsed, 3)})
+        return response
+
+    def body_too_large(self, request):
+        """The 413 response for a request whose Content-Length is over MAX_REQUEST_SIZE, or None"""
+        limit = self.backend.MAX_REQUEST_SIZE
+        if (request.content_length or 0) > limit:
+            return json_response({'success': False, 'error': f'Request body is larger than {limit // (1024 * 1024)}MB'}, 413)
+        return None
+
+    def error_response(self, e):
+        """The response the Flask error handlers give for an exception a route let through"""
+        if isinstance(e, (UploadTooLargeError, ImageTooLargeError)):
+            return json_response({'success': False, 'error': str(e)}, 413)
+        if isinstance(e, InvalidImageError):
+            return json_response({'success': False, 'error': str(e)}, 400)
+        if isinstance(e, self.backend.DATABASE_ERRORS):
+            return json_response({'success': False, 'error': self.backend.database_error_message(e)}, 503,
+                                 {'Retry-After': '5'})
+        logger.error('Unhandled error', exc_info=e)
+        return json_response({'success': False, 'error': 'Internal server error'}, 500)
+
+    async def wsgi(self, request):
+        """Serve a request with the Flask app on the WSGI thread pool, streaming its request and response"""
+        too_large = self.body_too_large(request)
+        if too_large is not None:
+            return too_large
+        loop = asyncio.get_running_loop()
+        pool = self.get_wsgi_pool()
+        status, headers, chunks, rest = await loop.run_in_executor(
+            pool, start_wsgi, self.backend.app, wsgi_environ(request, loop))
+
+        code, _, reason = status.partition(' ')
+        response = web.StreamResponse(status=int(code), reason=reason or None)
+        for name, value in headers:
+            if name.lower() not in HOP_BY_HOP_HEADERS:
+                response.headers.add(name, value)
+        try:
+            await response.prepare(request)
+            for chunk in chunks:
+                await response.write(chunk)
+            if rest is not None:
+                iterator = rest[0]
+                while True:
+                    chunk = await loop.run_in_executor(pool, next, iterator, None)
+                    if chunk is None:
+                        break
+                    await response.write(chunk)
+            await response.write_eof()
+        finally:
+            if rest is not None and hasattr(rest[1], 'close'):
+                await loop.run_in_executor(pool, rest[1].close)
+        return response
+
+    # Wardrobe routes
+
+    def wants_ndjson(self, request):
+        """Whether the client asked for a streamed NDJSON listing"""
+        return (request.query.get('format') == 'ndjson'
+                or 'application/x-ndjson' in request.headers.get('Accept', ''))
+
+    async def stream_ndjson(self, request, documents):
+        """Stream documents as newline-delimited JSON while the cursor produces them"""
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        async for document in documents:
+            await response.write((json.dumps(document, default=str) + '\n').encode())
+        await response.write_eof()
+        return response
+
+    async def cached_page(self, args):
+        """One listing page for request args, read through the wardrobe cache"""
+        query = build_list_query(args)
+        return await self.backend.wardrobe_cache.get_page_async(args, lambda: fetch_page_async(self.clothes(), query))
+
+    async def queue_image_work(self, object_id, image, owner, warm=True):
+        """
+        Grid thumbnails, color/pattern analysis and similarity features of an
+        item's image, queued from a thread (the first submit starts worker processes)
+        """
+        backend = self.backend
+
+        def queue():
+            if warm:
+                backend.warm_variants([image])
+            backend.queue_garment_analysis(object_id, image, owner)
+            backend.index_image(image)
+        await asyncio.to_thread(queue)
+
+    async def add_clothes(self, request):
+        """Add new clothes to MongoDB"""
+        try:
+            clothes = self.clothes()
+
+            data = await request.json()
+
+            # Add timestamp
+            data['created_at'] = datetime.now().isoformat()
+
+            # Insert into MongoDB
+            result = await clothes.insert_one(data)
+            self.backend.wardrobe_cache.invalidate(owners=[data.get('owner')])
+
+            if isinstance(data.get('image'), str):
+                await self.queue_image_work(result.inserted_id, data['image'], data.get('owner'))
+
+            return json_response({
+                "message": "Cloth added successfully!",
+                "id": str(result.inserted_id)
+            })
+        except self.backend.DATABASE_ERRORS:
+            raise
+        except Exception as e:
+            return json_response({"error": str(e)}, 500)
+
+    async def get_clothes(self, request):
+        """Get clothes from MongoDB as a JSON list, one page at a time (cursor in X-Next-Cursor)"""
+        try:
+            if self.wants_ndjson(request):
+                query = build_list_query(request.query, default_limit=None)
+                return await self.stream_ndjson(request, iter_documents_async(self.clothes(), query))
+
+            data, next_cursor = await self.cached_page(request.query)
+            return json_response(data, headers={'X-Next-Cursor': next_cursor} if next_cursor else None)
+        except QueryError as e:
+            return json_response({"error": str(e)}, 400)
+        except self.backend.DATABASE_ERRORS:
+            raise
+        except Exception as e:
+            return json_response({"error": str(e)}, 500)
+
+    async def get_wardrobe_items(self, request):
+        """Get wardrobe items from MongoDB, one page at a time (see app.get_wardrobe_items)"""
+        try:
+            if self.wants_ndjson(request):
+                query = build_list_query(request.query, default_limit=None)
+                return await self.stream_ndjson(request, iter_documents_async(self.clothes(), query))
+
+            items, next_cursor = await self.cached_page(request.query)
+            return json_response({'success': True, 'items': items, 'next_cursor': next_cursor})
+        except QueryError as e:
+            return json_response({'success': False, 'error': str(e)}, 400)
+        except self.backend.DATABASE_ERRORS:
+            raise
+        except Exception as e:
+            return json_response({'success': False, 'error': str(e)}, 500)
+
+    async def get_cloth(self, request):
+        """Get specific cloth by ID"""
+        try:
+            object_id = ObjectId(request.match_info['cloth_id'])
+            cloth = await self.backend.wardrobe_cache.get_item_async(
+                str(object_id), lambda: self.clothes().find_one({"_id": object_id}, {"_id": 0}))
+
+            if cloth:
+                return json_response(cloth)
+            else:
+                return json_response({"error": "Cloth not found"}, 404)
+        except self.backend.DATABASE_ERRORS:
+            raise
+        except Exception as e:
+            return json_response({"error": str(e)}, 500)
+
+    async def update_cloth(self, request):
+        """Update specific cloth by ID"""
+        try:
+            clothes = self.clothes()
+
+            object_id = ObjectId(request.match_info['cloth_id'])
+            data = await request.json()
+            data['updated_at'] = datetime.now().isoformat()
+
+            # The previous owner is returned too, so both owners' cached listings are invalidated
+            previous = await clothes.find_one_and_update(
+                {"_id": object_id},
+                {"$set": data},
+                projection={"owner": 1}
+            )
+
+            if previous is not None:
+                self.backend.wardrobe_cache.invalidate(str(object_id), [previous.get('owner'), data.get('owner')])
+                if isinstance(data.get('image'), str):
+                    await self.queue_image_work(object_id, data['image'], data.get('owner', previous.get('owner')),
+                                                warm=False)
+                return json_response({"message": "Cloth updated successfully!"})
+            else:
+                return json_response({"error": "Cloth not found"}, 404)
+        except self.backend.DATABASE_ERRORS:
+            raise
+        except Exception as e:
+            return json_response({"error": str(e)}, 500)
+
+    async def delete_cloth(self, request):
+        """Delete specific cloth by ID"""
+        try:
+            clothes = self.clothes()
+
+            object_id = ObjectId(request.match_info['cloth_id'])
+            deleted = await clothes.find_one_and_delete({"_id": object_id}, projection={"owner": 1})
+
+            if deleted is not None:
+                self.backend.wardrobe_cache.invalidate(str(object_id), [deleted.get('owner')])
+                return json_response({"message": "Cloth deleted successfully!"})
+            else:
+                return json_response({"error": "Cloth not found"}, 404)
+        except self.backend.DATABASE_ERRORS:
+            raise
+        except Exception as e:
+            return json_response({"error": str(e)}, 500)
+
+    # Weather routes
+
+    async def weather_suggest(self, request):
+        """Weather-based outfit suggestions for a city or a batch of cities (see app.weather_suggest)"""
+        backend = self.backend
+        try:
+            try:
+                data = await request.json()
+            except ValueError:
+                data = None
+            data = data or {}
+
+            cities = data.get('cities')
+            if cities is not None:
+                if not isinstance(cities, list) or not all(isinstance(city, str) for city in cities):
+                    return json_response({'success': False, 'error': 'cities must be a list of city names'}, 400)
+                if len(cities) > backend.MAX_WEATHER_BATCH_CITIES:
+                    return json_response({'success': False, 'error': f'At most {backend.MAX_WEATHER_BATCH_CITIES} cities per request'}, 400)
+                return json_response({
+                    'success': True,
+                    'results': [backend.city_suggestion(city.strip())[0] for city in cities]
+                })
+
+            city = data.get('city', '')
+            if not isinstance(city, str) or not city.strip():
+                return json_response({'success': False, 'error': 'City name is required'}, 400)
+
+            response, status = backend.city_suggestion(city.strip())
+            return json_response(response, status)
+
+        except Exception as e:
+            logger.exception('Weather suggestion failed')
+            return json_response({
+                'success': False,
+                'error': f'An error occurred: {str(e)}'
+            }, 500)
+
+    async def weather_cities(self, request):
+        """Autocomplete city names for the weather stylist (see app.weather_cities)"""
+        backend = self.backend
+        query = request.query.get('q', '')
+        limit = backend.int_arg(request.query, 'limit', 8)
+        if not 1 <= limit <= backend.MAX_CITY_SUGGESTIONS:
+            return json_response({'success': False, 'error': f'limit must be between 1 and {backend.MAX_CITY_SUGGESTIONS}'}, 400)
+
+        return json_response({
+            'success': True,
+            'query': query,
+            'cities': backend.weather_service.autocomplete(query, limit)
+        })
+
+    async def weather_forecast(self, request):
+        """Per-day outfit suggestions for a city (see app.weather_forecast)"""
+        backend = self.backend
+        city = request.query.get('city', '').strip()
+        days = backend.int_arg(request.query, 'days', 7)
+        if not city:
+            return json_response({'success': False, 'error': 'City name is required'}, 400)
+        if not 1 <= days <= backend.MAX_FORECAST_DAYS:
+            return json_response({'success': False, 'error': f'days must be between 1 and {backend.MAX_FORECAST_DAYS}'}, 400)
+
+        forecast = backend.weather_service.forecast(city, days)
+        if forecast is None:
+            return json_response({'success': False, 'error': f"City '{city}' not found"}, 404)
+        return json_response(forecast)
+
+    # Cloth change
+
+    async def render(self, person_bytes, garment_bytes, options):
+        """(encoded result, stage timings) from the render pool"""
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.get_render_pool(), render_cloth_change_timed,
+                                              person_bytes, garment_bytes,
+                                              options['format'], options['quality'], options['width'])
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool for the next request
+            self.render_pool = None
+            raise
+
+    def cloth_change_response(self, request, cache_key, result_bytes, options, cached, timings):
+        """change_cloth response: JSON (result URL, base64 on request) or ?response=image"""
+        backend = self.backend
+        if request.query.get('response') == 'image':
+            return web.Response(body=result_bytes, content_type=OUTPUT_FORMATS[options['format']][1], headers={
+                'X-Result-Url': backend.result_url_for(cache_key),
+                'X-Cache': 'HIT' if cached else 'MISS'
+            })
+        return json_response(backend.cloth_change_payload(cache_key, result_bytes, options, cached,
+                                                          query_flag(request, 'include_base64'), timings))
+
+    async def change_cloth(self, request):
+        """
+        AI cloth change (see app.change_cloth); the uploads are read here and
+        the decode/composite/encode work runs in the render process pool
+        """
+        backend = self.backend
+        timings = {}
+        try:
+            options, error = backend.read_output_options(request.query)
+            if error:
+                return json_response({'success': False, 'error': error}, 400)
+
+            too_large = self.body_too_large(request)
+            if too_large is not None:
+                return too_large
+            with timed_stage(timings, 'upload'):
+                uploads = await read_uploads(request, ('person', 'garment'), backend.MAX_FILE_SIZE)
+
+            if 'person' not in uploads:
+                return json_response({'success': False, 'error': 'No person image provided'}, 400)
+            if 'garment' not in uploads:
+                return json_response({'success': False, 'error': 'No garment image provided'}, 400)
+            person, garment = uploads['person'], uploads['garment']
+            if person.filename == '' or garment.filename == '':
+                return json_response({'success': False, 'error': 'Empty filename'}, 400)
+            if not (backend.allowed_file(person.filename) and backend.allowed_file(garment.filename)):
+                return json_response({'success': False, 'error': 'Invalid file type. Only PNG, JPG, JPEG, WEBP allowed'}, 400)
+            for upload in (person, garment):
+                if sniff_image_type(upload.data) is None:
+                    raise InvalidImageError(f"'{upload.filename}' is not a PNG, JPEG or WEBP image")
+
+            # Hashing and the disk tier of the cache run off the loop
+            def lookup():
+                cache_key = backend.result_key_for(person.data, garment.data, options)
+                return cache_key, backend.result_cache.get(cache_key)
+            with timed_stage(timings, 'cache'):
+                cache_key, result_bytes = await asyncio.to_thread(lookup)
+            if result_bytes is not None:
+                return self.cloth_change_response(request, cache_key, result_bytes, options, True, timings)
+
+            if self.renders >= backend.RENDER_QUEUE_SIZE:
+                return json_response({'success': False, 'error': f'{self.renders} renders in progress; retry shortly'},
+                                     429, {'Retry-After': str(backend.JOB_RETRY_AFTER_SECONDS)})
+
+            with timed_stage(timings, 'upload'):
+                await asyncio.to_thread(lambda: (backend.retain_upload(person, person.data),
+                                                 backend.retain_upload(garment, garment.data)))
+
+            self.renders += 1
+            try:
+                result_bytes, render_timings = await self.render(person.data, garment.data, options)
+            finally:
+                self.renders -= 1
+            for stage, seconds in render_timings.items():
+                timings[stage] = timings.get(stage, 0) + seconds
+
+            def store():
+                backend.result_cache.put(cache_key, result_bytes)
+                backend.index_result(cache_key)
+            with timed_stage(timings, 'cache'):
+                await asyncio.to_thread(store)
+
+            return self.cloth_change_response(request, cache_key, result_bytes, options, False, timings)
+
+        except (UploadTooLargeError, ImageTooLargeError, InvalidImageError):
+            raise
+        except Exception as e:
+            logger.exception('Cloth change failed')
+            return json_response({
+                'success': False,
+                'error': f'Processing failed: {str(e)}'
+            }, 500)
+        finally:
+            for stage, seconds in timings.items():
+                backend.STAGE_SECONDS.observe(seconds, 'change_cloth', stage)
+
+
+def create_app(backend):
+    """aiohttp application serving the app module backend; returns (application, AsyncServer)"""
+    backend.create_app()
+    server = AsyncServer(backend)
+    return server.create_app(), server
+
+
+def run_async_server(backend, host, port):
+    """Serve until interrupted"""
+    application, _ = create_app(backend)
+    web.run_app(application, host=host, port=port, print=None)
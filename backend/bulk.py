@@ -0,0 +1,115 @@
+"""
+Smart Wardrobe - Bulk Import
+Validates wardrobe items from NDJSON or JSON array bodies and writes them
+with unordered insert_many batches instead of one insert per item
+- NDJSON is parsed line by line from the request stream, so memory stays
+  bounded by one batch no matter how large the import is
+- Invalid items and failed writes are reported per item; the rest are stored
+"""
+
+import json
+from datetime import datetime
+
+from pymongo.errors import BulkWriteError
+
+DEFAULT_BATCH_SIZE = 500
+
+# Errors listed in an import summary; further ones are only counted
+MAX_REPORTED_ERRORS = 1000
+
+# Fields an item must have, as non-empty strings
+REQUIRED_FIELDS = ('name', 'category')
+
+
+class ImportItemError(ValueError):
+    """Raised for an item that cannot be imported"""
+
+
+def validate_item(item):
+    """
+    Check one item and return the document to insert
+    The client's _id is dropped (the database assigns one) and created_at
+    is set like add_clothes does when the item has none
+    """
+    if not isinstance(item, dict):
+        raise ImportItemError('Item must be a JSON object')
+    for field in REQUIRED_FIELDS:
+        value = item.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise ImportItemError(f"'{field}' must be a non-empty string")
+    for key in item:
+        if key.startswith('$'):
+            raise ImportItemError(f"Field names may not start with '$': {key}")
+
+    document = {key: value for key, value in item.items() if key != '_id'}
+    document.setdefault('created_at', datetime.now().isoformat())
+    return document
+
+
+def iter_ndjson(stream):
+    """
+    Yield (index, item) for each line of an NDJSON stream
+    index is the 0-based line number; a line that is not valid JSON yields
+    an ImportItemError as its item; blank lines are skipped
+    """
+    for index, line in enumerate(stream):
+        if not line.strip():
+            continue
+        try:
+            yield index, json.loads(line)
+        except ValueError as e:
+            yield index, ImportItemError(f'Invalid JSON: {e}')
+
+
+def iter_array(items):
+    """Yield (index, item) for a parsed JSON array"""
+    return enumerate(items)
+
+
+def import_items(collection, entries, batch_size=DEFAULT_BATCH_SIZE, max_items=None):
+    """
+    Validate and insert (index, item) entries in unordered batches
+    Returns: summary dict with received/inserted/failed counts and errors,
+    a list of {'index', 'error'} for the items that were not stored
+    """
+    summary = {'received': 0, 'inserted': 0, 'failed': 0, 'errors': [], 'errors_truncated': False}
+
+    def fail(index, message):
+        summary['failed'] += 1
+        if len(summary['errors']) < MAX_REPORTED_ERRORS:
+            summary['errors'].append({'index': index, 'error': message})
+        else:
+            summary['errors_truncated'] = True
+
+    def flush(batch):
+        if not batch:
+            return
+        indexes = [index for index, _ in batch]
+        try:
+            result = collection.insert_many([document for _, document in batch], ordered=False)
+            summary['inserted'] += len(result.inserted_ids)
+        except BulkWriteError as e:
+            write_errors = e.details.get('writeErrors', [])
+            summary['inserted'] += e.details.get('nInserted', len(batch) - len(write_errors))
+            for error in write_errors:
+                fail(indexes[error['index']], error.get('errmsg', 'Write failed'))
+
+    batch = []
+    for index, item in entries:
+        summary['received'] += 1
+        if max_items is not None and summary['received'] > max_items:
+            fail(index, f'Import is limited to {max_items} items')
+            continue
+        try:
+            if isinstance(item, ImportItemError):
+                raise item
+            batch.append((index, validate_item(item)))
+        except ImportItemError as e:
+            fail(index, str(e))
+            continue
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    flush(batch)
+
+    return summary
@@ -0,0 +1,238 @@
+"""
+Smart Wardrobe - City Resolver
+Exact, prefix and typo-tolerant city name lookup for the weather stylist
+- Names are normalized (accents, case, punctuation and spacing removed)
+- Prefix search runs on a sorted array of every name and of every later
+  word of a name ("york" finds "New York"), which works like a compact
+  trie: a prefix is a contiguous range found with two binary searches.
+  Ranges too large to rank per request get their best entries precomputed
+- Typo tolerance uses a trigram index: the names sharing the most
+  trigrams with the query are checked with a bounded edit distance
+Results are ranked exact > name prefix > word prefix > fuzzy, then by
+weight (e.g. population), shorter name, and name
+"""
+
+import bisect
+import heapq
+import re
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+# Ranges with more entries than this have their best entries precomputed
+PREFIX_SCAN_LIMIT = 256
+# Most ranked entries kept per precomputed prefix (the largest page served)
+MAX_CANDIDATES = 20
+# Shortest query checked for typos, and the edit distance allowed
+FUZZY_MIN_LENGTH = 4
+FUZZY_LONG_QUERY = 8  # Queries at least this long allow two edits instead of one
+# Names sharing the most trigrams with the query that are checked for edit distance
+FUZZY_CHECKED_CANDIDATES = 24
+# Shortest prefix that resolve() accepts as a match
+RESOLVE_MIN_PREFIX = 3
+
+EXACT, PREFIX, WORD_PREFIX, FUZZY = 'exact', 'prefix', 'word_prefix', 'fuzzy'
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+_PREFIX_END = '\uffff'
+
+
+def normalize_name(name):
+    """Lower-case, strip accents, and turn punctuation and whitespace runs into single spaces"""
+    decomposed = unicodedata.normalize('NFKD', name.lower())
+    ascii_name = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return _NON_ALNUM.sub(' ', ascii_name).strip()
+
+
+def _trigrams(key):
+    """Distinct trigrams of a normalized name, padded so word edges count"""
+    padded = f' {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distances(query, key, limit):
+    """
+    Optimal string alignment distances from query to key and to the closest
+    prefix of key, each capped at limit + 1
+    Only the diagonal band |i - j| <= limit is filled, since cells outside
+    it always exceed limit
+    Returns: (distance to key, distance to best prefix of key)
+    """
+    over = limit + 1
+    width = len(key)
+    if width < len(query) - limit:
+        return over, over
+    previous2 = None
+    previous = [j if j <= limit else over for j in range(width + 1)]
+    row_min = 0
+    for i in range(1, len(query) + 1):
+        char = query[i - 1]
+        current = [over] * (width + 1)
+        if i <= limit:
+            current[0] = i
+        row_min = current[0]
+        for j in range(max(1, i - limit), min(width, i + limit) + 1):
+            value = previous[j - 1] + (char != key[j - 1])
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if i > 1 and j > 1 and char == key[j - 2] and query[i - 2] == key[j - 1] and previous2[j - 2] + 1 < value:
+                value = previous2[j - 2] + 1
+            if value > over:
+                value = over
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > limit:
+            return over, over
+        previous2, previous = previous, current
+    return previous[-1], row_min
+
+
+class CityIndex:
+    """
+    Immutable search index over a list of city names
+    Lookups return entry ids (positions in the names list)
+    """
+
+    def __init__(self, names, weights=None):
+        self.names = list(names)
+        self.keys = [normalize_name(name) for name in self.names]
+        self.weights = list(weights) if weights is not None else [0] * len(self.names)
+
+        self._exact = defaultdict(list)
+        for entry, key in enumerate(self.keys):
+            self._exact[key].append(entry)
+
+        # Every name and every later word start of a name, sorted by text
+        prefix_entries = []
+        for entry, key in enumerate(self.keys):
+            prefix_entries.append((key, entry, 0))
+            for match in re.finditer(' ', key):
+                prefix_entries.append((key[match.end():], entry, 1))
+        prefix_entries.sort()
+        self._prefix_keys = [key for key, _, _ in prefix_entries]
+        self._prefix_entries = [(entry, word) for _, entry, word in prefix_entries]
+        self._top = self._precompute_top()
+
+        postings = defaultdict(list)
+        for entry, key in enumerate(self.keys):
+            for trigram in _trigrams(key):
+                postings[trigram].append(entry)
+        self._postings = {trigram: np.array(entries, dtype=np.int32) for trigram, entries in postings.items()}
+        self._lengths = np.array([len(key) for key in self.keys], dtype=np.int32)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _rank(self, position):
+        """Sort key of a prefix entry: whole-name matches first, then weight, length, name"""
+        entry, word = self._prefix_entries[position]
+        return word, -self.weights[entry], len(self.keys[entry]), self.keys[entry], entry
+
+    def _precompute_top(self):
+        """Best MAX_CANDIDATES positions for every prefix whose range exceeds PREFIX_SCAN_LIMIT"""
+        top = {}
+        ranges = [(0, len(self._prefix_keys))]
+        length = 0
+        while ranges:
+            length += 1
+            larger = []
+            for lo, hi in ranges:
+                start = lo
+                while start < hi:
+                    prefix = self._prefix_keys[start][:length]
+                    if len(prefix) < length:
+                        # A key ending here sorts before its longer siblings
+                        start += 1
+                        continue
+                    end = bisect.bisect_left(self._prefix_keys, prefix + _PREFIX_END, start, hi)
+                    if end - start > PREFIX_SCAN_LIMIT:
+                        top[prefix] = heapq.nsmallest(MAX_CANDIDATES, range(start, end), key=self._rank)
+                        larger.append((start, end))
+                    start = end
+            ranges = larger
+        return top
+
+    def _prefix_positions(self, query, limit):
+        """Best prefix-entry positions for a normalized query"""
+        lo = bisect.bisect_left(self._prefix_keys, query)
+        hi = bisect.bisect_left(self._prefix_keys, query + _PREFIX_END, lo)
+        if hi - lo > PREFIX_SCAN_LIMIT:
+            return self._top[query][:limit]
+        return heapq.nsmallest(limit, range(lo, hi), key=self._rank)
+
+    def _fuzzy(self, query, limit):
+        """Entries within the allowed edit distance of query, as (distance, entry), best first"""
+        max_distance = 2 if len(query) >= FUZZY_LONG_QUERY else 1
+        trigrams = _trigrams(query)
+        postings = [self._postings[trigram] for trigram in trigrams if trigram in self._postings]
+        # Each edit changes at most three trigrams (four for a transposition); a
+        # partly typed name also lacks the query's final trigram
+        needed = max(1, len(trigrams) - 3 * max_distance - 2)
+        if len(postings) < needed:
+            return []
+
+        entries, shared = np.unique(np.concatenate(postings), return_counts=True)
+        keep = (shared >= needed) & (self._lengths[entries] >= len(query) - max_distance)
+        candidates, shared = entries[keep], shared[keep]
+        if len(candidates) > FUZZY_CHECKED_CANDIDATES:
+            candidates = candidates[np.argpartition(-shared, FUZZY_CHECKED_CANDIDATES)[:FUZZY_CHECKED_CANDIDATES]]
+
+        matches = []
+        for entry in candidates.tolist():
+            key = self.keys[entry]
+            distance, prefix_distance = edit_distances(query, key, max_distance)
+            if distance > max_distance:
+                # Typo in a partly typed name: ranked after whole-name typos
+                distance = prefix_distance + 0.5
+            if distance <= max_distance:
+                matches.append((distance, -self.weights[entry], len(key), key, entry))
+        return [(match[0], match[-1]) for match in heapq.nsmallest(limit, matches)]
+
+    def search(self, query, limit=10, fuzzy=True):
+        """
+        Ranked matches for a user's (partial) input
+        Returns: list of (entry, match kind) with kinds exact, prefix,
+        word_prefix or fuzzy; at most limit entries, each at most once
+        """
+        query = normalize_name(query)
+        limit = min(limit, MAX_CANDIDATES)
+        if not query or limit <= 0:
+            return []
+
+        found = {}
+        for entry in self._exact.get(query, ()):
+            found.setdefault(entry, EXACT)
+        for position in self._prefix_positions(query, limit + len(found)):
+            entry, word = self._prefix_entries[position]
+            found.setdefault(entry, WORD_PREFIX if word else PREFIX)
+            if len(found) >= limit:
+                break
+
+        # Typo matches fill up the list unless the query is itself a known name
+        if fuzzy and len(found) < limit and len(query) >= FUZZY_MIN_LENGTH and query not in self._exact:
+            for _, entry in self._fuzzy(query, limit):
+                found.setdefault(entry, FUZZY)
+                if len(found) >= limit:
+                    break
+        return list(found.items())[:limit]
+
+    def resolve(self, query):
+        """
+        Single best entry for a submitted name, or None
+        Trailing words are dropped until something matches, so "London, UK"
+        resolves to London
+        """
+        words = normalize_name(query).split()
+        while words:
+            candidate = ' '.join(words)
+            matches = self.search(candidate, 1)
+            if matches:
+                entry, kind = matches[0]
+                if kind == EXACT or kind == FUZZY or len(candidate) >= RESOLVE_MIN_PREFIX:
+                    return entry
+            words.pop()
+        return None
@@ -0,0 +1,137 @@
+"""
+Smart Wardrobe - Compositing Engine
+Blends a garment onto a person photo with NumPy, working in place on a
+single RGBA buffer and touching only the garment's bounding box
+Integer math mirrors Pillow's alpha_composite and masked paste, so the
+default parameters give byte-identical output to the PIL layer stack
+"""
+
+import numpy as np
+from PIL import Image
+
+# Fixed-point precision used by Pillow's alpha_composite
+PRECISION_BITS = 7
+
+
+def _div255(values):
+    """Rounded division by 255 on non-negative integers (Pillow's DIV255)"""
+    values = values + 128
+    return ((values >> 8) + values) >> 8
+
+
+def _shift_div255(values):
+    """Pillow's SHIFTFORDIV255, the caller adds the rounding term"""
+    return ((values >> 8) + values) >> 8
+
+
+def garment_alpha(garment_array, opacity=1.0, feather=0):
+    """
+    Alpha channel of the garment with opacity and feathered edges applied
+    - opacity: 0..1 multiplier on the garment's own alpha
+    - feather: width in pixels of a linear fade-out along the garment edges
+    Returns the raw alpha (no copy) when both are at their defaults
+    """
+    alpha = garment_array[..., 3]
+    if opacity >= 1.0 and feather <= 0:
+        return alpha
+
+    weight = np.float32(max(0.0, min(1.0, opacity)))
+    if feather > 0:
+        height, width = alpha.shape
+        ramp_x = np.minimum(np.arange(width, dtype=np.float32) + 0.5,
+                            np.arange(width, 0, -1, dtype=np.float32) - 0.5) / feather
+        ramp_y = np.minimum(np.arange(height, dtype=np.float32) + 0.5,
+                            np.arange(height, 0, -1, dtype=np.float32) - 0.5) / feather
+        mask = np.minimum(np.clip(ramp_y, 0, 1)[:, None], np.clip(ramp_x, 0, 1)[None, :])
+        weight = mask * weight
+
+    return np.rint(alpha * weight).astype(np.uint8)
+
+
+def alpha_composite_into(dst, src_rgb, src_alpha):
+    """
+    Composite src over dst in place (both uint8, dst is RGBA)
+    Same fixed-point formula as Pillow's ImagingAlphaComposite, where a fully
+    opaque source pixel reduces to a copy and a transparent one to a no-op,
+    so the arithmetic only runs on the (usually few) partially transparent pixels
+    """
+    opaque = src_alpha == 255
+    if opaque.all():
+        dst[..., :3] = src_rgb
+        dst[..., 3] = 255
+        return
+
+    np.copyto(dst[..., :3], src_rgb, where=opaque[..., None])
+    np.copyto(dst[..., 3], 255, where=opaque)
+
+    ys, xs = np.nonzero((src_alpha > 0) & ~opaque)
+    if len(ys) == 0:
+        return
+
+    sa = src_alpha[ys, xs].astype(np.uint32)
+    da = dst[ys, xs, 3].astype(np.uint32)
+    outa255 = sa * 255 + da * (255 - sa)
+
+    coef1 = sa * (255 * 255 << PRECISION_BITS) // outa255
+    coef2 = (255 << PRECISION_BITS) - coef1
+
+    blended = src_rgb[ys, xs] * coef1[:, None] + dst[ys, xs, :3] * coef2[:, None]
+    blended += 0x80 << PRECISION_BITS
+    dst[ys, xs, :3] = _shift_div255(blended) >> PRECISION_BITS
+    dst[ys, xs, 3] = _shift_div255(outa255 + 0x80)
+
+
+def flatten_into(region, background):
+    """
+    Replace the RGB of an RGBA region with its blend over an opaque background
+    Same rounding as pasting onto a solid image with the alpha as mask
+    """
+    alpha = region[..., 3:4].astype(np.uint16)
+    background = np.asarray(background, dtype=np.uint16)
+    region[..., :3] = _div255(background * (255 - alpha) + region[..., :3] * alpha)
+
+
+def rgba_buffer(image):
+    """
+    Copy an RGBA PIL image into a new writable (height, width, 4) array
+    Pastes straight into memory shared with the array, which is a single
+    copy instead of the tobytes() + array copy that np.array(image) does
+    """
+    width, height = image.size
+    canvas = np.empty((height, width, 4), dtype=np.uint8)
+    Image.frombuffer('RGBA', image.size, canvas, 'raw', 'RGBA', 0, 1).im.paste(image.im, (0, 0, width, height))
+    return canvas
+
+
+def composite_garment(person, garment, offset, opacity=1.0, feather=0, background=(255, 255, 255)):
+    """
+    Place an already-resized garment on the person and flatten to RGB
+    - person, garment: RGBA PIL images
+    - offset: (x, y) of the garment's top-left corner; may extend off-canvas
+    - opacity / feather: see garment_alpha
+    - background: colour that transparent areas are flattened onto
+    Allocates one RGBA working buffer plus temporaries sized to the garment box
+    """
+    canvas = rgba_buffer(person)
+    canvas_height, canvas_width = canvas.shape[:2]
+    garment_array = np.asarray(garment)
+    x, y = offset
+
+    # Clip the garment's box to the canvas
+    x0, y0 = max(x, 0), max(y, 0)
+    x1 = min(x + garment_array.shape[1], canvas_width)
+    y1 = min(y + garment_array.shape[0], canvas_height)
+
+    if x0 < x1 and y0 < y1:
+        rows = slice(y0 - y, y1 - y)
+        cols = slice(x0 - x, x1 - x)
+        alpha = garment_alpha(garment_array, opacity, feather)[rows, cols]
+        alpha_composite_into(canvas[y0:y1, x0:x1], garment_array[rows, cols, :3], alpha)
+
+    # Fully opaque pixels flatten to themselves, so photos without
+    # transparency (the common case) skip the full-frame blend entirely
+    if canvas[..., 3].min() < 255:
+        flatten_into(canvas, background)
+
+    # The RGBA buffer is shared with PIL, convert() makes the only output copy
+    return Image.fromarray(canvas).convert('RGB')
@@ -0,0 +1,264 @@
+"""
+Smart Wardrobe - Garment Analysis
+Dominant colors and pattern of a garment photo, in the vocabulary of the
+outfit rules (frontend/outfit-intelligence-data.js)
+- The image is decoded straight to a small working size (draft mode for
+  JPEGs), so analysis cost does not grow with the upload's resolution
+- The background is dropped using transparency or, for opaque photos, the
+  color of a uniform border
+- Colors are clustered with a few rounds of vectorized k-means in CIELAB;
+  each cluster is named after the nearest palette color
+- Patterned vs solid is estimated from the share of strong lightness edges
+  inside the garment
+Kept free of Flask/MongoDB imports so it can run in worker processes
+"""
+
+from io import BytesIO
+
+import numpy as np
+
+from ingest import load_image
+
+# Bump when the output changes, so stored results can be recomputed
+ANALYSIS_VERSION = 1
+
+# Longest side of the working image
+ANALYSIS_SIZE = 128
+
+# Reference colors (sRGB) of the names used by the outfit rules and the wardrobe color picker
+PALETTE = {
+    'black': (20, 20, 22),
+    'white': (245, 245, 242),
+    'gray': (128, 128, 128),
+    'navy': (28, 36, 76),
+    'blue': (45, 95, 190),
+    'light-blue': (145, 188, 230),
+    'red': (200, 32, 40),
+    'maroon': (112, 24, 38),
+    'pink': (235, 130, 170),
+    'orange': (240, 130, 30),
+    'yellow': (240, 205, 40),
+    'beige': (215, 195, 160),
+    'brown': (112, 72, 42),
+    'green': (40, 140, 70),
+    'light-green': (150, 210, 130),
+    'bottle-green': (12, 76, 48),
+    'purple': (110, 50, 140)
+}
+
+KMEANS_CLUSTERS = 5
+KMEANS_ITERATIONS = 10
+# Centers are fitted on at most this many evenly spaced pixels, then every pixel is assigned once
+KMEANS_SAMPLE = 2048
+# Colors covering less of the garment than this are not reported
+MIN_COLOR_SHARE = 0.1
+MAX_COLORS = 3
+
+# A border this uniform (median distance to its median color, in Delta E) is treated as background
+BACKGROUND_UNIFORMITY = 8.0
+# Pixels closer than this (Delta E) to the background color are dropped
+BACKGROUND_DISTANCE = 14.0
+# Background-colored gaps in the garment up to twice this many working pixels wide are closed
+# (white stripes that touch the outline would otherwise count as background)
+GAP_RADIUS = 4
+# Below this share of foreground pixels the whole image is analysed instead
+MIN_FOREGROUND_SHARE = 0.05
+
+# Lightness step between neighbouring working pixels that counts as an edge (L* units)
+EDGE_THRESHOLD = 12.0
+# Garments whose share of edge pixels reaches this are patterned
+PATTERN_EDGE_SHARE = 0.12
+
+# sRGB (D65) to XYZ, and the D65 white point
+_RGB_TO_XYZ = np.array([[0.4124, 0.3576, 0.1805],
+                        [0.2126, 0.7152, 0.0722],
+                        [0.0193, 0.1192, 0.9505]], dtype=np.float32)
+_WHITE = np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+# 8-bit sRGB channel value -> linear light
+_LINEAR = np.array([c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+                    for c in np.arange(256) / 255.0], dtype=np.float32)
+
+
+def rgb_to_lab(rgb):
+    """CIELAB of an (..., 3) uint8 sRGB array"""
+    xyz = _LINEAR[rgb] @ _RGB_TO_XYZ.T / _WHITE
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16 / 116)
+    return np.stack([116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+PALETTE_NAMES = list(PALETTE)
+PALETTE_LAB = rgb_to_lab(np.array(list(PALETTE.values()), dtype=np.uint8))
+
+
+def nearest_palette(lab):
+    """Index into PALETTE_NAMES of the closest palette color for each row of an (n, 3) Lab array"""
+    return np.argmin(((lab[:, None, :] - PALETTE_LAB[None, :, :]) ** 2).sum(axis=-1), axis=1)
+
+
+def connected_to_border(candidate):
+    """
+    The part of a boolean mask reachable from the image border through 4-connected pixels
+    Background-colored areas inside the garment (white stripes on a white
+    backdrop) are not reachable, so they stay garment
+    """
+    reached = np.zeros_like(candidate)
+    reached[[0, -1], :] = candidate[[0, -1], :]
+    reached[:, [0, -1]] |= candidate[:, [0, -1]]
+    while True:
+        grown = reached.copy()
+        grown[1:, :] |= reached[:-1, :]
+        grown[:-1, :] |= reached[1:, :]
+        grown[:, 1:] |= reached[:, :-1]
+        grown[:, :-1] |= reached[:, 1:]
+        grown &= candidate
+        if np.array_equal(grown, reached):
+            return reached
+        reached = grown
+
+
+def shifted(mask, shift, axis):
+    """mask moved by shift along axis, with zeros shifted in instead of wrapping around"""
+    out = np.zeros_like(mask)
+    source, target = [slice(None)] * mask.ndim, [slice(None)] * mask.ndim
+    if shift > 0:
+        source[axis], target[axis] = slice(None, -shift), slice(shift, None)
+    else:
+        source[axis], target[axis] = slice(-shift, None), slice(None, shift)
+    out[tuple(target)] = mask[tuple(source)]
+    return out
+
+
+def close_gaps(mask, radius=GAP_RADIUS):
+    """Morphological closing along rows, and separately along columns; either closes a gap"""
+    closed = []
+    for axis in (0, 1):
+        # Pad so the dilation can spill past the edge and erosion near it sees that, not the far side
+        padding = [(0, 0), (0, 0)]
+        padding[axis] = (radius, radius)
+        padded = np.pad(mask, padding)
+        dilated = padded.copy()
+        for shift in range(1, radius + 1):
+            dilated |= shifted(padded, shift, axis) | shifted(padded, -shift, axis)
+        eroded = dilated.copy()
+        for shift in range(1, radius + 1):
+            eroded &= shifted(dilated, shift, axis) & shifted(dilated, -shift, axis)
+        closed.append(np.take(eroded, range(radius, radius + mask.shape[axis]), axis=axis))
+    return mask | closed[0] | closed[1]
+
+
+def foreground_mask(rgba, lab):
+    """Garment pixels: opaque ones, or ones that differ from a uniform border"""
+    alpha = rgba[..., 3]
+    if alpha.min() < 255:
+        mask = alpha >= 128
+    else:
+        border = np.concatenate([lab[0], lab[-1], lab[1:-1, 0], lab[1:-1, -1]])
+        background = np.median(border, axis=0)
+        if np.median(np.linalg.norm(border - background, axis=1)) > BACKGROUND_UNIFORMITY:
+            return np.ones(alpha.shape, dtype=bool)
+        mask = close_gaps(~connected_to_border(np.linalg.norm(lab - background, axis=-1) < BACKGROUND_DISTANCE))
+    if mask.mean() < MIN_FOREGROUND_SHARE:
+        return np.ones(alpha.shape, dtype=bool)
+    return mask
+
+
+def kmeans(points, clusters=KMEANS_CLUSTERS, iterations=KMEANS_ITERATIONS):
+    """
+    Cluster (n, 3) points; returns (labels, centers)
+    Seeded k-means++ initialisation, so results are reproducible
+    """
+    everything = points
+    points = points[::max(1, len(points) // KMEANS_SAMPLE)]
+    rng = np.random.default_rng(0)
+    clusters = min(clusters, len(points))
+    centers = [points[rng.integers(len(points))]]
+    distances = ((points - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, clusters):
+        total = distances.sum()
+        if total <= 0:
+            break
+        centers.append(points[rng.choice(len(points), p=distances / total)])
+        distances = np.minimum(distances, ((points - centers[-1]) ** 2).sum(axis=1))
+    centers = np.array(centers)
+
+    for _ in range(iterations):
+        labels = np.argmin(((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=-1), axis=1)
+        counts = np.bincount(labels, minlength=len(centers))
+        sums = np.stack([np.bincount(labels, weights=points[:, axis], minlength=len(centers)) for axis in range(3)], axis=1)
+        updated = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centers)
+        if np.allclose(updated, centers, atol=0.5):
+            break
+        centers = updated
+    labels = np.argmin(((everything[:, None, :] - centers[None, :, :]) ** 2).sum(axis=-1), axis=1)
+    return labels, centers
+
+
+def edge_share(lab, mask):
+    """Share of interior garment pixels with a strong lightness step to a neighbour"""
+    lightness = lab[..., 0]
+    # Interior: the pixel and its 4 neighbours are garment, so the outline is not counted
+    interior = mask.copy()
+    interior[1:, :] &= mask[:-1, :]
+    interior[:-1, :] &= mask[1:, :]
+    interior[:, 1:] &= mask[:, :-1]
+    interior[:, :-1] &= mask[:, 1:]
+    interior[[0, -1], :] = False
+    interior[:, [0, -1]] = False
+    if not interior.any():
+        return 0.0
+
+    step = np.zeros(lightness.shape, dtype=np.float32)
+    step[:, 1:] = np.abs(np.diff(lightness, axis=1))
+    step[1:, :] = np.maximum(step[1:, :], np.abs(np.diff(lightness, axis=0)))
+    return float((step[interior] >= EDGE_THRESHOLD).mean())
+
+
+def analyze_garment(data):
+    """
+    Dominant colors and pattern of garment image bytes
+    Returns: {'colors': [{'name', 'hex', 'share'}], 'color', 'pattern'
+    ('patterned' or 'solid'), 'pattern_score', 'version'}
+    """
+    rgba = np.asarray(load_image(BytesIO(data), ANALYSIS_SIZE, 'RGBA'))
+    rgb = np.ascontiguousarray(rgba[..., :3])
+    lab = rgb_to_lab(rgb)
+    mask = foreground_mask(rgba, lab)
+
+    points = lab[mask]
+    labels, centers = kmeans(points)
+    counts = np.bincount(labels, minlength=len(centers))
+    names = nearest_palette(centers)
+    pixels = rgb[mask].astype(np.float64)
+
+    # Clusters with the same palette name are one color
+    colors = []
+    for name_index in np.unique(names):
+        members = np.isin(labels, np.flatnonzero(names == name_index))
+        share = members.mean()
+        if share >= MIN_COLOR_SHARE:
+            mean = np.rint(pixels[members].mean(axis=0)).astype(int)
+            colors.append({
+                'name': PALETTE_NAMES[name_index],
+                'hex': '#{:02x}{:02x}{:02x}'.format(*mean),
+                'share': round(float(share), 3)
+            })
+    if not colors:
+        largest = int(np.argmax(counts))
+        colors.append({'name': PALETTE_NAMES[names[largest]], 'hex': None, 'share': round(counts[largest] / len(labels), 3)})
+    colors.sort(key=lambda color: -color['share'])
+    colors = colors[:MAX_COLORS]
+
+    score = edge_share(lab, mask)
+    return {
+        'colors': colors,
+        'color': colors[0]['name'],
+        'pattern': 'patterned' if score >= PATTERN_EDGE_SHARE else 'solid',
+        'pattern_score': round(score, 3),
+        'version': ANALYSIS_VERSION
+    }
+
+
+def analyze_garment_file(path):
+    """analyze_garment for an image file (the entry point of worker processes)"""
+    with open(path, 'rb') as f:
+        return analyze_garment(f.read())
@@ -0,0 +1,152 @@
+"""
+Smart Wardrobe - Image Processing
+Cloth changing pipeline shared by the request handlers and the job workers
+Kept free of Flask/MongoDB imports so worker processes start quickly
+"""
+
+import logging
+from io import BytesIO
+from PIL import Image
+from compositing import composite_garment
+from ingest import load_image
+from metrics import timed_stage
+
+logger = logging.getLogger(__name__)
+
+# Person photos are processed at most this many pixels on the longest side
+PERSON_MAX_SIZE = 1024
+# Garments are drawn at 55% of the person width, so this cap leaves ample headroom
+GARMENT_MAX_SIZE = 1024
+
+# Output formats a client may request: name -> (PIL format, mimetype, extension, default quality)
+OUTPUT_FORMATS = {
+    'png': ('PNG', 'image/png', 'png', None),
+    'webp': ('WEBP', 'image/webp', 'webp', 90),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg', 90)
+}
+OUTPUT_FORMAT_ALIASES = {'jpg': 'jpeg'}
+
+
+def torso_placement(person_size, garment_size):
+    """
+    Size and position of the garment on the person (center of the torso area)
+    Returns: ((garment_width, garment_height), (x_offset, y_offset))
+    """
+    person_width, person_height = person_size
+    garment_width = int(person_width * 0.55)
+    garment_height = int(garment_width * garment_size[1] / garment_size[0])
+    
+    # Roughly center-top area
+    x_offset = (person_width - garment_width) // 2
+    y_offset = int(person_height * 0.32)
+    return (garment_width, garment_height), (x_offset, y_offset)
+
+
+def prepare_person(person_image, timings=None):
+    """Decode the person photo at working size (max 1024px, aspect ratio kept)"""
+    with timed_stage(timings, 'decode'):
+        return load_image(person_image, PERSON_MAX_SIZE)
+
+
+def dress_person(person, garment_image, timings=None):
+    """
+    Decode a garment (capped), place it on the torso and composite onto the prepared person
+    timings, if given, accumulates seconds per stage (decode, resize, composite)
+    """
+    with timed_stage(timings, 'decode'):
+        garment = load_image(garment_image, GARMENT_MAX_SIZE)
+    
+    # Resize the garment and position it on the torso
+    with timed_stage(timings, 'resize'):
+        (garment_width, garment_height), offset = torso_placement(person.size, garment.size)
+        garment_resized = garment.resize((garment_width, garment_height), Image.Resampling.LANCZOS)
+    
+    # Blend the garment over the person and flatten onto white
+    with timed_stage(timings, 'composite'):
+        return composite_garment(person, garment_resized, offset)
+
+
+def mock_ai_cloth_change(person_image, garment_image, timings=None):
+    """
+    Mock AI cloth changing function
+    In production, this would call a real AI model like:
+    - Stable Diffusion with ControlNet
+    - Virtual Try-On models (VITON, HR-VITON)
+    - Custom-trained models
+    
+    For now, it creates a simple composite image
+    """
+    try:
+        return dress_person(prepare_person(person_image, timings), garment_image, timings)
+        
+    except Exception:
+        logger.exception('Mock AI processing failed')
+        raise
+
+
+def encode_image(image, output_format='png', quality=None, max_width=None):
+    """
+    Encode an image exactly once in the requested format
+    - max_width downsizes (never upsizes) while keeping the aspect ratio
+    - quality applies to lossy formats only; PNG is always lossless
+    Returns: encoded bytes
+    """
+    pil_format, _, _, default_quality = OUTPUT_FORMATS[output_format]
+    
+    if max_width and image.width > max_width:
+        height = max(1, round(image.height * max_width / image.width))
+        image = image.resize((max_width, height), Image.Resampling.LANCZOS)
+    
+    save_kwargs = {}
+    if default_quality is not None:
+        save_kwargs['quality'] = quality or default_quality
+    
+    buffered = BytesIO()
+    image.save(buffered, format=pil_format, **save_kwargs)
+    return buffered.getvalue()
+
+
+def render_cloth_change(person_bytes, garment_bytes, output_format='png', quality=None, max_width=None,
+                        timings=None):
+    """
+    Run the cloth change on raw upload bytes and return the encoded result
+    Used as the entry point for worker processes, so it takes and returns
+    plain bytes that pickle cheaply across process boundaries
+    timings, if given, accumulates seconds per stage (decode, resize, composite, encode)
+    """
+    result_image = mock_ai_cloth_change(BytesIO(person_bytes), BytesIO(garment_bytes), timings)
+    with timed_stage(timings, 'encode'):
+        return encode_image(result_image, output_format, quality, max_width)
+
+
+def render_cloth_change_timed(person_bytes, garment_bytes, output_format='png', quality=None, max_width=None):
+    """
+    render_cloth_change for a process pool: returns (encoded bytes, stage timings),
+    since a timings dict filled in the worker would not reach the caller
+    """
+    timings = {}
+    result_bytes = render_cloth_change(person_bytes, garment_bytes, output_format, quality, max_width, timings)
+    return result_bytes, timings
+
+
+def render_cloth_change_batch(person_bytes, garment_bytes_list, output_format='png', quality=None,
+                              max_width=None, executor=None):
+    """
+    Dress one person in each of several garments
+    The person photo is decoded and resized once and shared (read-only) by
+    every render; garments are rendered concurrently on executor if given
+    (Pillow and NumPy release the GIL for the heavy work)
+    Returns: list with encoded bytes or the Exception raised, per garment
+    """
+    person = prepare_person(BytesIO(person_bytes))
+    
+    def render(garment_bytes):
+        try:
+            result_image = dress_person(person, BytesIO(garment_bytes))
+            return encode_image(result_image, output_format, quality, max_width)
+        except Exception as e:
+            return e
+    
+    if executor is None:
+        return [render(garment_bytes) for garment_bytes in garment_bytes_list]
+    return list(executor.map(render, garment_bytes_list))
@@ -0,0 +1,116 @@
+"""
+Smart Wardrobe - Image Ingest
+Upload validation and size-aware image loading shared by every endpoint
+that accepts uploads
+Uploads are checked by their magic bytes and read with a hard size limit;
+JPEGs are decoded with draft mode so large photos are scaled by the
+decoder itself instead of being fully decoded and then shrunk
+"""
+
+from PIL import Image
+
+# Largest image (in pixels) we are willing to decode, ~40MP
+MAX_INPUT_PIXELS = 40_000_000
+
+# Modes that can be resampled with LANCZOS before conversion
+RESAMPLABLE_MODES = {'RGB', 'RGBA', 'L', 'LA', 'RGBX', 'CMYK', 'YCbCr'}
+
+
+# Leading bytes of every accepted format: type -> (offset, signature) checks
+IMAGE_SIGNATURES = {
+    'jpeg': ((0, b'\xff\xd8\xff'),),
+    'png': ((0, b'\x89PNG\r\n\x1a\n'),),
+    'webp': ((0, b'RIFF'), (8, b'WEBP'))
+}
+
+# Bytes read per chunk when copying an upload stream
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload's declared dimensions exceed MAX_INPUT_PIXELS"""
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload's byte size exceeds the configured limit"""
+
+
+class InvalidImageError(ValueError):
+    """Raised when upload bytes do not start with a supported image signature"""
+
+
+def sniff_image_type(data):
+    """Identify an image from its leading bytes; returns 'jpeg', 'png', 'webp' or None"""
+    for image_type, checks in IMAGE_SIGNATURES.items():
+        if all(data[offset:offset + len(signature)] == signature for offset, signature in checks):
+            return image_type
+    return None
+
+
+def read_upload(stream, max_bytes, name='upload'):
+    """
+    Read an upload stream into memory, stopping as soon as it exceeds max_bytes
+    and rejecting anything that is not a PNG, JPEG or WEBP image
+    Returns: (data, image_type)
+    """
+    chunks = []
+    total = 0
+    while True:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            raise UploadTooLargeError(f"'{name}' is larger than {max_bytes // (1024 * 1024)}MB")
+        chunks.append(chunk)
+
+    data = b''.join(chunks)
+    image_type = sniff_image_type(data)
+    if image_type is None:
+        raise InvalidImageError(f"'{name}' is not a PNG, JPEG or WEBP image")
+    return data, image_type
+
+
+def open_image(source):
+    """
+    Open an image lazily (header only) and enforce the pixel limit
+    Nothing is decoded until the image is loaded or converted
+    """
+    image = Image.open(source)
+    width, height = image.size
+    if width * height > MAX_INPUT_PIXELS:
+        image.close()
+        raise ImageTooLargeError(
+            f'Image is {width}x{height}; at most {MAX_INPUT_PIXELS:,} pixels are supported')
+    return image
+
+
+def load_image(source, max_size, mode='RGBA'):
+    """
+    Decode an image so that neither side exceeds max_size, then convert to mode
+    - JPEG: the decoder downscales by 1/2, 1/4 or 1/8 (draft mode), staying
+      at or above the target so the final LANCZOS pass keeps its quality
+    - Other formats: shrunk with thumbnail() before conversion, so the
+      full-size image is never copied into a wider pixel format
+    Peak memory is roughly one native-size decode for non-JPEG inputs and
+    one reduced-size decode for JPEGs, instead of decode + RGBA copy
+    """
+    image = open_image(source)
+
+    if image.format == 'JPEG':
+        draft_mode = 'RGB' if image.mode in ('RGB', 'YCbCr') else None
+        image.draft(draft_mode, (max_size, max_size))
+
+    if image.mode not in RESAMPLABLE_MODES:
+        # Palette/bit-depth modes would fall back to NEAREST resampling
+        image = image.convert(mode)
+
+    if image.width > max_size or image.height > max_size:
+        image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+
+    if image.mode != mode:
+        image = image.convert(mode)
+
+    # Make sure pixels are decoded now, so the image can be shared across threads
+    image.load()
+    return image
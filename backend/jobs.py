@@ -0,0 +1,207 @@
+"""
+Smart Wardrobe - Job Queue
+Runs try-on rendering in a pool of worker processes so the Flask request
+thread only validates uploads and hands back a job id
+"""
+
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """Raised when the number of unfinished jobs has reached the limit"""
+
+
+class JobQueue:
+    """
+    Bounded job queue backed by a ProcessPoolExecutor
+    - submit() rejects new work once max_pending jobs are unfinished
+    - on_success callbacks run in the parent process and turn the worker's
+      return value into the JSON-friendly result stored on the job; they
+      run on a few callback threads, not the pool's management thread, so
+      a slow one (a MongoDB write, a file lock) never holds up the others
+    - finished jobs are kept for job_ttl seconds so clients can poll them
+    - start_method picks how workers are started; 'fork' copies whatever
+      locks the server's other threads hold at that moment, so a worker
+      forked mid-render can deadlock ('forkserver'/'spawn' avoid this)
+    """
+
+    def __init__(self, max_workers, max_pending, job_ttl=600, start_method=None, callback_workers=2):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.job_ttl = job_ttl
+        self.start_method = start_method
+        self.callback_workers = callback_workers
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._callbacks = None
+        self._jobs = {}
+        self._pending = 0
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        """Create the worker pool on first use; caller holds the lock"""
+        if self._executor is None:
+            context = multiprocessing.get_context(self.start_method)
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            self._callbacks = ThreadPoolExecutor(max_workers=self.callback_workers, thread_name_prefix='job-callback')
+        return self._executor
+
+    def _new_job(self, status):
+        """Build a job record"""
+        return {
+            'id': uuid.uuid4().hex,
+            'status': status,
+            'created_at': time.time(),
+            'finished_at': None,
+            'result': None,
+            'error': None,
+            'future': None,
+            'done': threading.Event()
+        }
+
+    def submit(self, fn, *args, on_success=None):
+        """
+        Queue fn(*args) on the worker pool and return the job id
+        Raises QueueFullError when max_pending jobs are still unfinished
+        """
+        with self._lock:
+            self._purge_expired()
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise QueueFullError(f'Job queue is full ({self.max_pending} pending jobs)')
+
+            job = self._new_job('queued')
+            self._jobs[job['id']] = job
+            self._pending += 1
+            self.submitted += 1
+            executor = self._get_executor()
+            callbacks = self._callbacks
+
+        try:
+            future = executor.submit(fn, *args)
+        except Exception:
+            with self._lock:
+                self._jobs.pop(job['id'], None)
+                self._pending -= 1
+                self.submitted -= 1
+            raise
+
+        job['future'] = future
+        future.add_done_callback(lambda f: self._hand_off(callbacks, job, f, on_success))
+        return job['id']
+
+    def _hand_off(self, callbacks, job, future, on_success):
+        """Done callback (the pool's management thread): finish the job on a callback thread"""
+        if on_success is not None:
+            try:
+                callbacks.submit(self._finish, job, future, on_success)
+                return
+            except RuntimeError:
+                pass  # Shutting down; finish here rather than leave the job pending
+        self._finish(job, future, on_success)
+
+    def add_completed(self, result):
+        """Record a job that was satisfied without running (e.g. a cache hit)"""
+        job = self._new_job('done')
+        job['result'] = result
+        job['finished_at'] = job['created_at']
+        job['done'].set()
+        with self._lock:
+            self._purge_expired()
+            self._jobs[job['id']] = job
+            self.submitted += 1
+            self.completed += 1
+        return job['id']
+
+    def _finish(self, job, future, on_success):
+        """Store the outcome of a finished future on its job"""
+        try:
+            result = future.result()
+            if on_success is not None:
+                result = on_success(result)
+            job['result'] = result
+            job['status'] = 'done'
+        except Exception as e:
+            job['error'] = str(e)
+            job['status'] = 'failed'
+
+        job['finished_at'] = time.time()
+        job['future'] = None
+        with self._lock:
+            self._pending -= 1
+            if job['status'] == 'done':
+                self.completed += 1
+            else:
+                self.failed += 1
+        job['done'].set()
+
+    def _purge_expired(self):
+        """Forget finished jobs older than job_ttl; caller holds the lock"""
+        cutoff = time.time() - self.job_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['finished_at'] is not None and job['finished_at'] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """Return a JSON-friendly snapshot of a job, or None if unknown"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+
+        status = job['status']
+        future = job['future']
+        if status == 'queued' and future is not None and future.running():
+            status = 'running'
+
+        snapshot = {
+            'job_id': job['id'],
+            'status': status,
+            'created_at': job['created_at'],
+            'finished_at': job['finished_at']
+        }
+        if job['status'] == 'done':
+            snapshot['result'] = job['result']
+        elif job['status'] == 'failed':
+            snapshot['error'] = job['error']
+        return snapshot
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job finishes or timeout expires; returns its snapshot"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job['done'].wait(timeout)
+        return self.get(job_id)
+
+    def stats(self):
+        """Return queue depth and lifetime counters"""
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'tracked_jobs': len(self._jobs),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected
+            }
+
+    def shutdown(self, wait=True):
+        """Stop the worker pool"""
+        with self._lock:
+            executor, callbacks = self._executor, self._callbacks
+            self._executor = self._callbacks = None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+            callbacks.shutdown(wait=wait)
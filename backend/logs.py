@@ -0,0 +1,66 @@
+"""
+Smart Wardrobe - Logging
+Structured logging for the backend
+- Records are written as one JSON object per line (or as plain text),
+  including any fields passed with extra=
+- Request threads only format a record and put it on a queue; a listener
+  thread does the stream writes, so slow stdout never blocks a request
+"""
+
+import atexit
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else came from extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, extra fields and traceback"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level='INFO', log_format='json', stream=None):
+    """
+    Route the root logger through a queue to a stream handler (stderr by default)
+    Safe to call more than once; only the first call installs handlers
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    formatter = JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT)
+    records = queue.SimpleQueue()
+    # Format on the calling thread (arguments may change later); only the write is deferred
+    queue_handler = QueueHandler(records)
+    queue_handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+    _listener = QueueListener(records, logging.StreamHandler(stream or sys.stderr))
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
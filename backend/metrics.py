@@ -0,0 +1,159 @@
+"""
+Smart Wardrobe - Metrics
+In-process counters and histograms, rendered in the Prometheus text format
+- Each metric keeps its labelled series in a dict under its own lock; an
+  observation is one bisect into the bucket bounds and a few additions
+- Collectors turn existing stats() dicts into gauges at scrape time, so
+  components need no metrics code of their own
+- timed_stage adds stage durations to a plain dict; the image pipeline
+  (which also runs in worker processes) never touches the registry
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram buckets (upper bounds) for durations in seconds and sizes in bytes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+@contextmanager
+def timed_stage(timings, stage):
+    """Add the block's duration in seconds to timings[stage] (does nothing when timings is None)"""
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    type = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+                for labels, value in values]
+
+
+class Histogram:
+    """Bucketed distribution (count and sum included) per label combination"""
+
+    type = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, the last one for +Inf, then sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        with self._lock:
+            series = [(labels, list(values)) for labels, values in self._series.items()]
+        lines = []
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(values[-1])}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+def stats_gauges(prefix, stats, help_text):
+    """Numeric entries of a stats() dict as collector output (nested dicts and non-numbers are skipped)"""
+    return [(f'{prefix}_{key}', 'gauge', help_text, value) for key, value in stats.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)]
+
+
+class MetricsRegistry:
+    """Named metrics and scrape-time collectors, all prefixed with namespace"""
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(f'{self.namespace}_{name}', help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(f'{self.namespace}_{name}', help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """Register collect() -> iterable of (name, type, help, value), called on every scrape"""
+        self._collectors.append(collect)
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                samples = list(collect())
+            except Exception as e:
+                lines.append(f'# collector {getattr(collect, "__name__", collect)} failed: {_escape(e)}')
+                continue
+            for name, metric_type, help_text, value in samples:
+                name = f'{self.namespace}_{name}'
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                lines.append(f'{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
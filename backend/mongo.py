@@ -0,0 +1,244 @@
+"""
+Smart Wardrobe - MongoDB Connection
+One shared MongoClient, created on first use instead of at import time
+- Pool size and server selection / connect / socket timeouts come from
+  configuration, so a slow cluster fails requests quickly instead of
+  holding worker threads
+- A client that cannot be created (bad URI, SRV lookup failure) is retried
+  with exponential backoff; requests in between fail immediately
+- While the driver's monitor sees no reachable server, requests fail
+  immediately too; the monitor keeps reconnecting in the background
+- Pool events are counted for /api/health
+- Command durations can be reported to an observer (e.g. for metrics)
+"""
+
+import logging
+import threading
+import time
+
+from pymongo import MongoClient
+from pymongo.monitoring import CommandListener, ConnectionPoolListener, TopologyListener
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseUnavailableError(RuntimeError):
+    """Raised when the database cannot be reached right now"""
+
+
+class PoolMonitor(ConnectionPoolListener, TopologyListener):
+    """Counts pool connections and tracks whether any server is reachable"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.checkout_failures = 0
+        self.reachable = None  # None until the first topology description arrives
+
+    def _add(self, field, delta):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + delta)
+
+    # Pool events
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._add('open', 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add('open', -1)
+
+    def connection_check_out_started(self, event):
+        self._add('waiting', 1)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.in_use += 1
+
+    def connection_checked_in(self, event):
+        self._add('in_use', -1)
+
+    # Topology events
+    def opened(self, event):
+        pass
+
+    def description_changed(self, event):
+        description = event.new_description
+        # Unknown servers have not been contacted yet; only a completed check counts as down
+        if description.has_readable_server():
+            self.reachable = True
+        elif all(server.server_type_name != 'Unknown' or server.error is not None
+                 for server in description.server_descriptions().values()):
+            self.reachable = False
+
+    def closed(self, event):
+        pass
+
+
+class CommandTimer(CommandListener):
+    """Reports observer(command_name, seconds, succeeded) for every finished command"""
+
+    def __init__(self, observer):
+        self.observer = observer
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.observer(event.command_name, event.duration_micros / 1e6, True)
+
+    def failed(self, event):
+        self.observer(event.command_name, event.duration_micros / 1e6, False)
+
+
+class MongoConnection:
+    """
+    Lazily created, shared MongoClient with fail-fast behaviour
+    client_options are passed to MongoClient as is (maxPoolSize,
+    serverSelectionTimeoutMS, ...); client_class allows another
+    client implementation with the same interface; command_observer, if
+    given, is called with (command_name, seconds, succeeded) per command
+    """
+
+    def __init__(self, uri, database_name, retry_initial_seconds=1, retry_max_seconds=60,
+                 client_class=MongoClient, command_observer=None, **client_options):
+        self.uri = uri
+        self.database_name = database_name
+        self.retry_initial_seconds = retry_initial_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.client_class = client_class
+        self.client_options = client_options
+        self.command_observer = command_observer
+
+        self._lock = threading.Lock()
+        self._client = None
+        self._monitor = None
+        self._listeners = []
+        self._failures = 0
+        self._retry_at = 0
+        self.last_error = None
+        self.connected_at = None
+
+    def add_connect_listener(self, callback):
+        """Register callback(database) to run once each time a client is created"""
+        self._listeners.append(callback)
+
+    def _connect(self):
+        """Return the client, creating it if needed (respecting the retry backoff)"""
+        client = self._client
+        if client is not None:
+            return client
+
+        with self._lock:
+            if self._client is not None:
+                return self._client
+
+            now = time.monotonic()
+            if now < self._retry_at:
+                raise DatabaseUnavailableError(
+                    f'Database unavailable ({self.last_error}); retrying in {self._retry_at - now:.0f}s')
+
+            monitor = PoolMonitor()
+            event_listeners = [monitor]
+            if self.command_observer is not None:
+                event_listeners.append(CommandTimer(self.command_observer))
+            try:
+                client = self.client_class(self.uri, event_listeners=event_listeners, **self.client_options)
+            except Exception as e:
+                self._failures += 1
+                delay = min(self.retry_max_seconds, self.retry_initial_seconds * 2 ** (self._failures - 1))
+                self._retry_at = now + delay
+                self.last_error = str(e)
+                logger.warning('MongoDB connection failed: %s', e,
+                               extra={'attempt': self._failures, 'retry_seconds': delay})
+                raise DatabaseUnavailableError(f'Database unavailable ({e})')
+
+            self._client = client
+            self._monitor = monitor
+            self._failures = 0
+            self.last_error = None
+            self.connected_at = time.time()
+
+        database = client[self.database_name]
+        for callback in self._listeners:
+            callback(database)
+        return client
+
+    def database(self):
+        """Return the database, failing fast while no server is reachable"""
+        client = self._connect()
+        with self._lock:
+            monitor = self._monitor
+        # close() may have run since _connect() returned
+        if monitor is None:
+            raise DatabaseUnavailableError('Database unavailable (connection closed)')
+        if monitor.reachable is False:
+            raise DatabaseUnavailableError('Database unavailable (no reachable server)')
+        return client[self.database_name]
+
+    def collection(self, name):
+        """Return a collection of the configured database"""
+        return self.database()[name]
+
+    def ping(self):
+        """Round trip to the server; returns latency in milliseconds"""
+        client = self._connect()
+        start = time.perf_counter()
+        client.admin.command('ping')
+        return round((time.perf_counter() - start) * 1000, 2)
+
+    def health(self):
+        """Connection state, ping latency and pool utilization"""
+        report = {
+            'connected': False,
+            'ping_ms': None,
+            'error': None,
+            'pool': None
+        }
+        try:
+            report['ping_ms'] = self.ping()
+            report['connected'] = True
+        except Exception as e:
+            report['error'] = str(e)
+
+        monitor = self._monitor
+        if monitor is not None:
+            max_pool_size = self.client_options.get('maxPoolSize')
+            with monitor._lock:
+                report['pool'] = {
+                    'open': monitor.open,
+                    'in_use': monitor.in_use,
+                    'waiting': monitor.waiting,
+                    'checkout_failures': monitor.checkout_failures,
+                    'max_size': max_pool_size,
+                    'utilization': round(monitor.in_use / max_pool_size, 3) if max_pool_size else None
+                }
+        return report
+
+    def close(self):
+        """Close the client; the next use creates a new one"""
+        with self._lock:
+            client, self._client, self._monitor = self._client, None, None
+        if client is not None:
+            client.close()
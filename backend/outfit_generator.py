@@ -0,0 +1,194 @@
+"""
+Smart Wardrobe - Outfit Generator
+Top-K outfits over the full top x bottom x footwear product with NumPy
+- Items are encoded as small integer codes: the set of color combinations
+  their color can take part in, their pattern signature, and their own
+  season + formality points for the current context; items with the same
+  codes are interchangeable and are scored once as a group
+- Color and pattern points live in small 3-D lookup tables indexed by
+  those codes, so a block of group triples is scored with one broadcasted
+  gather per table
+- Blocks are bounded by max_block_elements and skipped (branch and bound)
+  when even their best possible outfit cannot enter the current top K, so
+  memory stays bounded however large the product is
+- Outfits are expanded from the winning group triples lazily, in chunks
+"""
+
+import itertools
+from collections import namedtuple
+
+import numpy as np
+
+from outfits import OUTFIT_SLOTS, UNMATCHED_COLOR_POINTS, item_color
+
+# Group triples scored per block (each temporary is an int16 array of this size)
+DEFAULT_BLOCK_ELEMENTS = 2_000_000
+
+SlotGroups = namedtuple('SlotGroups', 'items mask pattern unary count')
+
+
+def _encode_slot(scorer, items, slot, context):
+    """
+    Group one slot's items by their codes, best own points first
+    Returns: (SlotGroups, mask values, pattern values)
+    """
+    masks = {}
+    patterns = {}
+    groups = {}
+    for item in items:
+        mask = scorer.color_mask(slot, item_color(item))
+        pattern = scorer.item_pattern(item)
+        key = (scorer.item_points(item, context)[0],
+               masks.setdefault(mask, len(masks)),
+               patterns.setdefault(pattern, len(patterns)))
+        groups.setdefault(key, []).append(item)
+    keys = sorted(groups, key=lambda key: -key[0])
+
+    encoded = SlotGroups(
+        [groups[key] for key in keys],
+        np.array([key[1] for key in keys], dtype=np.intp),
+        np.array([key[2] for key in keys], dtype=np.intp),
+        np.array([key[0] for key in keys], dtype=np.int16),
+        np.array([len(groups[key]) for key in keys], dtype=np.int64))
+    return encoded, list(masks), list(patterns)
+
+
+class OutfitGenerator:
+    """
+    Exact top-K outfits for one wardrobe and context
+    Outfits are ordered by the unclamped OutfitScorer score (the order of
+    OutfitScorer.rank), ties in wardrobe group order
+    """
+
+    def __init__(self, scorer, items, context, max_block_elements=DEFAULT_BLOCK_ELEMENTS):
+        self.scorer = scorer
+        self.context = context
+        self.max_block_elements = max_block_elements
+
+        encoded = [_encode_slot(scorer, [item for item in items if item.get('category') == slot], index, context)
+                   for index, slot in enumerate(OUTFIT_SLOTS)]
+        self.tops, self.bottoms, self.shoes = (groups for groups, _, _ in encoded)
+        self.total = int(self.tops.count.sum() * self.bottoms.count.sum() * self.shoes.count.sum())
+
+        mask_values = [masks for _, masks, _ in encoded]
+        pattern_values = [patterns for _, _, patterns in encoded]
+
+        # Color points by mask codes: the first combination all three masks share wins
+        self.color_table = np.full([len(values) for values in mask_values], UNMATCHED_COLOR_POINTS, dtype=np.int16)
+        for t, top_mask in enumerate(mask_values[0]):
+            for b, bottom_mask in enumerate(mask_values[1]):
+                shared = top_mask & bottom_mask
+                if not shared:
+                    continue
+                for s, shoe_mask in enumerate(mask_values[2]):
+                    matches = shared & shoe_mask
+                    if matches:
+                        self.color_table[t, b, s] = scorer.combinations[(matches & -matches).bit_length() - 1][1]
+
+        self.pattern_table = np.empty([len(values) for values in pattern_values], dtype=np.int16)
+        for t, top_pattern in enumerate(pattern_values[0]):
+            for b, bottom_pattern in enumerate(pattern_values[1]):
+                for s, shoe_pattern in enumerate(pattern_values[2]):
+                    self.pattern_table[t, b, s] = scorer.pattern_points((top_pattern, bottom_pattern, shoe_pattern))[0]
+
+    def _block_size(self, length, per_row):
+        """Groups of a slot per block so a block stays within max_block_elements"""
+        return max(1, min(length, self.max_block_elements // max(1, per_row)))
+
+    def _score_block(self, t, b, s):
+        """Scores of the block tops[t] x bottoms[b] x shoes[s] (slices), as an int16 array"""
+        scores = self.color_table[self.tops.mask[t][:, None, None],
+                                  self.bottoms.mask[b][None, :, None],
+                                  self.shoes.mask[s][None, None, :]]
+        scores += self.pattern_table[self.tops.pattern[t][:, None, None],
+                                     self.bottoms.pattern[b][None, :, None],
+                                     self.shoes.pattern[s][None, None, :]]
+        scores += self.tops.unary[t][:, None, None]
+        scores += self.bottoms.unary[b][None, :, None]
+        scores += self.shoes.unary[s][None, None, :]
+        return scores
+
+    def _pair_bound(self, t, b, s):
+        """Most color + pattern points any triple of the given slices can earn"""
+        color = self.color_table[np.unique(self.tops.mask[t])][:, np.unique(self.bottoms.mask[b])]
+        pattern = self.pattern_table[np.unique(self.tops.pattern[t])][:, np.unique(self.bottoms.pattern[b])]
+        return int(color[:, :, np.unique(self.shoes.mask[s])].max()) \
+            + int(pattern[:, :, np.unique(self.shoes.pattern[s])].max())
+
+    def best_groups(self, k):
+        """
+        Group triples holding the best k outfits, best first
+        Returns: (scores, top_groups, bottom_groups, shoe_groups) arrays;
+        together their groups hold at least k outfits (or all of them)
+        """
+        tops, bottoms, shoes = len(self.tops.items), len(self.bottoms.items), len(self.shoes.items)
+        best = [np.empty(0, dtype=np.int16)] + [np.empty(0, dtype=np.int64) for _ in range(3)]
+        if not self.total or k <= 0:
+            return tuple(best)
+
+        shoe_block = self._block_size(shoes, 1)
+        bottom_block = self._block_size(bottoms, shoe_block)
+        top_block = self._block_size(tops, bottom_block * shoe_block)
+        threshold = None
+
+        # Groups are sorted by their own points, so the first group of a slice
+        # bounds everything from that slice on; once that bound cannot beat the
+        # k-th best score, the rest of the axis is skipped
+        for t0 in range(0, tops, top_block):
+            t = slice(t0, t0 + top_block)
+            if threshold is not None and self._pair_bound(slice(t0, None), slice(None), slice(None)) \
+                    + self.tops.unary[t0] + self.bottoms.unary[0] + self.shoes.unary[0] <= threshold:
+                break
+            for b0 in range(0, bottoms, bottom_block):
+                b = slice(b0, b0 + bottom_block)
+                if threshold is not None and self._pair_bound(t, slice(b0, None), slice(None)) \
+                        + self.tops.unary[t0] + self.bottoms.unary[b0] + self.shoes.unary[0] <= threshold:
+                    break
+                for s0 in range(0, shoes, shoe_block):
+                    s = slice(s0, s0 + shoe_block)
+                    if threshold is not None and self._pair_bound(t, b, slice(s0, None)) \
+                            + self.tops.unary[t0] + self.bottoms.unary[b0] + self.shoes.unary[s0] <= threshold:
+                        break
+
+                    scores = self._score_block(t, b, s)
+                    flat = scores.ravel()
+                    candidates = np.flatnonzero(flat > threshold) if threshold is not None else np.arange(flat.size)
+                    if not candidates.size:
+                        continue
+
+                    i, j, l = np.unravel_index(candidates, scores.shape)
+                    best = [np.concatenate(pair) for pair in zip(best, (flat[candidates], i + t0, j + b0, l + s0))]
+                    best, threshold = self._trim(best, k)
+
+        return tuple(best)
+
+    def _trim(self, best, k):
+        """Keep the shortest best-first prefix holding k outfits; returns (best, threshold)"""
+        scores, t, b, s = best
+        order = np.lexsort((s, b, t, -scores.astype(np.int32)))
+        counts = self.tops.count[t[order]] * self.bottoms.count[b[order]] * self.shoes.count[s[order]]
+        enough = np.searchsorted(np.cumsum(counts), k)
+        if enough >= len(order):
+            return [array[order] for array in best], None
+        keep = order[:enough + 1]
+        return [array[keep] for array in best], int(scores[keep[-1]])
+
+    def iter_outfits(self, k, chunk_size=500):
+        """
+        Yield the best k outfits in chunks of up to chunk_size, best first
+        Each outfit is (score, reason, (top, bottom, footwear)) with the
+        clamped score and reason from OutfitScorer.score_outfit
+        """
+        _, top_groups, bottom_groups, shoe_groups = self.best_groups(k)
+        outfits = itertools.chain.from_iterable(
+            itertools.product(self.tops.items[t], self.bottoms.items[b], self.shoes.items[s])
+            for t, b, s in zip(top_groups, bottom_groups, shoe_groups))
+
+        remaining = k
+        while remaining > 0:
+            chunk = [self.scorer.score_outfit(outfit, self.context) + (outfit,)
+                     for outfit in itertools.islice(outfits, min(chunk_size, remaining))]
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,453 @@
+"""
+Smart Wardrobe - Outfit Scoring
+Server-side version of the AI stylist's outfit analysis, driven by the rules
+in frontend/outfit-intelligence-data.js
+- The rules are read once and compiled: every color string seen in a slot
+  gets a bitmask of the combinations it can take part in, so matching a
+  color triple is an AND of three ints, memoised per triple
+- Items without a color, or without pattern words in their name, fall
+  back to the color and pattern detected in their image (garment_analysis)
+- Items are grouped by (color, pattern); an outfit's score is the group
+  triple's color/pattern points plus per-item season and formality points,
+  so ranking never enumerates the full top x bottom x footwear product (of
+  items or of groups)
+"""
+
+import heapq
+import re
+from collections import namedtuple
+
+# Wardrobe categories that make up an outfit, in outfit order
+OUTFIT_SLOTS = ('topwear', 'bottomwear', 'footwear')
+
+# Combination lists in matching precedence; the first matching entry wins
+COMBINATION_LISTS = ('excellentCombinations', 'goodCombinations', 'averageCombinations', 'badCombinations')
+
+# Color points per combination rating (same scale as the AI stylist page)
+RATING_POINTS = {5: 25, 4: 15, 3: 5, 2: -5, 1: -20}
+
+BASE_SCORE = 50
+UNMATCHED_COLOR_POINTS = 5
+SOLID_PATTERN_POINTS = 5
+SEASON_MATCH_POINTS = 5
+SEASON_MISMATCH_POINTS = -10
+FORMALITY_COMPATIBLE_POINTS = 3
+FORMALITY_MISMATCH_POINTS = -5
+
+# Words in an item name that make it patterned (analysisHelpers.hasPattern)
+PATTERN_WORDS = ('check', 'striped', 'printed', 'pattern', 'checked')
+
+# Formality levels one step apart, which still earn some points together
+COMPATIBLE_FORMALITY = {
+    ('casual', 'smart-casual'), ('smart-casual', 'casual'),
+    ('smart-casual', 'formal'), ('formal', 'smart-casual'),
+    ('casual', 'ethnic'), ('ethnic', 'casual')
+}
+
+OutfitContext = namedtuple('OutfitContext', 'season formality')
+
+Group = namedtuple('Group', 'color pattern items unary')
+
+
+class _JSLiteralParser:
+    """
+    Minimal parser for the object literal in outfit-intelligence-data.js
+    Handles comments, unquoted keys, single/double quoted strings, numbers,
+    booleans, null and trailing commas; function values are skipped (None)
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+
+    def _skip(self):
+        text = self.text
+        while self.pos < len(text):
+            if text[self.pos].isspace():
+                self.pos += 1
+            elif text.startswith('//', self.pos):
+                end = text.find('\n', self.pos)
+                self.pos = len(text) if end == -1 else end
+            elif text.startswith('/*', self.pos):
+                self.pos = text.index('*/', self.pos) + 2
+            else:
+                return
+
+    def _string(self):
+        quote = self.text[self.pos]
+        self.pos += 1
+        chars = []
+        while self.text[self.pos] != quote:
+            char = self.text[self.pos]
+            if char == '\\':
+                self.pos += 1
+                char = {'n': '\n', 't': '\t'}.get(self.text[self.pos], self.text[self.pos])
+            chars.append(char)
+            self.pos += 1
+        self.pos += 1
+        return ''.join(chars)
+
+    def _skip_function(self):
+        self.pos = self.text.index('{', self.pos)
+        depth = 0
+        while True:
+            char = self.text[self.pos]
+            if char in '\'"`':
+                self.pos = self.text.index(char, self.pos + 1)
+            elif char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    self.pos += 1
+                    return None
+            self.pos += 1
+
+    def value(self):
+        self._skip()
+        char = self.text[self.pos]
+        if char == '{':
+            return self._object()
+        if char == '[':
+            return self._array()
+        if char in '\'"':
+            return self._string()
+        match = re.compile(r'-?\d+(\.\d+)?|[A-Za-z_$][\w$]*').match(self.text, self.pos)
+        if not match:
+            raise ValueError(f'Unexpected character {char!r} at offset {self.pos}')
+        token = match.group()
+        self.pos = match.end()
+        if token == 'function':
+            return self._skip_function()
+        if token in ('true', 'false', 'null'):
+            return {'true': True, 'false': False, 'null': None}[token]
+        return float(token) if '.' in token else int(token)
+
+    def _object(self):
+        result = {}
+        self.pos += 1
+        while True:
+            self._skip()
+            if self.text[self.pos] == '}':
+                self.pos += 1
+                return result
+            if self.text[self.pos] in '\'"':
+                key = self._string()
+            else:
+                match = re.compile(r'[A-Za-z_$][\w$]*').match(self.text, self.pos)
+                key = match.group()
+                self.pos = match.end()
+            self._skip()
+            self.pos += 1  # ':'
+            result[key] = self.value()
+            self._skip()
+            if self.text[self.pos] == ',':
+                self.pos += 1
+
+    def _array(self):
+        result = []
+        self.pos += 1
+        while True:
+            self._skip()
+            if self.text[self.pos] == ']':
+                self.pos += 1
+                return result
+            result.append(self.value())
+            self._skip()
+            if self.text[self.pos] == ',':
+                self.pos += 1
+
+
+def load_intelligence_data(path):
+    """Read OUTFIT_INTELLIGENCE_DATA from the frontend's JS data file"""
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    parser = _JSLiteralParser(text)
+    parser.pos = text.index('{', text.index('OUTFIT_INTELLIGENCE_DATA'))
+    return parser.value()
+
+
+def season_for_temperature(temperature):
+    """Season used by the seasonal rules (analysisHelpers.getSeason)"""
+    if temperature > 25:
+        return 'summer'
+    if temperature < 15:
+        return 'winter'
+    return 'all-season'
+
+
+def has_pattern(name):
+    """Whether an item name describes a patterned garment"""
+    name = name.lower()
+    return any(word in name for word in PATTERN_WORDS)
+
+
+def item_color(item):
+    """Color an item is matched on: the one entered by the user, else the one detected in its image"""
+    analysis = item.get('analysis')
+    detected = analysis.get('color') if isinstance(analysis, dict) else None
+    return (item.get('color') or detected or '').lower()
+
+
+class OutfitScorer:
+    """
+    Scores and ranks outfits with the compiled outfit intelligence rules
+    Score = 50 + color combination + pattern combination + per-item season
+    and formality points, clamped to 0-100
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+        self.combinations = []
+        for list_name in COMBINATION_LISTS:
+            for combination in data.get(list_name, []):
+                points = RATING_POINTS.get(combination.get('rating'), UNMATCHED_COLOR_POINTS)
+                reason = combination.get('reason', '')
+                if points < 0:
+                    reason = f'Avoid: {reason}'
+                self.combinations.append((combination, points, reason))
+
+        rules = data.get('patternRules', {})
+        self.pattern_rules = [rule for level in ('avoid', 'risky', 'safe') for rule in rules.get(level, [])]
+        self.pattern_tokens = sorted({rule.get(slot) for rule in self.pattern_rules for slot in ('top', 'bottom', 'footwear')}
+                                     - {None, 'patterned', 'solid'})
+
+        # Most color + pattern points any triple can earn (bounds the group triples rank has not opened)
+        self.max_pair_points = max([UNMATCHED_COLOR_POINTS] + [points for _, points, _ in self.combinations]) \
+            + max([SOLID_PATTERN_POINTS] + [rule.get('score', 0) for rule in self.pattern_rules])
+
+        # Longest formality token wins ('t-shirt' over 'shirt'); earlier levels win ties
+        self.formality_items = []
+        self.formality_occasions = []
+        self.formality_points = {}
+        for level, rule in data.get('formalityRules', {}).items():
+            level = level.replace('_', '-')
+            self.formality_points[level] = rule.get('score', 8)
+            self.formality_items.extend((item, level) for item in rule.get('items', []))
+            self.formality_occasions.extend((occasion, level) for occasion in rule.get('occasions', []))
+        self.formality_items.sort(key=lambda entry: -len(entry[0]))
+
+        self.scoring_bands = sorted(data.get('scoringSystem', {}).items(), key=lambda band: -band[1]['min'])
+
+        self._color_masks = [{}, {}, {}]
+        self._color_points = {}
+        self._pattern_points = {}
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_intelligence_data(path))
+
+    # Compiled lookups
+
+    def color_mask(self, slot, color):
+        """Bitmask of combinations whose rule for this slot matches color (substring match)"""
+        masks = self._color_masks[slot]
+        mask = masks.get(color)
+        if mask is None:
+            key = ('top', 'bottom', 'footwear')[slot]
+            mask = 0
+            for bit, (combination, _, _) in enumerate(self.combinations):
+                wanted = combination.get(key)
+                if not wanted or wanted.lower() in color:
+                    mask |= 1 << bit
+            masks[color] = mask
+        return mask
+
+    def color_points(self, colors):
+        """(points, reason) for a (top, bottom, footwear) color triple"""
+        result = self._color_points.get(colors)
+        if result is None:
+            matches = self.color_mask(0, colors[0]) & self.color_mask(1, colors[1]) & self.color_mask(2, colors[2])
+            if matches:
+                # Lowest set bit = first combination in precedence order
+                _, points, reason = self.combinations[(matches & -matches).bit_length() - 1]
+                result = (points, reason)
+            else:
+                result = (UNMATCHED_COLOR_POINTS, 'Safe color combination')
+            self._color_points[colors] = result
+        return result
+
+    def pattern_of(self, name):
+        """Pattern signature of an item name: (patterned, token, token, ...)"""
+        name = name.lower()
+        return (has_pattern(name),) + tuple(token in name for token in self.pattern_tokens)
+
+    def item_pattern(self, item):
+        """Pattern signature of an item's name, patterned as well when its image was detected as patterned"""
+        pattern = self.pattern_of(item.get('name', ''))
+        analysis = item.get('analysis')
+        if not pattern[0] and isinstance(analysis, dict) and analysis.get('pattern') == 'patterned':
+            pattern = (True,) + pattern[1:]
+        return pattern
+
+    def _pattern_matches(self, wanted, pattern):
+        if wanted is None:
+            return True
+        if wanted == 'patterned':
+            return pattern[0]
+        if wanted == 'solid':
+            return not pattern[0]
+        return pattern[1 + self.pattern_tokens.index(wanted)]
+
+    def pattern_points(self, patterns):
+        """(points, reason) for a (top, bottom, footwear) pattern signature triple"""
+        result = self._pattern_points.get(patterns)
+        if result is None:
+            result = (SOLID_PATTERN_POINTS, 'Clean solid combination')
+            for rule in self.pattern_rules:
+                if all(self._pattern_matches(rule.get(key), pattern)
+                       for key, pattern in zip(('top', 'bottom', 'footwear'), patterns)):
+                    result = (rule.get('score', 0), rule.get('reason', ''))
+                    break
+            self._pattern_points[patterns] = result
+        return result
+
+    def formality_of(self, name):
+        """Formality level of an item from its name"""
+        name = name.lower()
+        for token, level in self.formality_items:
+            if token in name:
+                return level
+        return 'smart-casual'
+
+    def context(self, temperature=None, season=None, event=None):
+        """
+        Scoring context from the weather and the occasion
+        Without temperature or season every item counts as in season;
+        without an event the occasion is casual
+        """
+        if season is None and temperature is not None:
+            season = season_for_temperature(float(temperature))
+
+        formality = 'casual'
+        if event:
+            event = event.lower()
+            for occasion, level in self.formality_occasions:
+                if occasion in event:
+                    formality = level
+                    break
+            else:
+                formality = 'smart-casual'
+        return OutfitContext(season, formality)
+
+    def item_points(self, item, context):
+        """(points, reasons) an item earns on its own: season and formality"""
+        points = 0
+        reasons = []
+
+        item_season = item.get('season') or 'all-season'
+        if context.season is None or item_season in (context.season, 'all-season'):
+            points += SEASON_MATCH_POINTS
+        else:
+            points += SEASON_MISMATCH_POINTS
+            reasons.append(f"{item.get('name', 'Item')} not ideal for {context.season}")
+
+        formality = self.formality_of(item.get('name', ''))
+        if formality == context.formality:
+            points += self.formality_points.get(formality, 8)
+        elif (formality, context.formality) in COMPATIBLE_FORMALITY:
+            points += FORMALITY_COMPATIBLE_POINTS
+        else:
+            points += FORMALITY_MISMATCH_POINTS
+        return points, reasons
+
+    def rating(self, score):
+        """Scoring band name for a 0-100 score"""
+        for name, band in self.scoring_bands:
+            if score >= band['min']:
+                return name
+        return 'bad'
+
+    # Scoring
+
+    def score_outfit(self, outfit, context):
+        """Score one (top, bottom, footwear) outfit; returns (score, reason)"""
+        colors = tuple(item_color(item) for item in outfit)
+        patterns = tuple(self.item_pattern(item) for item in outfit)
+
+        color_points, color_reason = self.color_points(colors)
+        pattern_points, pattern_reason = self.pattern_points(patterns)
+        score = BASE_SCORE + color_points + pattern_points
+        reasons = [color_reason]
+        season_reasons = []
+        for item in outfit:
+            points, item_reasons = self.item_points(item, context)
+            score += points
+            season_reasons.extend(item_reasons)
+
+        if season_reasons:
+            reasons.append(', '.join(season_reasons))
+        elif context.season:
+            reasons.append(f'Perfect for {context.season} weather')
+        reasons.append(pattern_reason)
+        reasons.append(f'Appropriate for {context.formality} occasion')
+        return max(0, min(100, round(score))), ' • '.join(reason for reason in reasons if reason)
+
+    def _groups(self, items, slot, context):
+        """Group one slot's items by (color, pattern), items sorted by their own points"""
+        groups = {}
+        for item in items:
+            key = (item_color(item), self.item_pattern(item))
+            groups.setdefault(key, []).append((self.item_points(item, context)[0], item))
+        result = []
+        for (color, pattern), members in groups.items():
+            members.sort(key=lambda member: -member[0])
+            self.color_mask(slot, color)
+            result.append(Group(color, pattern, [item for _, item in members], [points for points, _ in members]))
+        return result
+
+    def rank(self, items, context, limit=10):
+        """
+        Rank every top x bottom x footwear combination of items
+        Returns: (total_combinations, best) where best holds up to limit
+        (score, reason, (top, bottom, footwear)) tuples, best first
+        Group triples are opened lazily, starting from the one with the best
+        members and merging outwards; an unopened triple can score at most
+        its members' points plus max_pair_points, so outfits are taken from
+        the opened ones while they beat that bound and the cost depends on
+        limit rather than on the number of group triples
+        """
+        slots = [[item for item in items if item.get('category') == slot] for slot in OUTFIT_SLOTS]
+        total = len(slots[0]) * len(slots[1]) * len(slots[2])
+        if not total or limit <= 0:
+            return total, []
+
+        tops, bottoms, shoes = (sorted(self._groups(members, slot, context), key=lambda group: -group.unary[0])
+                                for slot, members in enumerate(slots))
+
+        def unary(t, b, s):
+            return tops[t].unary[0] + bottoms[b].unary[0] + shoes[s].unary[0]
+
+        # Unopened group triples by their members' best points; opened ones' outfits by score
+        groups = [(-unary(0, 0, 0), 0, 0, 0)]
+        opened = {(0, 0, 0)}
+        heap = []
+        seen = set()
+        best = []
+        while len(best) < limit and (heap or groups):
+            if groups and (not heap or -heap[0][0] < -groups[0][0] + self.max_pair_points):
+                _, t, b, s = heapq.heappop(groups)
+                pair = self.color_points((tops[t].color, bottoms[b].color, shoes[s].color))[0] \
+                    + self.pattern_points((tops[t].pattern, bottoms[b].pattern, shoes[s].pattern))[0]
+                heapq.heappush(heap, (-(pair + unary(t, b, s)), t, b, s, 0, 0, 0, pair))
+                for dt, db, ds in ((1, 0, 0), (0, 1, 0), (0, 0, 1)):
+                    triple = (t + dt, b + db, s + ds)
+                    if triple[0] < len(tops) and triple[1] < len(bottoms) and triple[2] < len(shoes) \
+                            and triple not in opened:
+                        opened.add(triple)
+                        heapq.heappush(groups, (-unary(*triple), *triple))
+                continue
+
+            _, t, b, s, i, j, k, pair = heapq.heappop(heap)
+            outfit = (tops[t].items[i], bottoms[b].items[j], shoes[s].items[k])
+            best.append(self.score_outfit(outfit, context) + (outfit,))
+
+            for di, dj, dk in ((1, 0, 0), (0, 1, 0), (0, 0, 1)):
+                state = (t, b, s, i + di, j + dj, k + dk)
+                if state[3] < len(tops[t].items) and state[4] < len(bottoms[b].items) \
+                        and state[5] < len(shoes[s].items) and state not in seen:
+                    seen.add(state)
+                    score = pair + tops[t].unary[state[3]] + bottoms[b].unary[state[4]] + shoes[s].unary[state[5]]
+                    heapq.heappush(heap, (-score, *state, pair))
+        return total, best
@@ -0,0 +1,127 @@
+"""
+Smart Wardrobe - Result Cache
+Content-addressed cache for cloth change results
+Small in-memory LRU tier in front of the results FileStore, which holds
+the on-disk tier and enforces its TTL and byte quota
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def digest_bytes(data):
+    """Return a hex SHA-256 digest of raw upload bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_cache_key(*parts):
+    """Combine digests and option strings into a single cache key"""
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier LRU cache of encoded result images
+    - Memory tier: OrderedDict of key -> bytes, evicted by total byte size
+    - Disk tier: a FileStore; files it sweeps are dropped from memory too,
+      so a cached result always has a servable URL
+    Keys are content-derived filenames ("<digest>.<ext>"), so files are
+    never rewritten once stored
+    """
+
+    def __init__(self, store, max_memory_bytes):
+        self.store = store
+        self.max_memory_bytes = max_memory_bytes
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        store.add_delete_listener(self._forget_memory)
+
+    def relative_path(self, key):
+        """Path of the cached file relative to the store root (used in URLs)"""
+        return self.store.relative_path(key)
+
+    def get(self, key):
+        """Return cached bytes for key, or None on a miss"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return data
+
+        data = self.store.read(key)
+
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self._store_memory(key, data)
+            self.hits += 1
+            self.disk_hits += 1
+        return data
+
+    def contains(self, key):
+        """Check whether key is present in either tier"""
+        with self._lock:
+            if key in self._memory:
+                return True
+        return self.store.contains(key)
+
+    def put(self, key, data):
+        """Store encoded bytes under key in both tiers"""
+        self.store.put(key, data)
+        with self._lock:
+            self._store_memory(key, data)
+
+    def _store_memory(self, key, data):
+        """Insert into the memory tier; caller holds the lock"""
+        if len(data) > self.max_memory_bytes:
+            return
+
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _forget_memory(self, key):
+        """Drop a key whose file was removed from the store"""
+        with self._lock:
+            data = self._memory.pop(key, None)
+            if data is not None:
+                self._memory_bytes -= len(data)
+
+    def stats(self):
+        """Return hit/miss counters and tier sizes"""
+        store_stats = self.store.stats()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': store_stats['expired'] + store_stats['evicted'],
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'max_memory_bytes': self.max_memory_bytes,
+                'disk_entries': store_stats['files'],
+                'disk_bytes': store_stats['bytes'],
+                'max_disk_bytes': store_stats['max_bytes']
+            }
@@ -0,0 +1,9 @@
+"""
+Smart Wardrobe - Server Entry Point
+Kept to a few lines: worker processes import the main script again, and
+they only need imaging/analysis, not the app
+"""
+
+if __name__ == '__main__':
+    import app
+    app.main()
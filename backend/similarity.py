@@ -0,0 +1,411 @@
+"""
+Smart Wardrobe - Similarity Index
+"Find items like this one" over garment photos, uploads and try-on results
+- Each image is described once by a 72-byte feature row: a 64-bit
+  perceptual hash (DCT of a 32x32 grayscale) and a 64-bin color histogram
+  of the garment pixels (background dropped as in garment_analysis)
+- Rows are appended to one contiguous file that is memory-mapped, so
+  startup maps it instead of reading it and every worker process shares
+  the pages; image paths are appended to a text file alongside it
+- Rows of images that were deleted are tombstoned and skipped, and the
+  files are rewritten without them once they make up a quarter of the rows
+- Queries scan the rows in blocks, comparing a batch of query rows with a
+  block at once (popcount of XORed hashes, histogram distances by matrix
+  product), and keep a running top-k per query
+- A row whose hash and colors are both nearly equal marks a near-duplicate
+"""
+
+import mmap
+import os
+import threading
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows; appends from several processes need it
+    fcntl = None
+
+from garment_analysis import foreground_mask, rgb_to_lab
+from ingest import load_image
+
+INDEX_MAGIC = b'SWSIM001'
+HEADER_SIZE = 64
+
+HASH_SIZE = 8  # 8x8 low DCT frequencies -> 64 bits
+HASH_BYTES = HASH_SIZE * HASH_SIZE // 8
+HASH_IMAGE_SIZE = 32
+HISTOGRAM_LEVELS = 4  # per RGB channel -> 64 bins
+HISTOGRAM_BINS = HISTOGRAM_LEVELS ** 3
+ROW_BYTES = HASH_BYTES + HISTOGRAM_BINS
+
+# Longest side images are decoded to before describing them
+FEATURE_SIZE = 64
+
+# Share of the distance that comes from colors (the rest from the perceptual hash)
+COLOR_WEIGHT = 0.5
+
+# Near-duplicate: at most this many differing hash bits and this color distance (0-1)
+DUPLICATE_HASH_BITS = 8
+DUPLICATE_COLOR_DISTANCE = 0.05
+
+# Rows compared with the queries per step (bounds the temporary arrays)
+QUERY_BLOCK_ROWS = 65536
+
+# Removed rows are dropped from the files once they are this share of all rows (and at least this many)
+COMPACT_DEAD_SHARE = 0.25
+COMPACT_MIN_DEAD_ROWS = 64
+
+# Orthonormal DCT-II basis for the hash image
+_DCT = np.sqrt(2 / HASH_IMAGE_SIZE) * np.cos(
+    np.pi * (2 * np.arange(HASH_IMAGE_SIZE)[None, :] + 1) * np.arange(HASH_IMAGE_SIZE)[:, None] / (2 * HASH_IMAGE_SIZE))
+_DCT[0] /= np.sqrt(2)
+# Set bits per byte value, for numpy versions without bitwise_count
+_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+# Largest histogram distance: two disjoint sqrt-normalised histograms scaled to 255
+_MAX_COLOR_DISTANCE = 255 * np.sqrt(2)
+
+
+class IndexFileError(ValueError):
+    """Raised when a similarity index file is not one (or has another row layout)"""
+
+
+def perceptual_hash(gray):
+    """64-bit DCT hash of a 2-D uint8 array, as HASH_BYTES bytes"""
+    small = np.asarray(Image.fromarray(gray).resize((HASH_IMAGE_SIZE, HASH_IMAGE_SIZE), Image.Resampling.BOX),
+                       dtype=np.float32)
+    low = (_DCT @ small @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # The DC term only carries brightness; leave it out of the median
+    return np.packbits(low > np.median(low[1:]))
+
+
+def color_histogram(rgb, mask):
+    """sqrt of the normalised RGB histogram of the masked pixels, scaled to uint8"""
+    levels = (rgb[mask] // (256 // HISTOGRAM_LEVELS)).astype(np.intp)
+    bins = (levels[:, 0] * HISTOGRAM_LEVELS + levels[:, 1]) * HISTOGRAM_LEVELS + levels[:, 2]
+    counts = np.bincount(bins, minlength=HISTOGRAM_BINS)
+    return np.rint(np.sqrt(counts / max(1, counts.sum())) * 255).astype(np.uint8)
+
+
+def image_features(data):
+    """Feature row (ROW_BYTES bytes) of encoded image bytes"""
+    rgba = np.asarray(load_image(BytesIO(data), FEATURE_SIZE, 'RGBA'))
+    rgb = np.ascontiguousarray(rgba[..., :3])
+    mask = foreground_mask(rgba, rgb_to_lab(rgb))
+    gray = np.asarray(Image.fromarray(rgb).convert('L'))
+    return perceptual_hash(gray).tobytes() + color_histogram(rgb, mask).tobytes()
+
+
+def image_features_file(path):
+    """image_features for an image file (the entry point of worker processes)"""
+    with open(path, 'rb') as f:
+        return image_features(f.read())
+
+
+def _hamming(hashes, others):
+    """Differing bits between uint64 hash arrays (broadcast)"""
+    xor = hashes ^ others
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(xor)
+    return _POPCOUNT[xor.view(np.uint8)].reshape(xor.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+class SimilarityIndex:
+    """
+    Feature rows of images, keyed by path, with k-nearest-neighbour search
+    - path holds a 64-byte header and the rows; path + '.keys' one key per
+      line; path + '.removed' the numbers of removed rows, one per line
+    - Writers take an exclusive lock on path + '.lock' and readers a shared
+      one, so several processes can share the files; each process maps new
+      rows and removals when it next reads
+    - remove() tombstones a row; once COMPACT_DEAD_SHARE of the rows are
+      dead the live ones are rewritten to new files, which other processes
+      notice (the rows file is another inode) and map from scratch
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.keys_path = path + '.keys'
+        self.removed_path = path + '.removed'
+        self._lock = threading.Lock()
+
+        self.added = 0
+        self.removed = 0
+        self.compactions = 0
+        self.queries = 0
+        self.duplicates = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock_file = open(path + '.lock', 'a+b')
+        self._file_lock()
+        try:
+            self._open()
+            self._file.seek(0)
+            header = self._file.read(HEADER_SIZE)
+            if not header:
+                self._file.write(INDEX_MAGIC + np.array([HASH_BYTES, HISTOGRAM_BINS], '<u4').tobytes()
+                                 + bytes(HEADER_SIZE - len(INDEX_MAGIC) - 8))
+                self._file.flush()
+            elif header[:8] != INDEX_MAGIC or np.frombuffer(header[8:16], '<u4').tolist() != [HASH_BYTES, HISTOGRAM_BINS]:
+                raise IndexFileError(f'{path} is not a similarity index with {ROW_BYTES}-byte rows')
+            self._repair()
+            with self._lock:
+                self._refresh()
+        finally:
+            self._file_unlock()
+
+    def _open(self):
+        """Open the current files and forget what was mapped from earlier ones"""
+        self._file = open(self.path, 'a+b')
+        self._keys_file = open(self.keys_path, 'a+b')
+        self._removed_file = open(self.removed_path, 'a+b')
+        self._keys = []
+        self._rows = {}
+        self._keys_offset = 0
+        self._removed_offset = 0
+        self._matrix = None
+        self._map = None
+        # Squared histogram norm and liveness per row, extended as rows are mapped
+        self._norms = np.zeros(0, np.float32)
+        self._alive = np.zeros(0, bool)
+
+    def _file_lock(self, shared=False):
+        if fcntl is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+    def _file_unlock(self):
+        if fcntl is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _repair(self):
+        """Cut a partly written last row, key or removal (an interrupted append); caller holds the file lock"""
+        self._keys_file.seek(0)
+        keys = self._keys_file.read()
+        key_count = keys.count(b'\n')
+        row_count = (os.fstat(self._file.fileno()).st_size - HEADER_SIZE) // ROW_BYTES
+        count = min(key_count, row_count)
+        if count < key_count or len(keys) > keys.rfind(b'\n') + 1:
+            self._keys_file.truncate(sum(len(line) + 1 for line in keys.split(b'\n')[:count]))
+        self._file.truncate(HEADER_SIZE + count * ROW_BYTES)
+        self._removed_file.seek(0)
+        removed = self._removed_file.read()
+        self._removed_file.truncate(removed.rfind(b'\n') + 1)
+
+    def _refresh(self):
+        """Pick up rows and removals written since the last read (by any process); caller holds both locks"""
+        if os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino:
+            # Compacted by another process
+            for f in (self._file, self._keys_file, self._removed_file):
+                f.close()
+            self._open()
+
+        with open(self.keys_path, 'rb') as f:
+            f.seek(self._keys_offset)
+            tail = f.read()
+        complete = tail.rfind(b'\n') + 1
+        for line in tail[:complete].split(b'\n')[:-1]:
+            key = line.decode('utf-8')
+            self._rows[key] = len(self._keys)
+            self._keys.append(key)
+        self._keys_offset += complete
+
+        rows = min(len(self._keys), (os.fstat(self._file.fileno()).st_size - HEADER_SIZE) // ROW_BYTES)
+        if self._matrix is None or len(self._matrix) != rows:
+            if rows:
+                self._map = mmap.mmap(self._file.fileno(), HEADER_SIZE + rows * ROW_BYTES, access=mmap.ACCESS_READ)
+                self._matrix = np.frombuffer(self._map, np.uint8, rows * ROW_BYTES, HEADER_SIZE).reshape(rows, ROW_BYTES)
+            else:
+                self._matrix = np.zeros((0, ROW_BYTES), np.uint8)
+            new_rows = self._matrix[len(self._norms):, HASH_BYTES:]
+            self._norms = np.concatenate([self._norms] + [
+                (block.astype(np.float32) ** 2).sum(axis=1)
+                for block in np.array_split(new_rows, max(1, len(new_rows) // QUERY_BLOCK_ROWS))])
+            self._alive = np.concatenate([self._alive, np.ones(rows - len(self._alive), bool)])
+
+        with open(self.removed_path, 'rb') as f:
+            f.seek(self._removed_offset)
+            tail = f.read()
+        complete = tail.rfind(b'\n') + 1
+        for line in tail[:complete].split(b'\n')[:-1]:
+            row = int(line)
+            if row < len(self._alive):
+                self._alive[row] = False
+                key = self._keys[row]
+                if self._rows.get(key) == row:
+                    del self._rows[key]
+        self._removed_offset += complete
+        return self._matrix
+
+    def _read(self):
+        """Refresh under the shared file lock; returns (matrix, norms, alive, keys); caller holds the lock"""
+        self._file_lock(shared=True)
+        try:
+            matrix = self._refresh()
+        finally:
+            self._file_unlock()
+        return matrix, self._norms, self._alive, self._keys
+
+    def __len__(self):
+        """Live rows"""
+        with self._lock:
+            self._read()
+            return len(self._rows)
+
+    def __contains__(self, key):
+        with self._lock:
+            self._read()
+            return key in self._rows
+
+    def features(self, key):
+        """Stored feature row of key, or None"""
+        with self._lock:
+            matrix = self._read()[0]
+            row = self._rows.get(key)
+            return matrix[row].tobytes() if row is not None and row < len(matrix) else None
+
+    def add(self, key, features):
+        """Append key's feature row; returns False if key is already indexed"""
+        if '\n' in key or len(features) != ROW_BYTES:
+            raise ValueError('Keys are single lines and features are image_features() rows')
+        with self._lock:
+            self._file_lock()
+            try:
+                self._refresh()
+                if key in self._rows:
+                    return False
+                # Key first: readers only use rows that have both
+                self._keys_file.write(key.encode('utf-8') + b'\n')
+                self._keys_file.flush()
+                self._file.write(features)
+                self._file.flush()
+                self._refresh()
+            finally:
+                self._file_unlock()
+            self.added += 1
+        return True
+
+    def remove(self, key):
+        """Tombstone key's row (e.g. its file was swept); returns False if key is not indexed"""
+        with self._lock:
+            self._file_lock()
+            try:
+                matrix = self._refresh()
+                row = self._rows.get(key)
+                if row is None or row >= len(matrix):
+                    return False
+                self._removed_file.write(b'%d\n' % row)
+                self._removed_file.flush()
+                self._refresh()
+                dead = len(self._alive) - int(self._alive.sum())
+                if dead >= COMPACT_MIN_DEAD_ROWS and dead >= COMPACT_DEAD_SHARE * len(self._alive):
+                    self._compact()
+            finally:
+                self._file_unlock()
+            self.removed += 1
+        return True
+
+    def _compact(self):
+        """Rewrite the live rows and keys to new files; caller holds both locks"""
+        live = np.flatnonzero(self._alive)
+        self._file.seek(0)
+        header = self._file.read(HEADER_SIZE)
+        for target, data in ((self.keys_path, b''.join(self._keys[row].encode('utf-8') + b'\n' for row in live)),
+                             (self.path, header + self._matrix[live].tobytes())):
+            tmp_path = f'{target}.tmp{os.getpid()}'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, target)
+        # Removed row numbers refer to the old files; readers remap everything once they see the new rows file
+        self._removed_file.truncate(0)
+        for f in (self._file, self._keys_file, self._removed_file):
+            f.close()
+        self._open()
+        self._refresh()
+        self.compactions += 1
+
+    def search(self, queries, k):
+        """
+        Nearest live rows of each query feature row
+        Returns one list per query of (key, distance, hash_bits, color_distance),
+        closest first; distance = COLOR_WEIGHT * color + (1 - COLOR_WEIGHT) * hash bits / 64
+        """
+        with self._lock:
+            matrix, norms, alive, keys = self._read()
+            self.queries += len(queries)
+        query = np.frombuffer(b''.join(queries), np.uint8).reshape(len(queries), ROW_BYTES)
+        query_hash = query[:, :HASH_BYTES].copy().view(np.uint64)
+        query_hist = query[:, HASH_BYTES:].astype(np.float32)
+        query_norms = (query_hist ** 2).sum(axis=1)[:, None]
+
+        # Running top-k per query: row, distance, hash bits, color distance
+        best = [np.zeros((len(query), 0), dtype) for dtype in (np.int64, np.float32, np.uint8, np.float32)]
+        for start in range(0, len(matrix), QUERY_BLOCK_ROWS):
+            block = matrix[start:start + QUERY_BLOCK_ROWS]
+            hash_bits = _hamming(query_hash, block[:, :HASH_BYTES].view(np.uint64).T)
+            hist = block[:, HASH_BYTES:].astype(np.float32)
+            squared = query_norms + norms[None, start:start + len(block)] - 2 * query_hist @ hist.T
+            colors = np.sqrt(np.maximum(squared, 0)) / _MAX_COLOR_DISTANCE
+            distances = COLOR_WEIGHT * colors + (1 - COLOR_WEIGHT) * hash_bits / (HASH_BYTES * 8)
+            distances[:, ~alive[start:start + len(block)]] = np.inf
+            rows = np.broadcast_to(np.arange(start, start + len(block)), distances.shape)
+
+            best = [np.concatenate(pair, axis=1) for pair in zip(best, (rows, distances, hash_bits, colors))]
+            if best[1].shape[1] > k:
+                keep = np.argpartition(best[1], k - 1, axis=1)[:, :k]
+                best = [np.take_along_axis(values, keep, axis=1) for values in best]
+
+        results = []
+        for rows, distances, hash_bits, colors in zip(*best):
+            order = np.argsort(distances, kind='stable')
+            results.append([(keys[rows[i]], round(float(distances[i]), 4), int(hash_bits[i]), round(float(colors[i]), 4))
+                            for i in order if np.isfinite(distances[i])])
+        return results
+
+    def search_live(self, queries, k, live):
+        """
+        search() keeping only keys for which live(key) is true
+        Asks for more candidates until each query has k live ones or every
+        row was returned, so deleted images never make the results short
+        """
+        alive = {}
+        results = [None] * len(queries)
+        pending = list(range(len(queries)))
+        candidates = k
+        while pending:
+            remaining = []
+            for index, matches in zip(pending, self.search([queries[index] for index in pending], candidates)):
+                kept = [match for match in matches if alive.setdefault(match[0], live(match[0]))]
+                if len(kept) >= k or len(matches) < candidates:
+                    results[index] = kept[:k]
+                else:
+                    remaining.append(index)
+            pending = remaining
+            candidates *= 4
+        return results
+
+    def find_duplicate(self, features, candidates=5, live=None):
+        """Keys of indexed images (only those live(key) accepts, if given) that are near-duplicates of features, closest first"""
+        matches = self.search_live([features], candidates, live)[0] if live else self.search([features], candidates)[0]
+        duplicates = [key for key, _, hash_bits, color in matches
+                      if hash_bits <= DUPLICATE_HASH_BITS and color <= DUPLICATE_COLOR_DISTANCE]
+        if duplicates:
+            with self._lock:
+                self.duplicates += 1
+        return duplicates
+
+    def stats(self):
+        """Row count and counters"""
+        with self._lock:
+            matrix, _, alive, _ = self._read()
+            return {
+                'rows': len(self._rows),
+                'dead_rows': len(alive) - int(alive.sum()),
+                'bytes': len(matrix) * ROW_BYTES,
+                'added': self.added,
+                'removed': self.removed,
+                'compactions': self.compactions,
+                'queries': self.queries,
+                'duplicates': self.duplicates
+            }
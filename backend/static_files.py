@@ -0,0 +1,213 @@
+"""
+Smart Wardrobe - Static Files
+Serving layer for the frontend pages, scripts, styles and media
+- Every file is hashed once (at startup, or when it changes on disk); the
+  hash is its strong ETag, so revalidation is answered from memory
+- HTML pages reference local assets with a ?v=<fingerprint> query added
+  at load time; requests carrying the current fingerprint are cacheable
+  for a year as immutable, pages themselves are always revalidated
+- Text assets (HTML/JS/CSS/JSON/SVG) are held in memory together with
+  gzip and, when the brotli package is installed, brotli encodings that
+  are compressed once at maximum level and picked by Accept-Encoding
+- Media is streamed from disk with Range support (video seeking)
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from collections import namedtuple
+
+from flask import Response, send_file
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip is always available
+    brotli = None
+
+# Mimetypes held in memory and precompressed
+COMPRESSIBLE_TYPES = {'text/html', 'text/css', 'text/javascript', 'application/javascript',
+                      'application/json', 'image/svg+xml', 'text/plain'}
+# Smaller files are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+# Browser cache lifetime of assets requested without their fingerprint
+UNVERSIONED_MAX_AGE_SECONDS = 3600
+IMMUTABLE_MAX_AGE_SECONDS = 365 * 24 * 3600
+FINGERPRINT_LENGTH = 12
+
+# src="..." / href="..." attributes of HTML pages
+_ASSET_ATTRIBUTE = re.compile(rb'''(\b(?:src|href)=)(["'])([^"'#?:]+)\2''')
+
+StaticAsset = namedtuple('StaticAsset', 'name path size mtime_ns etag fingerprint mimetype body encodings')
+
+
+def _compress(body):
+    """Encodings of body that are smaller than it: {'br': bytes, 'gzip': bytes}"""
+    encodings = {}
+    if brotli is not None:
+        encodings['br'] = brotli.compress(body, quality=11)
+    encodings['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+    return {name: data for name, data in encodings.items() if len(data) < len(body)}
+
+
+class StaticAssets:
+    """
+    Hashed, precompressed view of a directory of static files
+    Directories in exclude (e.g. uploads) are left to the caller
+    """
+
+    def __init__(self, root, exclude=()):
+        self.root = os.path.abspath(root)
+        self.exclude = tuple(os.path.abspath(path) + os.sep for path in exclude)
+        self._lock = threading.Lock()
+        self._assets = {}
+        self.rebuilds = 0
+        self.scan()
+
+    def _excluded(self, path):
+        return path.startswith(self.exclude) or os.path.basename(path).startswith('.')
+
+    def scan(self):
+        """Hash and compress every file; pages last, since they embed the other fingerprints"""
+        names = []
+        for directory, subdirectories, files in os.walk(self.root):
+            subdirectories[:] = [name for name in subdirectories
+                                 if not self._excluded(os.path.join(directory, name) + os.sep)]
+            for filename in files:
+                path = os.path.join(directory, filename)
+                if not self._excluded(path):
+                    names.append(os.path.relpath(path, self.root).replace(os.sep, '/'))
+        names.sort(key=lambda name: name.endswith('.html'))
+        for name in names:
+            self._build(name)
+
+    def _build(self, name):
+        """(Re)build one asset from disk; returns it, or None if it is gone"""
+        path = os.path.join(self.root, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._assets.pop(name, None)
+            return None
+
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        body = None
+        encodings = {}
+        if mimetype in COMPRESSIBLE_TYPES:
+            with open(path, 'rb') as f:
+                body = f.read()
+            if mimetype == 'text/html':
+                body = self._fingerprint_references(name, body)
+            digest = hashlib.sha256(body).hexdigest()
+            if len(body) >= COMPRESS_MIN_BYTES:
+                encodings = _compress(body)
+        else:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            digest = digest.hexdigest()
+
+        asset = StaticAsset(name, path, stat.st_size, stat.st_mtime_ns, digest[:32], digest[:FINGERPRINT_LENGTH],
+                            mimetype, body, encodings)
+        with self._lock:
+            self._assets[name] = asset
+        return asset
+
+    def _fingerprint_references(self, name, body):
+        """Append ?v=<fingerprint> to src/href attributes naming a known non-HTML asset"""
+        base = os.path.dirname(name)
+
+        def add_version(match):
+            reference = match.group(3).decode('utf-8', 'replace')
+            target = os.path.normpath(os.path.join(base, reference)).replace(os.sep, '/')
+            asset = self._assets.get(target)
+            if asset is None or asset.mimetype == 'text/html':
+                return match.group(0)
+            return match.group(1) + match.group(2) + match.group(3) + b'?v=' + asset.fingerprint.encode() + match.group(2)
+
+        return _ASSET_ATTRIBUTE.sub(add_version, body)
+
+    def lookup(self, name):
+        """Current asset for a relative path, or None if it is not a managed file"""
+        name = os.path.normpath(name).replace(os.sep, '/')
+        if name.startswith('../') or name == '..' or os.path.isabs(name):
+            return None
+        path = os.path.join(self.root, name)
+        if self._excluded(path):
+            return None
+
+        asset = self._assets.get(name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        if asset is None or asset.size != stat.st_size or asset.mtime_ns != stat.st_mtime_ns:
+            # Changed on disk (or added) since the scan
+            previous = asset
+            asset = self._build(name)
+            with self._lock:
+                self.rebuilds += 1
+                pages = [page for page in self._assets if page.endswith('.html')]
+            if asset is not None and asset.mimetype != 'text/html' and \
+                    (previous is None or previous.fingerprint != asset.fingerprint):
+                # Pages embed the old fingerprint; rebuild them so they point at the new content
+                for page in pages:
+                    self._build(page)
+        return asset
+
+    def respond(self, asset, request):
+        """Response for asset honouring If-None-Match, Accept-Encoding, Range and ?v="""
+        if request.args.get('v') == asset.fingerprint:
+            cache_control = f'public, max-age={IMMUTABLE_MAX_AGE_SECONDS}, immutable'
+        elif asset.mimetype == 'text/html':
+            cache_control = 'no-cache'
+        else:
+            cache_control = f'public, max-age={UNVERSIONED_MAX_AGE_SECONDS}'
+
+        encoding = None
+        if asset.encodings and 'Range' not in request.headers:
+            for name in ('br', 'gzip'):
+                if name in asset.encodings and request.accept_encodings[name]:
+                    encoding = name
+                    break
+        etag = f'{asset.etag}-{encoding}' if encoding else asset.etag
+
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        elif asset.body is None:
+            response = send_file(asset.path, mimetype=asset.mimetype, etag=etag, conditional=True)
+        elif encoding:
+            response = Response(asset.encodings[encoding], mimetype=asset.mimetype)
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = Response(asset.body, mimetype=asset.mimetype)
+            response.set_etag(etag)
+            response = response.make_conditional(request, accept_ranges=True, complete_length=len(asset.body))
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        if asset.encodings:
+            response.vary.add('Accept-Encoding')
+        return response
+
+    def stats(self):
+        """Counts and sizes of the managed files"""
+        with self._lock:
+            assets = list(self._assets.values())
+            rebuilds = self.rebuilds
+        text = [asset for asset in assets if asset.body is not None]
+        return {
+            'files': len(assets),
+            'bytes': sum(asset.size for asset in assets),
+            'text_files': len(text),
+            'text_bytes': sum(len(asset.body) for asset in text),
+            'gzip_bytes': sum(len(asset.encodings.get('gzip', asset.body)) for asset in text),
+            'brotli_bytes': sum(len(asset.encodings.get('br', asset.body)) for asset in text) if brotli else None,
+            'rebuilds': rebuilds
+        }
@@ -0,0 +1,298 @@
+"""
+Smart Wardrobe - File Storage
+Sharded on-disk storage for uploads and results with a lifecycle policy
+- Files live in hashed two-character subdirectories so no directory grows large
+- A SQLite index tracks size and last access time of every file, so sweeps
+  and stats never have to list or stat the directories
+- A background sweeper deletes files past their TTL and then the least
+  recently used files until the store is back under its byte quota
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import subprocess
+import threading
+import time
+
+INDEX_FILENAME = '.storage-index.sqlite3'
+
+# Access times are only rewritten when older than this, to keep reads cheap
+TOUCH_INTERVAL_SECONDS = 60
+
+# Suffix put() gives a file while it is being written: .tmp<pid>.<thread id>
+TEMP_SUFFIX = re.compile(r'\.tmp\d+\.\d+$')
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for(name):
+    """Two-character shard directory for a filename"""
+    return hashlib.md5(name.encode()).hexdigest()[:2]
+
+
+def tracked_names(root):
+    """Names of files directly under root that git tracks (empty outside a checkout)"""
+    try:
+        output = subprocess.run(['git', 'ls-files', '-z', '--', '.'], cwd=root, capture_output=True,
+                                check=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return set()
+    return {name for name in output.decode(errors='replace').split('\0') if name and '/' not in name}
+
+
+class FileStore:
+    """
+    Sharded, indexed file store with TTL and quota enforcement
+    - ttl_seconds: files not accessed for this long are removed (None = keep)
+    - max_bytes: total size the sweeper shrinks the store back under
+    Files found directly under root at startup (from before sharding) are
+    indexed where they are, so they age out like everything else; files
+    tracked in the repository are left alone
+    """
+
+    def __init__(self, root, ttl_seconds, max_bytes):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._sweeper = None
+        self._wake = threading.Event()
+        self._stopped = False
+
+        self.sweeps = 0
+        self.expired = 0
+        self.evicted = 0
+        self.last_sweep_at = None
+
+        os.makedirs(root, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(root, INDEX_FILENAME), check_same_thread=False,
+                                   isolation_level=None, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                name TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self._db.execute('CREATE INDEX IF NOT EXISTS files_accessed ON files (accessed)')
+        self._adopt_flat_files()
+        self._approx_bytes = self.total_bytes()
+
+    def _adopt_flat_files(self):
+        """Index files sitting directly under root that the index does not know yet"""
+        with os.scandir(self.root) as it:
+            entries = [entry for entry in it if entry.is_file() and not entry.name.startswith('.')]
+        tracked = tracked_names(self.root)
+
+        with self._lock:
+            known = {row[0] for row in self._db.execute('SELECT name FROM files WHERE path = name')}
+            # Repository files must never be swept, even if an older index adopted them
+            self._db.executemany('DELETE FROM files WHERE name = ? AND path = name',
+                                 [(name,) for name in known & tracked])
+            rows = []
+            for entry in entries:
+                if entry.name in tracked:
+                    continue
+                if TEMP_SUFFIX.search(entry.name):
+                    # Left behind by a write interrupted before its rename
+                    os.remove(entry.path)
+                    continue
+                if entry.name not in known:
+                    stat = entry.stat()
+                    rows.append((entry.name, entry.name, stat.st_size, stat.st_mtime, stat.st_mtime))
+            if rows:
+                self._db.executemany('INSERT OR IGNORE INTO files VALUES (?, ?, ?, ?, ?)', rows)
+
+    def add_delete_listener(self, callback):
+        """Register callback(name) to run whenever a file is removed from the store"""
+        self._listeners.append(callback)
+
+    def relative_path(self, name):
+        """Path of a stored (or to be stored) file relative to root"""
+        with self._lock:
+            row = self._db.execute('SELECT path FROM files WHERE name = ?', (name,)).fetchone()
+        if row:
+            return row[0]
+        return f'{shard_for(name)}/{name}'
+
+    def path_for(self, name):
+        """Absolute path of a stored (or to be stored) file"""
+        return os.path.join(self.root, self.relative_path(name))
+
+    def contains(self, name):
+        """Check whether name is in the index"""
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM files WHERE name = ?', (name,)).fetchone() is not None
+
+    def put(self, name, data):
+        """Atomically write data under name and index it; returns the relative path"""
+        relative = f'{shard_for(name)}/{name}'
+        path = os.path.join(self.root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = f'{path}.tmp{os.getpid()}.{threading.get_ident()}'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        now = time.time()
+        with self._lock:
+            # An overwrite replaces the old file, so only the size difference counts towards the quota
+            old = self._db.execute('SELECT size FROM files WHERE name = ?', (name,)).fetchone()
+            self._db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+                             (name, relative, len(data), now, now))
+            self._approx_bytes += len(data) - (old[0] if old else 0)
+            over_quota = self._approx_bytes > self.max_bytes
+
+        # Let the sweeper catch up right away instead of at its next interval
+        if over_quota:
+            self._wake.set()
+        return relative
+
+    def read(self, name):
+        """Return the bytes stored under name, or None if missing"""
+        with self._lock:
+            row = self._db.execute('SELECT path, accessed FROM files WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return None
+
+        try:
+            with open(os.path.join(self.root, row[0]), 'rb') as f:
+                data = f.read()
+        except OSError:
+            self._remove([name])
+            return None
+
+        self.touch(name, row[1])
+        return data
+
+    def touch(self, name, accessed=None):
+        """Record an access so the file counts as recently used"""
+        now = time.time()
+        if accessed is not None and now - accessed < TOUCH_INTERVAL_SECONDS:
+            return
+        with self._lock:
+            self._db.execute('UPDATE files SET accessed = ? WHERE name = ?', (now, name))
+
+    def delete(self, name):
+        """Remove a file from disk and the index"""
+        self._remove([name])
+
+    def _remove(self, names):
+        """Delete files and index rows, then notify listeners"""
+        if not names:
+            return
+
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT name, path, size FROM files WHERE name IN ({','.join('?' * len(names))})", names).fetchall()
+            self._db.executemany('DELETE FROM files WHERE name = ?', [(name,) for name in names])
+            self._approx_bytes -= sum(row[2] for row in rows)
+
+        for _, path, _ in rows:
+            try:
+                os.remove(os.path.join(self.root, path))
+            except OSError:
+                pass
+
+        for name in names:
+            for callback in self._listeners:
+                callback(name)
+
+    def total_bytes(self):
+        """Total size of all indexed files"""
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(SUM(size), 0) FROM files').fetchone()[0]
+
+    def sweep(self, batch_size=500):
+        """
+        Enforce the lifecycle policy once
+        Returns: (expired, evicted) file counts
+        """
+        expired = evicted = 0
+
+        if self.ttl_seconds is not None:
+            cutoff = time.time() - self.ttl_seconds
+            while True:
+                with self._lock:
+                    names = [row[0] for row in self._db.execute(
+                        'SELECT name FROM files WHERE accessed < ? LIMIT ?', (cutoff, batch_size))]
+                if not names:
+                    break
+                self._remove(names)
+                expired += len(names)
+
+        excess = self.total_bytes() - self.max_bytes
+        while excess > 0:
+            with self._lock:
+                rows = self._db.execute(
+                    'SELECT name, size FROM files ORDER BY accessed LIMIT ?', (batch_size,)).fetchall()
+            if not rows:
+                break
+            names = []
+            for name, size in rows:
+                names.append(name)
+                excess -= size
+                if excess <= 0:
+                    break
+            self._remove(names)
+            evicted += len(names)
+
+        total = self.total_bytes()
+        with self._lock:
+            self._approx_bytes = total
+            self.sweeps += 1
+            self.expired += expired
+            self.evicted += evicted
+            self.last_sweep_at = time.time()
+        return expired, evicted
+
+    def start_sweeper(self, interval_seconds):
+        """Run sweep() every interval_seconds (or as soon as a put exceeds the quota) on a daemon thread"""
+        if self._sweeper is not None:
+            return
+
+        def run():
+            while True:
+                self._wake.wait(interval_seconds)
+                self._wake.clear()
+                if self._stopped:
+                    return
+                try:
+                    self.sweep()
+                except Exception:
+                    logger.exception('Storage sweep failed', extra={'root': self.root})
+
+        self._sweeper = threading.Thread(target=run, name='storage-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        """Stop the background sweeper"""
+        self._stopped = True
+        self._wake.set()
+
+    def stats(self):
+        """Return file count, size, age and sweep counters"""
+        with self._lock:
+            count, size, oldest = self._db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(accessed) FROM files').fetchone()
+            return {
+                'files': count,
+                'bytes': size,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'oldest_access_age_seconds': round(time.time() - oldest, 1) if oldest else None,
+                'sweeps': self.sweeps,
+                'expired': self.expired,
+                'evicted': self.evicted,
+                'last_sweep_at': self.last_sweep_at
+            }
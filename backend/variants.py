@@ -0,0 +1,164 @@
+"""
+Smart Wardrobe - Image Variants
+Resized copies of wardrobe, upload and result images for thumbnails and
+responsive srcsets
+- Requested widths snap to a fixed ladder, so each source has a handful
+  of variants instead of one per pixel width
+- A variant's key is derived from the source path, size and mtime plus the
+  width/format/quality, so it doubles as a strong ETag and changes
+  whenever the source file is replaced
+- Variants are rendered once on a thread pool (concurrent requests for
+  the same key share one render) and kept in a FileStore that evicts
+  them by age and byte quota
+"""
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+
+from imaging import OUTPUT_FORMATS, encode_image
+from ingest import load_image, open_image
+from result_cache import make_cache_key
+
+# Widths a variant may have; requests are rounded up to the next one
+VARIANT_WIDTHS = (96, 160, 240, 320, 480, 640, 960, 1280)
+# Variant formats by preference when the client's Accept header allows them
+NEGOTIATED_FORMATS = (('image/webp', 'webp'),)
+FALLBACK_FORMAT = 'jpeg'
+# Lossy quality used for variants (thumbnails tolerate more compression)
+VARIANT_QUALITY = 82
+
+
+def snap_width(width):
+    """Smallest ladder width that is at least width (the largest one above the ladder)"""
+    for candidate in VARIANT_WIDTHS:
+        if candidate >= width:
+            return candidate
+    return VARIANT_WIDTHS[-1]
+
+
+def negotiate_format(accept_header):
+    """Best variant format the client accepts"""
+    for mimetype, output_format in NEGOTIATED_FORMATS:
+        if mimetype in (accept_header or ''):
+            return output_format
+    return FALLBACK_FORMAT
+
+
+def variant_key(source_path, width, output_format, quality=VARIANT_QUALITY):
+    """
+    Content-derived name of a variant ("<digest>.<ext>") for the source as it is on disk now
+    Raises OSError when the source does not exist
+    """
+    stat = os.stat(source_path)
+    extension = OUTPUT_FORMATS[output_format][2]
+    digest = make_cache_key('variant', os.path.abspath(source_path), stat.st_size, stat.st_mtime_ns,
+                            width, output_format, quality)
+    return f'{digest}.{extension}'
+
+
+def render_variant(data, width, output_format, quality=VARIANT_QUALITY):
+    """
+    Decode source bytes at (close to) the target width and encode the variant
+    Sources narrower than width keep their size; alpha is kept for PNG/WEBP
+    and flattened onto white for JPEG
+    """
+    header = open_image(BytesIO(data))
+    source_width, source_height = header.size
+    has_alpha = header.mode in ('RGBA', 'LA', 'PA') or 'transparency' in header.info
+    header.close()
+
+    # load_image bounds the longest side; pick the bound that makes the width fit
+    bound = width if source_width >= source_height else -(-width * source_height // source_width)
+    keep_alpha = has_alpha and output_format != 'jpeg'
+    image = load_image(BytesIO(data), bound, 'RGBA' if has_alpha else 'RGB')
+    if has_alpha and not keep_alpha:
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    return encode_image(image, output_format, quality, width)
+
+
+class VariantCache:
+    """
+    Variants stored in a FileStore, rendered on a lazily created thread pool
+    Concurrent requests for a missing variant share one render
+    """
+
+    def __init__(self, store, workers):
+        self.store = store
+        self.workers = workers
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = {}
+
+        self.hits = 0
+        self.renders = 0
+        self.failures = 0
+
+    def _get_executor(self):
+        """Thread pool for renders (Pillow releases the GIL while resizing and encoding)"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='variant-render')
+        return self._executor
+
+    def request(self, key, source_path, width, output_format):
+        """
+        Future for the variant stored under key, scheduling a render if needed
+        The future resolves to the variant's absolute path
+        """
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                return pending
+
+        if self.store.contains(key):
+            self.store.touch(key)
+            with self._lock:
+                self.hits += 1
+            done = Future()
+            done.set_result(self.store.path_for(key))
+            return done
+
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._get_executor().submit(self._render, key, source_path, width, output_format)
+                self._pending[key] = pending
+        return pending
+
+    def _render(self, key, source_path, width, output_format):
+        """Render one variant into the store (runs on the pool)"""
+        try:
+            with open(source_path, 'rb') as f:
+                data = f.read()
+            self.store.put(key, render_variant(data, width, output_format))
+            with self._lock:
+                self.renders += 1
+            return self.store.path_for(key)
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def stats(self):
+        """Hit/render counters and store usage"""
+        store_stats = self.store.stats()
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'renders': self.renders,
+                'failures': self.failures,
+                'pending': len(self._pending),
+                'files': store_stats['files'],
+                'bytes': store_stats['bytes'],
+                'max_bytes': store_stats['max_bytes'],
+                'evicted': store_stats['expired'] + store_stats['evicted']
+            }
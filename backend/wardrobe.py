@@ -0,0 +1,269 @@
+"""
+Smart Wardrobe - Wardrobe Queries
+Builds and runs listing queries against the clothes collection
+- Keyset (cursor) pagination on _id or created_at, stable under inserts
+- Field projection and equality filters taken from query parameters
+- A generator mode that yields documents as the Mongo cursor produces them
+- Async variants of the page and generator reads for Motor collections
+  (the query building and cursors are shared with the synchronous ones)
+- The compound indexes those queries rely on, and explain() summaries
+  showing whether a query is served by them
+"""
+
+import base64
+import json
+from collections import namedtuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, IndexModel
+
+# Query parameters that filter on a field of the same name (comma separated = any of)
+FILTER_FIELDS = ('owner', 'category', 'color', 'season')
+
+# Fields a listing may be ordered by; _id breaks ties so the order is total
+SORT_FIELDS = ('_id', 'created_at')
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Documents fetched per round trip when streaming
+STREAM_BATCH_SIZE = 500
+
+ListQuery = namedtuple('ListQuery', 'filter projection fields sort_field direction limit')
+
+# Indexes for the listing access patterns; every key ends in _id so the
+# keyset tie-breaker is part of the index and pages never need a sort stage
+# - equality filters in the default _id order (owner's own listing included)
+# - created_at ordering, globally and per owner
+# - owner listings narrowed by category
+WARDROBE_INDEXES = [
+    IndexModel([('created_at', ASCENDING), ('_id', ASCENDING)], name='created_at_id'),
+    IndexModel([('category', ASCENDING), ('_id', ASCENDING)], name='category_id'),
+    IndexModel([('color', ASCENDING), ('_id', ASCENDING)], name='color_id'),
+    IndexModel([('season', ASCENDING), ('_id', ASCENDING)], name='season_id'),
+    IndexModel([('owner', ASCENDING), ('_id', ASCENDING)], name='owner_id'),
+    IndexModel([('owner', ASCENDING), ('category', ASCENDING), ('_id', ASCENDING)], name='owner_category_id'),
+    IndexModel([('owner', ASCENDING), ('created_at', ASCENDING), ('_id', ASCENDING)], name='owner_created_at_id')
+]
+
+# Representative listing queries of each route, explained by the diagnostics endpoint
+EXPLAIN_PATTERNS = {
+    'list': {},
+    'list_by_created_at': {'sort': '-created_at'},
+    'list_by_category': {'category': 'shirt'},
+    'list_by_color': {'color': 'blue'},
+    'list_by_season': {'season': 'summer'},
+    'list_by_owner': {'owner': 'owner'},
+    'list_by_owner_and_category': {'owner': 'owner', 'category': 'shirt'},
+    'list_by_owner_created_at': {'owner': 'owner', 'sort': 'created_at'},
+    'list_category_names': {'category': 'shirt', 'fields': 'category'}
+}
+
+# Plan stages that read an index rather than the collection
+INDEX_STAGES = {'IXSCAN', 'IDHACK', 'EXPRESS_IXSCAN', 'COUNT_SCAN', 'DISTINCT_SCAN'}
+
+
+class QueryError(ValueError):
+    """Raised for invalid listing parameters"""
+
+
+def encode_cursor(document, sort_field):
+    """Opaque cursor pointing just after document in the current ordering"""
+    position = {'id': str(document['_id'])}
+    if sort_field != '_id':
+        position['v'] = document.get(sort_field)
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor; returns (last_id, last_value)"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return ObjectId(position['id']), position.get('v')
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise QueryError('Invalid cursor')
+
+
+def keyset_filter(sort_field, direction, cursor):
+    """Filter selecting documents strictly after the cursor position"""
+    last_id, last_value = decode_cursor(cursor)
+    after = '$gt' if direction > 0 else '$lt'
+
+    if sort_field == '_id':
+        return {'_id': {after: last_id}}
+
+    # Mongo orders missing/null values before everything else
+    same_value = {sort_field: last_value, '_id': {after: last_id}}
+    if last_value is None:
+        if direction > 0:
+            return {'$or': [same_value, {sort_field: {'$ne': None}}]}
+        return same_value
+    if direction > 0:
+        return {'$or': [same_value, {sort_field: {'$gt': last_value}}]}
+    return {'$or': [same_value, {sort_field: {'$lt': last_value}}, {sort_field: None}]}
+
+
+def build_list_query(args, default_limit=DEFAULT_PAGE_SIZE):
+    """
+    Translate request query parameters into a ListQuery
+    - limit: page size (default_limit when absent, None means unlimited)
+    - cursor: next_cursor from the previous page
+    - fields: comma separated fields to return
+    - sort: _id, created_at or -created_at (descending)
+    - category / color / season: equality filters
+    """
+    query_filter = {}
+    for field in FILTER_FIELDS:
+        value = args.get(field)
+        if value:
+            values = [v.strip() for v in value.split(',') if v.strip()]
+            query_filter[field] = values[0] if len(values) == 1 else {'$in': values}
+
+    sort = args.get('sort', '_id')
+    direction = -1 if sort.startswith('-') else 1
+    sort_field = sort.lstrip('-')
+    if sort_field not in SORT_FIELDS:
+        raise QueryError(f"Cannot sort by '{sort_field}'. Use one of: {', '.join(SORT_FIELDS)}")
+
+    limit = args.get('limit')
+    if limit is None:
+        limit = default_limit
+    else:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise QueryError('limit must be an integer')
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise QueryError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+
+    cursor = args.get('cursor')
+    if cursor:
+        query_filter = {'$and': [query_filter, keyset_filter(sort_field, direction, cursor)]} \
+            if query_filter else keyset_filter(sort_field, direction, cursor)
+
+    fields = None
+    projection = None
+    if args.get('fields'):
+        fields = [f.strip() for f in args['fields'].split(',') if f.strip() and f.strip() != '_id']
+        # _id and the sort field are needed to build the next cursor
+        projection = dict.fromkeys(fields + ['_id', sort_field], 1)
+
+    return ListQuery(query_filter, projection, fields, sort_field, direction, limit)
+
+
+def _clean(document, query):
+    """Drop _id (never exposed) and fields only fetched for the cursor"""
+    document.pop('_id', None)
+    if query.fields is not None and query.sort_field not in query.fields:
+        document.pop(query.sort_field, None)
+    return document
+
+
+def _find(collection, query):
+    """Run the query with its ordering (tie broken on _id)"""
+    sort = [(query.sort_field, query.direction)]
+    if query.sort_field != '_id':
+        sort.append(('_id', query.direction))
+    return collection.find(query.filter, query.projection).sort(sort)
+
+
+def fetch_page(collection, query):
+    """
+    Fetch one page of documents
+    Returns: (documents, next_cursor); next_cursor is None on the last page
+    """
+    return _page(list(_find(collection, query).limit(query.limit + 1)), query)
+
+
+async def fetch_page_async(collection, query):
+    """fetch_page for a Motor collection"""
+    return _page(await _find(collection, query).limit(query.limit + 1).to_list(None), query)
+
+
+def _page(documents, query):
+    """Trim the look-ahead document off a fetched page and build the next cursor"""
+    next_cursor = None
+    if len(documents) > query.limit:
+        documents = documents[:query.limit]
+        next_cursor = encode_cursor(documents[-1], query.sort_field)
+    return [_clean(document, query) for document in documents], next_cursor
+
+
+def iter_documents(collection, query):
+    """Yield documents one at a time as the Mongo cursor delivers them"""
+    cursor = _find(collection, query).batch_size(STREAM_BATCH_SIZE)
+    if query.limit:
+        cursor = cursor.limit(query.limit)
+    for document in cursor:
+        yield _clean(document, query)
+
+
+async def iter_documents_async(collection, query):
+    """iter_documents for a Motor collection"""
+    cursor = _find(collection, query).batch_size(STREAM_BATCH_SIZE)
+    if query.limit:
+        cursor = cursor.limit(query.limit)
+    async for document in cursor:
+        yield _clean(document, query)
+
+
+def ensure_indexes(collection):
+    """Create any missing WARDROBE_INDEXES (existing ones are left alone); returns their names"""
+    return collection.create_indexes(WARDROBE_INDEXES)
+
+
+def _plan_stages(plan, stages, indexes):
+    """Collect stage names and index names from a (possibly nested) plan tree"""
+    plan = plan.get('queryPlan', plan)
+    for shard in plan.get('shards', []):
+        _plan_stages(shard.get('winningPlan', {}), stages, indexes)
+    if 'stage' in plan:
+        stages.append(plan['stage'])
+    if 'indexName' in plan:
+        indexes.append(plan['indexName'])
+    for child in [plan.get('inputStage')] + plan.get('inputStages', []):
+        if child:
+            _plan_stages(child, stages, indexes)
+
+
+def summarize_explain(explanation):
+    """
+    Reduce explain() output to what matters for indexing
+    - uses_index: the winning plan reads an index
+    - covered: answered from the index alone (no FETCH or collection scan)
+    - in_memory_sort: results are sorted after fetching instead of by the index
+    """
+    stages = []
+    indexes = []
+    _plan_stages(explanation.get('queryPlanner', {}).get('winningPlan', {}), stages, indexes)
+    stats = explanation.get('executionStats', {})
+
+    uses_index = any(stage in INDEX_STAGES for stage in stages)
+    collection_scan = 'COLLSCAN' in stages
+    return {
+        'stages': stages,
+        'indexes': indexes,
+        'uses_index': uses_index,
+        'collection_scan': collection_scan,
+        'covered': uses_index and not collection_scan and 'FETCH' not in stages,
+        'in_memory_sort': 'SORT' in stages,
+        'docs_examined': stats.get('totalDocsExamined'),
+        'keys_examined': stats.get('totalKeysExamined'),
+        'returned': stats.get('nReturned'),
+        'millis': stats.get('executionTimeMillis')
+    }
+
+
+def explain_query(collection, query):
+    """Explain a listing query exactly as fetch_page/iter_documents would run it"""
+    cursor = _find(collection, query)
+    if query.limit:
+        cursor = cursor.limit(query.limit + 1)
+    return summarize_explain(cursor.explain())
+
+
+def explain_lookup(collection, document_id):
+    """Explain the single-item lookup used by /clothes/<id>"""
+    return summarize_explain(collection.find({'_id': document_id}, {'_id': 0}).explain())
@@ -0,0 +1,206 @@
+"""
+Smart Wardrobe - Wardrobe Cache
+Read-through cache in front of the clothes collection
+- Single items and listing pages are kept in size-bounded LRU caches with
+  a TTL (the TTL only matters for writes made outside this app)
+- Every entry is filed under the current generation of the tags it
+  depends on: its item, the owners a page is filtered by (or "unscoped"
+  for pages not filtered by owner) and a global epoch. A write bumps the
+  tags it affects, so exactly the stale entries stop being found
+- Generations are per process, or kept in a small memory-mapped file that
+  all worker processes on the host share, so a write in one worker
+  invalidates the entries cached by the others
+"""
+
+import mmap
+import os
+import threading
+import zlib
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows; only SharedGenerations needs it
+    fcntl = None
+
+from ttl_cache import TTLCache
+from wardrobe import FILTER_FIELDS
+
+# Counter slots of a shared generation file; tags hash into them, a collision only over-invalidates
+GENERATION_SLOTS = 65536
+
+# Request parameters that select a listing page
+PAGE_PARAMETERS = FILTER_FIELDS + ('limit', 'cursor', 'fields', 'sort')
+
+EPOCH_TAG = '*'
+UNSCOPED_TAG = 'unscoped'
+
+
+def item_tag(item_id):
+    return f'item:{item_id}'
+
+
+def owner_tag(owner):
+    return f'owner:{owner}'
+
+
+def owner_tags(*owners):
+    """Tags invalidated by a write to items of these owners (pages not filtered by owner always are)"""
+    return [UNSCOPED_TAG] + [owner_tag(owner) for owner in owners if isinstance(owner, str)]
+
+
+class LocalGenerations:
+    """Generation counters of one process"""
+
+    description = 'local'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def get(self, tags):
+        counters = self._counters
+        return tuple(counters.get(tag, 0) for tag in tags)
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._counters[tag] = self._counters.get(tag, 0) + 1
+
+
+class SharedGenerations:
+    """
+    Generation counters in a memory-mapped file shared by every process that opens it
+    Reads are plain loads from the mapping; increments take an exclusive file lock
+    """
+
+    description = 'shared'
+
+    def __init__(self, path, slots=GENERATION_SLOTS):
+        if fcntl is None:
+            raise RuntimeError('Shared wardrobe cache generations need fcntl (POSIX)')
+        self.path = path
+        self.slots = slots
+        self._file = open(path, 'a+b')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._file.fileno()).st_size < slots * 8:
+                self._file.truncate(slots * 8)
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._file.fileno(), slots * 8)
+        self._counters = np.frombuffer(self._map, dtype='<u8', count=slots)
+
+    def _slot(self, tag):
+        # crc32 rather than hash(): it must agree between processes
+        return zlib.crc32(tag.encode('utf-8')) % self.slots
+
+    def get(self, tags):
+        counters = self._counters
+        return tuple(int(counters[self._slot(tag)]) for tag in tags)
+
+    def bump(self, tags):
+        slots = {self._slot(tag) for tag in tags}
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            for slot in slots:
+                self._counters[slot] += 1
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+
+
+class WardrobeCache:
+    """
+    Item and page caches with tag-generation invalidation
+    Cached documents and pages are shared between requests and must be
+    treated as read-only
+    """
+
+    def __init__(self, max_items, max_pages, ttl_seconds, generations=None):
+        self.items = TTLCache(max_items, ttl_seconds)
+        self.pages = TTLCache(max_pages, ttl_seconds)
+        self.generations = generations or LocalGenerations()
+        self._lock = threading.Lock()
+        self.invalidations = 0
+
+    def _key(self, kind, identity, tags):
+        # Generations are read before the database, so a write racing with a
+        # miss can only file the result under generations that are already stale
+        return kind, identity, self.generations.get(tags)
+
+    def _item_key(self, item_id):
+        return self._key('item', item_id, (EPOCH_TAG, item_tag(item_id)))
+
+    def _page_key(self, args):
+        identity = tuple(sorted((name, args[name]) for name in PAGE_PARAMETERS if args.get(name)))
+        owners = args.get('owner')
+        if owners:
+            tags = (EPOCH_TAG,) + tuple(owner_tag(owner.strip()) for owner in owners.split(',') if owner.strip())
+        else:
+            tags = (EPOCH_TAG, UNSCOPED_TAG)
+        return self._key('page', identity, tags)
+
+    def get_item(self, item_id, load):
+        """Document for item_id, from the cache or load() (None results are not cached)"""
+        key = self._item_key(item_id)
+        document = self.items.get(key)
+        if document is None:
+            document = load()
+            if document is not None:
+                self.items.put(key, document)
+        return document
+
+    def get_page(self, args, load):
+        """(documents, next_cursor) for listing parameters args, from the cache or load()"""
+        key = self._page_key(args)
+        page = self.pages.get(key)
+        if page is None:
+            page = load()
+            self.pages.put(key, page)
+        return page
+
+    async def get_item_async(self, item_id, load):
+        """get_item with load() returning an awaitable (async server)"""
+        key = self._item_key(item_id)
+        document = self.items.get(key)
+        if document is None:
+            document = await load()
+            if document is not None:
+                self.items.put(key, document)
+        return document
+
+    async def get_page_async(self, args, load):
+        """get_page with load() returning an awaitable (async server)"""
+        key = self._page_key(args)
+        page = self.pages.get(key)
+        if page is None:
+            page = await load()
+            self.pages.put(key, page)
+        return page
+
+    def invalidate(self, item_id=None, owners=()):
+        """Forget an item (if given) and the pages its owners' (old and new) listings could include"""
+        tags = owner_tags(*owners)
+        if item_id is not None:
+            tags.append(item_tag(item_id))
+        self.generations.bump(tags)
+        with self._lock:
+            self.invalidations += 1
+
+    def invalidate_all(self):
+        """Forget everything (bulk writes)"""
+        self.generations.bump([EPOCH_TAG])
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self):
+        """Hit/miss counters of both caches"""
+        with self._lock:
+            invalidations = self.invalidations
+        return {
+            'items': self.items.stats(),
+            'pages': self.pages.stats(),
+            'invalidations': invalidations,
+            'generations': self.generations.description
+        }
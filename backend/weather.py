@@ -0,0 +1,271 @@
+"""
+Smart Wardrobe - Weather Suggestions
+Offline weather data and outfit suggestions for the weather stylist
+- Weather comes from a WeatherProvider (see weather_providers); city names
+  are indexed once by a CityIndex (exact, prefix and typo-tolerant matching)
+- Temperature, condition, wind and humidity advice is a data-driven rule
+  table; condition strings are lower-cased and matched once per distinct
+  condition, temperature bands are found with a binary search
+- Complete suggestion responses are memoised per (city, conditions) in an
+  LRU cache with a TTL, so repeated lookups skip the rule evaluation
+"""
+
+import bisect
+import functools
+import threading
+
+from cities import CityIndex, normalize_name
+from ttl_cache import TTLCache
+
+# Built-in weather data (StaticWeatherProvider), shaped like OpenWeather's current weather response
+MOCK_CITIES = {
+    'london': {
+        'main': {'temp': 15, 'feels_like': 13, 'humidity': 75},
+        'weather': [{'main': 'Clouds', 'description': 'overcast clouds'}],
+        'wind': {'speed': 5.5}
+    },
+    'new york': {
+        'main': {'temp': 22, 'feels_like': 21, 'humidity': 60},
+        'weather': [{'main': 'Clear', 'description': 'clear sky'}],
+        'wind': {'speed': 3.2}
+    },
+    'tokyo': {
+        'main': {'temp': 18, 'feels_like': 17, 'humidity': 70},
+        'weather': [{'main': 'Rain', 'description': 'light rain'}],
+        'wind': {'speed': 4.1}
+    },
+    'paris': {
+        'main': {'temp': 16, 'feels_like': 15, 'humidity': 68},
+        'weather': [{'main': 'Clouds', 'description': 'few clouds'}],
+        'wind': {'speed': 4.5}
+    },
+    'dubai': {
+        'main': {'temp': 35, 'feels_like': 38, 'humidity': 55},
+        'weather': [{'main': 'Clear', 'description': 'clear sky'}],
+        'wind': {'speed': 2.8}
+    },
+    'mumbai': {
+        'main': {'temp': 28, 'feels_like': 30, 'humidity': 85},
+        'weather': [{'main': 'Rain', 'description': 'moderate rain'}],
+        'wind': {'speed': 6.2}
+    },
+    'sydney': {
+        'main': {'temp': 20, 'feels_like': 19, 'humidity': 65},
+        'weather': [{'main': 'Clear', 'description': 'sunny'}],
+        'wind': {'speed': 3.5}
+    },
+    'moscow': {
+        'main': {'temp': 5, 'feels_like': 2, 'humidity': 80},
+        'weather': [{'main': 'Snow', 'description': 'light snow'}],
+        'wind': {'speed': 7.1}
+    },
+    'singapore': {
+        'main': {'temp': 31, 'feels_like': 35, 'humidity': 90},
+        'weather': [{'main': 'Rain', 'description': 'tropical rain'}],
+        'wind': {'speed': 4.0}
+    },
+    'los angeles': {
+        'main': {'temp': 25, 'feels_like': 24, 'humidity': 50},
+        'weather': [{'main': 'Clear', 'description': 'sunny and warm'}],
+        'wind': {'speed': 2.5}
+    }
+}
+
+# Temperature bands: (upper bound, exclusive; None = no bound), advice, items
+TEMPERATURE_RULES = (
+    (0, "It's freezing! Bundle up warm.",
+     ('Heavy winter coat', 'Thermal layers', 'Wool scarf', 'Gloves', 'Winter boots')),
+    (10, "It's quite cold. Wear warm layers.",
+     ('Warm jacket or coat', 'Sweater', 'Long pants', 'Closed shoes', 'Light scarf')),
+    (15, "Cool weather. A jacket would be perfect.",
+     ('Light jacket', 'Long-sleeve shirt', 'Jeans', 'Sneakers')),
+    (20, "Mild and pleasant. Comfortable clothing recommended.",
+     ('Hoodie or cardigan', 'T-shirt', 'Jeans or casual pants', 'Comfortable shoes')),
+    (25, "Nice weather! Light clothing is ideal.",
+     ('T-shirt or polo', 'Light pants or shorts', 'Sneakers', 'Sunglasses')),
+    (30, "Warm weather. Stay cool and comfortable.",
+     ('Light t-shirt', 'Shorts or summer dress', 'Sandals', 'Sun hat', 'Sunglasses')),
+    (None, "Very hot! Wear minimal, breathable clothing.",
+     ('Tank top or light shirt', 'Shorts', 'Sandals', 'Sun protection', 'Stay hydrated!'))
+)
+
+# Condition rules: (keywords, advice, items); the first rule with a keyword in the condition applies
+CONDITION_RULES = (
+    (('rain', 'drizzle'), "It's rainy! Don't forget rain gear.",
+     ('Waterproof jacket', 'Umbrella', 'Water-resistant shoes')),
+    (('snow',), "Snowy conditions! Wear waterproof winter gear.",
+     ('Snow boots', 'Waterproof coat', 'Warm gloves')),
+    (('cloud',), "Cloudy skies. Layer up just in case.", ()),
+    (('clear', 'sun'), "Clear skies! Perfect weather to go out.",
+     ('Sunglasses', 'Light colors'))
+)
+
+# Threshold rules: (weather field, exclusive lower bound, advice, items); every matching rule applies
+THRESHOLD_RULES = (
+    ('wind_speed', 10, "It's windy! Consider a windbreaker.", ('Windbreaker or wind-resistant jacket',)),
+    ('humidity', 80, "High humidity. Choose breathable fabrics.", ('Breathable cotton or moisture-wicking fabrics',))
+)
+
+# Emoji rules: (keywords or () for any condition, exclusive minimum temperature or None, label); first match wins
+EMOJI_RULES = (
+    (('thunder',), None, 'Storm'),
+    (('rain', 'drizzle'), None, 'Rain'),
+    (('snow',), None, 'Snow'),
+    (('cloud',), None, 'Cloudy'),
+    ((), 30, 'Hot'),
+    (('clear',), None, 'Sunny'),
+    ((), None, 'Partly Cloudy')
+)
+
+RESOLVE_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=256)
+def _condition_rule(condition):
+    """First condition rule matching a (lower-cased) condition, or None"""
+    for keywords, advice, items in CONDITION_RULES:
+        if any(keyword in condition for keyword in keywords):
+            return advice, items
+    return None
+
+
+@functools.lru_cache(maxsize=256)
+def _emoji_rules(condition):
+    """Emoji rules that can match a (lower-cased) condition, as (min temperature, label)"""
+    return tuple((min_temp, label) for keywords, min_temp, label in EMOJI_RULES
+                 if not keywords or any(keyword in condition for keyword in keywords))
+
+
+_TEMPERATURE_BOUNDS = [bound for bound, _, _ in TEMPERATURE_RULES[:-1]]
+
+
+def weather_emoji(condition, temp):
+    """Label for a weather condition and temperature"""
+    for min_temp, label in _emoji_rules(condition.lower()):
+        if min_temp is None or temp > min_temp:
+            return label
+    return None
+
+
+def build_suggestions(temp, condition, humidity, wind_speed):
+    """
+    Apply the rule tables to one set of conditions
+    Returns: (suggestions, outfit_items) with duplicate items removed
+    """
+    _, advice, items = TEMPERATURE_RULES[bisect.bisect_right(_TEMPERATURE_BOUNDS, temp)]
+    suggestions = [advice]
+    outfit_items = list(items)
+
+    matched = _condition_rule(condition.lower())
+    if matched:
+        suggestions.append(matched[0])
+        outfit_items.extend(matched[1])
+
+    values = {'wind_speed': wind_speed, 'humidity': humidity}
+    for field, bound, advice, items in THRESHOLD_RULES:
+        if values[field] > bound:
+            suggestions.append(advice)
+            outfit_items.extend(items)
+
+    return suggestions, list(dict.fromkeys(outfit_items))
+
+
+class WeatherService:
+    """
+    City lookup and memoised suggestion responses over a WeatherProvider
+    Records are shared and must be treated as read-only
+    """
+
+    def __init__(self, provider, cache_size, cache_ttl_seconds):
+        self.provider = provider
+        self.suggestions = TTLCache(cache_size, cache_ttl_seconds)
+        self._index = None
+        self._index_lock = threading.Lock()
+        self._resolve = functools.lru_cache(maxsize=RESOLVE_CACHE_SIZE)(self._resolve_uncached)
+
+    @property
+    def index(self):
+        """City name index, built on first use"""
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = CityIndex(self.provider.city_names(), self.provider.city_weights())
+        return self._index
+
+    def _resolve_uncached(self, query):
+        return self.index.resolve(query)
+
+    def resolve(self, city):
+        """Entry of the city matching the user's input, or None"""
+        return self._resolve(normalize_name(city))
+
+    def get_weather(self, city):
+        """Today's weather record for the city matching the user's input, or None"""
+        entry = self.resolve(city)
+        return self.provider.current(entry) if entry is not None else None
+
+    def autocomplete(self, query, limit):
+        """Ranked city names for a partly typed query, as [{'name', 'match'}]"""
+        names = self.provider.city_names()
+        return [{'name': names[entry], 'match': kind} for entry, kind in self.index.search(query, limit)]
+
+    def _day_response(self, entry, record):
+        """Weather block, suggestions, items and emoji for one record, memoised per (city, conditions)"""
+        main = record['main']
+        weather = record['weather'][0]
+        wind_speed = record['wind']['speed']
+
+        key = (entry, main['temp'], main['feels_like'], main['humidity'],
+               weather['main'], weather['description'], wind_speed)
+        cached = self.suggestions.get(key)
+        if cached is None:
+            suggestions, outfit_items = build_suggestions(main['temp'], weather['main'], main['humidity'], wind_speed)
+            cached = {
+                'weather': {
+                    'temperature': round(main['temp'], 1),
+                    'feels_like': round(main['feels_like'], 1),
+                    'condition': weather['main'],
+                    'description': weather['description'].capitalize(),
+                    'humidity': main['humidity'],
+                    'wind_speed': wind_speed
+                },
+                'suggestions': suggestions,
+                'outfit_items': outfit_items,
+                'emoji': weather_emoji(weather['main'], main['temp'])
+            }
+            self.suggestions.put(key, cached)
+        return cached
+
+    def suggest(self, city):
+        """
+        Suggestion response for one city (the /api/weather/suggest body)
+        Returns None when the city is unknown
+        """
+        entry = self.resolve(city)
+        if entry is None:
+            return None
+        return dict(self._day_response(entry, self.provider.current(entry)), success=True, city=city)
+
+    def forecast(self, city, days):
+        """
+        Per-day suggestions from today on, as far as the provider has data
+        Returns None when the city is unknown
+        """
+        entry = self.resolve(city)
+        if entry is None:
+            return None
+        return {
+            'success': True,
+            'city': city,
+            'resolved_city': self.provider.city_names()[entry],
+            'days': [dict(self._day_response(entry, record), date=record['date'])
+                     for record in self.provider.forecast(entry, days)]
+        }
+
+    def known_cities(self, limit=10):
+        """Display names of the first known cities"""
+        return self.provider.city_names()[:limit]
+
+    def stats(self):
+        """Suggestion cache counters and provider summary"""
+        return dict(self.suggestions.stats(), **self.provider.describe())
@@ -0,0 +1,276 @@
+"""
+Smart Wardrobe - Weather Providers
+Sources of offline weather data for the weather stylist
+- StaticWeatherProvider serves a small dict of current conditions (the
+  built-in cities, or fixed data in tests)
+- DatasetWeatherProvider serves current conditions and per-day forecasts
+  from a columnar binary file that is memory-mapped read-only: opening it
+  only parses a small header, and its pages live in the OS page cache, so
+  every worker process shares one copy however many cities it holds
+Records are shaped like OpenWeather's current weather response
+"""
+
+import json
+import mmap
+import os
+from datetime import date, timedelta
+
+import numpy as np
+
+DATASET_MAGIC = b'SWWTHR01'
+DATASET_ALIGNMENT = 64
+
+# Per-day columns: name -> (dtype, scale); values are stored as round(value * scale)
+DAY_COLUMNS = {
+    'temp': ('<i2', 10),
+    'feels_like': ('<i2', 10),
+    'humidity': ('u1', 1),
+    'wind_speed': ('<u2', 10),
+    'condition': ('u1', 1),
+    'description': ('<u2', 1)
+}
+_SCALES = {name: scale for name, (_, scale) in DAY_COLUMNS.items()}
+
+
+class DatasetError(ValueError):
+    """Raised when a weather dataset file is malformed"""
+
+
+def make_record(temp, feels_like, humidity, wind_speed, condition, description):
+    """OpenWeather-shaped record"""
+    return {
+        'main': {'temp': temp, 'feels_like': feels_like, 'humidity': humidity},
+        'weather': [{'main': condition, 'description': description}],
+        'wind': {'speed': wind_speed},
+        'cod': 200
+    }
+
+
+class WeatherProvider:
+    """
+    Interface of a weather source; cities are addressed by entry number
+    (their position in city_names())
+    """
+
+    def city_names(self):
+        """Display names of all cities"""
+        raise NotImplementedError
+
+    def city_weights(self):
+        """Ranking weight per city (e.g. population), or None"""
+        return None
+
+    def current(self, entry):
+        """Today's record for a city"""
+        raise NotImplementedError
+
+    def forecast(self, entry, days):
+        """Records for up to days days starting today, each with an ISO 'date'"""
+        raise NotImplementedError
+
+    def describe(self):
+        """Summary for stats endpoints"""
+        return {'provider': type(self).__name__, 'cities': len(self.city_names())}
+
+
+class StaticWeatherProvider(WeatherProvider):
+    """Fixed current conditions from a {name: record} dict; the forecast is today only"""
+
+    def __init__(self, cities, today=date.today):
+        self.names = [name.title() for name in cities]
+        self.records = [dict(record, cod=200) for record in cities.values()]
+        self.today = today
+
+    def city_names(self):
+        return self.names
+
+    def current(self, entry):
+        return self.records[entry]
+
+    def forecast(self, entry, days):
+        if days <= 0:
+            return []
+        return [dict(self.records[entry], date=self.today().isoformat())]
+
+
+class DatasetWeatherProvider(WeatherProvider):
+    """
+    Memory-mapped weather dataset written by write_dataset
+    Day d of the file is start_date + d; "today" is clamped into the
+    file's date range
+    """
+
+    def __init__(self, path, today=date.today):
+        self.path = path
+        self.today = today
+
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if self._map[:len(DATASET_MAGIC)] != DATASET_MAGIC:
+                raise DatasetError(f'{path} is not a weather dataset')
+            header_start = len(DATASET_MAGIC) + 4
+            header_length = int.from_bytes(self._map[len(DATASET_MAGIC):header_start], 'little')
+            header = json.loads(self._map[header_start:header_start + header_length])
+
+            self.city_count = header['cities']
+            self.day_count = header['days']
+            self.start_date = date.fromisoformat(header['start_date'])
+            self.conditions = header['conditions']
+            self.descriptions = header['descriptions']
+            self._columns = {name: self._column(spec) for name, spec in header['columns'].items()}
+        except (KeyError, TypeError, ValueError) as e:
+            self.close()
+            raise DatasetError(f'{path}: malformed dataset ({e})')
+
+        self._names = None
+
+    def _column(self, spec):
+        """Zero-copy view of one column"""
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape']))
+        if spec['offset'] + count * dtype.itemsize > len(self._map):
+            raise DatasetError(f'column at {spec["offset"]} runs past the end of the file')
+        return np.frombuffer(self._map, dtype=dtype, count=count, offset=spec['offset']).reshape(spec['shape'])
+
+    def city_names(self):
+        """Decoded on first use (the city index needs every name as a str)"""
+        if self._names is None:
+            offsets = self._columns['name_offsets'].tolist()
+            blob = self._columns['names'].tobytes()
+            self._names = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(self.city_count)]
+        return self._names
+
+    def city_weights(self):
+        return self._columns['population'].tolist()
+
+    def day_index(self):
+        """Index of today in the file, clamped to its range"""
+        return min(max((self.today() - self.start_date).days, 0), self.day_count - 1)
+
+    def _record(self, entry, day):
+        columns = self._columns
+        return make_record(
+            float(columns['temp'][entry, day] / _SCALES['temp']),
+            float(columns['feels_like'][entry, day] / _SCALES['feels_like']),
+            int(columns['humidity'][entry, day]),
+            float(columns['wind_speed'][entry, day] / _SCALES['wind_speed']),
+            self.conditions[columns['condition'][entry, day]],
+            self.descriptions[columns['description'][entry, day]])
+
+    def current(self, entry):
+        return self._record(entry, self.day_index())
+
+    def forecast(self, entry, days):
+        first = self.day_index()
+        return [dict(self._record(entry, day), date=(self.start_date + timedelta(days=day)).isoformat())
+                for day in range(first, min(first + days, self.day_count))]
+
+    def describe(self):
+        return {
+            'provider': type(self).__name__,
+            'path': self.path,
+            'cities': self.city_count,
+            'days': self.day_count,
+            'start_date': self.start_date.isoformat(),
+            'bytes': len(self._map)
+        }
+
+    def close(self):
+        """Release the mapping; it stays open while views taken from it are alive"""
+        self._columns = {}
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+
+
+def write_dataset(path, cities, start_date, days):
+    """
+    Write a dataset file for DatasetWeatherProvider
+    cities: iterable of {'name', 'population' (optional), 'days': [...]} where
+    each day has temp, feels_like, humidity, wind_speed, condition and
+    description; missing days repeat the city's last day
+    The file is written next to path and renamed into place
+    """
+    names = []
+    population = []
+    tables = {'condition': {}, 'description': {}}
+    values = {name: [] for name in DAY_COLUMNS}
+    for city in cities:
+        if not city.get('days'):
+            raise ValueError(f"City {city.get('name')!r} has no days")
+        names.append(city['name'].encode('utf-8'))
+        population.append(city.get('population', 0))
+        city_days = list(city['days'][:days])
+        city_days += [city_days[-1]] * (days - len(city_days))
+        for day in city_days:
+            for name, (_, scale) in DAY_COLUMNS.items():
+                if name in tables:
+                    values[name].append(tables[name].setdefault(day[name], len(tables[name])))
+                else:
+                    values[name].append(round(day[name] * scale))
+
+    # Table indexes are stored in the column's dtype; more distinct values would wrap around
+    for name, table in tables.items():
+        limit = np.iinfo(DAY_COLUMNS[name][0]).max + 1
+        if len(table) > limit:
+            raise ValueError(f'Dataset has {len(table)} distinct {name} values; at most {limit} fit')
+
+    arrays = {
+        'name_offsets': np.cumsum([0] + [len(name) for name in names], dtype='<u4'),
+        'names': np.frombuffer(b''.join(names), dtype='u1'),
+        'population': np.array(population, dtype='<u4')
+    }
+    for name, (dtype, _) in DAY_COLUMNS.items():
+        arrays[name] = np.array(values[name], dtype=dtype).reshape(len(names), days)
+
+    # Header first with placeholder offsets, so its length is known; offsets are fixed-width
+    columns = {name: {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': 0} for name, array in arrays.items()}
+    header = {
+        'cities': len(names),
+        'days': days,
+        'start_date': start_date.isoformat(),
+        'conditions': list(tables['condition']),
+        'descriptions': list(tables['description']),
+        'columns': columns
+    }
+    offset = len(DATASET_MAGIC) + 4 + len(json.dumps(header)) + 16 * len(columns)
+    for name, array in arrays.items():
+        offset += -offset % DATASET_ALIGNMENT
+        columns[name]['offset'] = offset
+        offset += array.nbytes
+    header_bytes = json.dumps(header).encode('utf-8')
+    if len(DATASET_MAGIC) + 4 + len(header_bytes) > columns['name_offsets']['offset']:
+        raise ValueError('Dataset header does not fit before the first column')
+
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(DATASET_MAGIC)
+        f.write(len(header_bytes).to_bytes(4, 'little'))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.write(b'\0' * (columns[name]['offset'] - f.tell()))
+            f.write(array.data)
+    os.replace(temp_path, path)
+
+
+def main():
+    """Build a dataset file from NDJSON (one city per line, as accepted by write_dataset)"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('source', help='NDJSON file of cities')
+    parser.add_argument('output', help='Dataset file to write')
+    parser.add_argument('--start-date', type=date.fromisoformat, default=date.today(), help='Date of day 0 (YYYY-MM-DD)')
+    parser.add_argument('--days', type=int, default=14)
+    args = parser.parse_args()
+
+    with open(args.source, encoding='utf-8') as f:
+        write_dataset(args.output, (json.loads(line) for line in f if line.strip()), args.start_date, args.days)
+    provider = DatasetWeatherProvider(args.output)
+    print(json.dumps(provider.describe()))
+
+
+if __name__ == '__main__':
+    main()
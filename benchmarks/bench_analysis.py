@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Garment Analysis Benchmark
+Times garment_analysis on synthetic garment photos (solid, striped and
+checked shirts on a plain backdrop) of several sizes, then measures the
+throughput of the analysis worker pool and what queueing costs the
+request that adds an item, next to analysing inline.
+
+Usage: python benchmarks/bench_analysis.py [--images N] [--workers 1,2,4] [--repeat R]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from bench_utils import add_backend_to_path
+
+add_backend_to_path()
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from garment_analysis import analyze_garment_file  # noqa: E402
+from jobs import JobQueue  # noqa: E402
+
+SIZES = [(688, 1024), (1500, 2000), (3000, 4000)]
+COLORS = [(28, 36, 76), (112, 24, 38), (200, 32, 40), (145, 188, 230), (12, 76, 48), (240, 205, 40), (20, 20, 22)]
+
+
+def make_garment(path, size, rng):
+    """Write a shirt silhouette, solid, striped or checked, on a light backdrop"""
+    width, height = size
+    outline = [(width * x, height * y) for x, y in ((.25, .1), (.75, .1), (.9, .35), (.78, .4), (.75, .9),
+                                                    (.25, .9), (.22, .4), (.1, .35))]
+    color = rng.choice(COLORS)
+    fabric = Image.new('RGB', size, color)
+    draw = ImageDraw.Draw(fabric)
+    kind = rng.choice(('solid', 'stripes', 'check'))
+    step = max(4, width // 30)
+    if kind == 'stripes':
+        for x in range(0, width, step * 2):
+            draw.rectangle([x, 0, x + step - 1, height], fill=(245, 245, 245))
+    elif kind == 'check':
+        for x in range(0, width, step * 2):
+            for y in range(0, height, step * 2):
+                draw.rectangle([x, y, x + step - 1, y + step - 1], fill=(20, 20, 22))
+                draw.rectangle([x + step, y + step, x + 2 * step - 1, y + 2 * step - 1], fill=(20, 20, 22))
+    mask = Image.new('L', size, 0)
+    ImageDraw.Draw(mask).polygon(outline, fill=255)
+    image = Image.new('RGB', size, (248, 248, 246))
+    image.paste(fabric, (0, 0), mask)
+    image.save(path, 'JPEG', quality=88)
+    return kind
+
+
+def time_single(paths, repeat):
+    """Best per-image analysis time over repeat passes, in ms"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths:
+            analyze_garment_file(path)
+        best = min(best, (time.perf_counter() - start) / len(paths))
+    return best * 1000
+
+
+def pool_throughput(paths, workers):
+    """(images/s, mean submit cost in microseconds) of a JobQueue with this many workers"""
+    queue = JobQueue(workers, len(paths), start_method='forkserver' if os.name == 'posix' else 'spawn')
+    # Start the workers first, so process start-up is not counted
+    queue.wait(queue.submit(analyze_garment_file, paths[0]))
+
+    start = time.perf_counter()
+    job_ids = [queue.submit(analyze_garment_file, path) for path in paths]
+    submitted = time.perf_counter() - start
+    for job_id in job_ids:
+        queue.wait(job_id)
+    elapsed = time.perf_counter() - start
+    failed = queue.stats()['failed']
+    queue.shutdown()
+    if failed:
+        raise RuntimeError(f'{failed} analyses failed')
+    return len(paths) / elapsed, submitted / len(paths) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=200, help='images in the throughput run')
+    parser.add_argument('--workers', default=','.join(str(n) for n in sorted({1, 2, min(4, os.cpu_count() or 1)})))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    rng = random.Random(3)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'input':<12}{'ms/image':>10}  detected")
+        for size in SIZES:
+            paths = [os.path.join(tmp, f'{size[0]}x{size[1]}_{index}.jpg') for index in range(6)]
+            kinds = [make_garment(path, size, rng) for path in paths]
+            report = analyze_garment_file(paths[0])
+            print(f"{size[0]}x{size[1]:<7}{time_single(paths, args.repeat):>10.2f}  "
+                  f"{kinds[0]} -> {report['color']}, {report['pattern']} ({report['pattern_score']})")
+
+        paths = [os.path.join(tmp, f'bulk_{index}.jpg') for index in range(args.images)]
+        for path in paths:
+            make_garment(path, SIZES[0], rng)
+        inline_ms = time_single(paths[:20], 1)
+        print(f"\n{args.images} uploads of {SIZES[0][0]}x{SIZES[0][1]}: inline analysis adds {inline_ms:.2f} ms per add_clothes")
+        print(f"{'workers':<9}{'images/s':>10}{'submit us':>11}")
+        for workers in [int(n) for n in args.workers.split(',')]:
+            rate, submit_us = pool_throughput(paths, workers)
+            print(f"{workers:<9}{rate:>10.1f}{submit_us:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+City Resolver Benchmark
+Builds a CityIndex over a synthetic gazetteer (the ten weather cities plus
+generated names with populations) and times exact, prefix, word prefix
+and misspelled lookups, next to the old linear substring scan from
+get_mock_weather.
+
+Usage: python benchmarks/bench_cities.py [--cities N] [--repeat R]
+"""
+
+import argparse
+import random
+import time
+
+from bench_utils import add_backend_to_path
+
+add_backend_to_path()
+
+from cities import CityIndex, normalize_name  # noqa: E402
+from weather import MOCK_CITIES  # noqa: E402
+
+SYLLABLES = ['ka', 'lo', 'mi', 'san', 'ber', 'to', 'ri', 'an', 'del', 'mar', 'ville', 'burg', 'ton', 'sa', 'no',
+             'pe', 'chi', 'ra', 'go', 'lin', 'ha', 'ven', 'por', 'ta', 'os', 'er', 'ak', 'shi', 'ma', 'da']
+QUERIES = [
+    ('exact', 'London'),
+    ('exact', 'Los Angeles'),
+    ('prefix', 'san'),
+    ('prefix', 'Mum'),
+    ('word prefix', 'york'),
+    ('single letter', 'k'),
+    ('typo', 'Londn'),
+    ('typo', 'Sidney'),
+    ('typo', 'Singapor'),
+    ('unknown', 'Qwertyuiop')
+]
+
+
+def make_names(count):
+    """Random pronounceable names, some with two words, with populations"""
+    rng = random.Random(5)
+    names = [name.title() for name in MOCK_CITIES]
+    weights = [10_000_000] * len(names)
+    while len(names) < count:
+        words = [''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+                 for _ in range(1 if rng.random() < 0.8 else 2)]
+        names.append(' '.join(words))
+        weights.append(int(rng.paretovariate(1.2) * 1000))
+    return names, weights
+
+
+def substring_scan(keys, query):
+    """The old lookup: first name containing (or contained in) the query"""
+    query = query.lower().strip()
+    for index, key in enumerate(keys):
+        if key in query or query in key:
+            return index
+    return None
+
+
+def timed_us(function, repeat):
+    """Mean microseconds per call"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cities', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    names, weights = make_names(args.cities)
+    start = time.perf_counter()
+    index = CityIndex(names, weights)
+    print(f"Index build for {len(names):,} cities: {(time.perf_counter() - start) * 1000:.0f} ms")
+    keys = [normalize_name(name) for name in names]
+
+    print(f"{'case':<14}{'query':<14}{'search us':>11}{'resolve us':>12}{'scan us':>10}  best match (old scan)")
+    for case, query in QUERIES:
+        search_us = timed_us(lambda: index.search(query, 8), args.repeat)
+        resolve_us = timed_us(lambda: index.resolve(query), args.repeat)
+        scan_us = timed_us(lambda: substring_scan(keys, query), max(1, args.repeat // 10))
+        matches = index.search(query, 8)
+        best = f'{names[matches[0][0]]} ({matches[0][1]})' if matches else '-'
+        old = substring_scan(keys, query)
+        print(f"{case:<14}{query:<14}{search_us:>11.1f}{resolve_us:>12.1f}{scan_us:>10.0f}  "
+              f"{best} ({names[old] if old is not None else '-'})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Compositing Benchmark
+Compares the original PIL layer stack (blank RGBA + garment layer +
+alpha_composite + masked paste onto RGB) with compositing.composite_garment.
+Reports time per megapixel, peak RSS growth (fresh process per run) and
+whether both paths produce identical pixels.
+
+Usage: python benchmarks/bench_compositing.py [--repeat N]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from bench_utils import add_backend_to_path, peak_rss_kb
+
+add_backend_to_path()
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from compositing import composite_garment  # noqa: E402
+from imaging import torso_placement  # noqa: E402
+
+SIZES = [(512, 768), (1024, 1536), (2048, 3072), (4096, 6144)]
+GARMENT_KINDS = ['opaque', 'cutout', 'noisy']
+
+
+def legacy_composite(person, garment_resized, offset):
+    """The composite mock_ai_cloth_change used before the NumPy engine"""
+    result = Image.new('RGBA', person.size, (255, 255, 255, 0))
+    result.paste(person, (0, 0))
+    garment_layer = Image.new('RGBA', person.size, (255, 255, 255, 0))
+    garment_layer.paste(garment_resized, offset)
+    result = Image.alpha_composite(result, garment_layer)
+    result_rgb = Image.new('RGB', result.size, (255, 255, 255))
+    result_rgb.paste(result, mask=result.split()[3])
+    return result_rgb
+
+
+def make_inputs(size, garment_kind='cutout', transparent_person=False):
+    """
+    Synthetic person photo and an already-placed garment
+    - opaque: garment without transparency (e.g. a JPEG upload)
+    - cutout: opaque ellipse with an anti-aliased edge on a transparent background
+    - noisy: 30% of garment pixels partially transparent (worst case)
+    """
+    rng = np.random.default_rng(42)
+    person = rng.integers(0, 256, (size[1], size[0], 4), dtype=np.uint8)
+    if not transparent_person:
+        person[..., 3] = 255
+
+    (garment_width, garment_height), offset = torso_placement(size, (600, 800))
+    garment = rng.integers(0, 256, (garment_height, garment_width, 4), dtype=np.uint8)
+    if garment_kind == 'opaque':
+        garment[..., 3] = 255
+    elif garment_kind == 'cutout':
+        yy, xx = np.ogrid[:garment_height, :garment_width]
+        distance = np.hypot((xx - garment_width / 2) / (garment_width / 2),
+                            (yy - garment_height / 2) / (garment_height / 2))
+        edge = max(garment_width, garment_height) / 2
+        garment[..., 3] = np.clip((1 - distance) * edge / 2, 0, 1) * 255
+    else:
+        garment[..., 3] = np.where(rng.random((garment_height, garment_width)) < 0.7, 255, garment[..., 3])
+    return Image.fromarray(person), Image.fromarray(garment), offset
+
+
+def run_child(variant, garment_kind, width, height, repeat):
+    """Time one variant in this (fresh) process and print JSON"""
+    person, garment, offset = make_inputs((width, height), garment_kind)
+    compose = legacy_composite if variant == 'legacy' else composite_garment
+
+    baseline_kb = peak_rss_kb()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = compose(person, garment, offset)
+        timings.append(time.perf_counter() - start)
+        del result
+    peak_kb = peak_rss_kb()
+
+    megapixels = width * height / 1e6
+    print(json.dumps({
+        'ms_per_mp': round(min(timings) * 1000 / megapixels, 2),
+        'peak_rss_delta_mb': round((peak_kb - baseline_kb) / 1024, 1),
+        'frame_mb': round(width * height * 4 / (1024 * 1024), 1)
+    }))
+
+
+def measure(variant, garment_kind, size, repeat):
+    """Run a variant in a subprocess and parse its JSON report"""
+    output = subprocess.run(
+        [sys.executable, __file__, '--child', variant, garment_kind, str(size[0]), str(size[1]),
+         '--repeat', str(repeat)],
+        check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def check_identical():
+    """Compare both paths on opaque and transparent person images"""
+    for garment_kind in GARMENT_KINDS:
+        for transparent in (False, True):
+            person, garment, offset = make_inputs((640, 960), garment_kind, transparent)
+            expected = np.asarray(legacy_composite(person, garment, offset))
+            actual = np.asarray(composite_garment(person, garment, offset))
+            if not np.array_equal(expected, actual):
+                return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--child', nargs=4, metavar=('VARIANT', 'GARMENT', 'WIDTH', 'HEIGHT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], args.child[1], int(args.child[2]), int(args.child[3]), args.repeat)
+        return
+
+    print(f"Identical output: {check_identical()}")
+    print("'frames' is peak RSS growth in units of one full-size RGBA buffer")
+    print(f"{'garment':<9}{'person':<12}{'frame MB':>9}{'variant':>9}{'ms/MP':>9}{'peak RSS MB':>13}{'frames':>8}")
+    for garment_kind in GARMENT_KINDS:
+        for size in SIZES:
+            for variant in ('legacy', 'numpy'):
+                report = measure(variant, garment_kind, size, args.repeat)
+                frames = report['peak_rss_delta_mb'] / report['frame_mb']
+                print(f"{garment_kind:<9}{size[0]}x{size[1]:<7}{report['frame_mb']:>9}{variant:>9}"
+                      f"{report['ms_per_mp']:>9}{report['peak_rss_delta_mb']:>13}{frames:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
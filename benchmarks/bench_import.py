@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Import Benchmark
+Compares inserting a wardrobe one item at a time (what POST /add_clothes
+does per request) with bulk.import_items at several batch sizes.
+Reports items per second for each path.
+
+Only the database side is timed; the one-at-a-time path additionally pays
+one HTTP round trip per item in production.
+Uses BENCH_MONGODB_URI (default mongodb://localhost:27017) when a server answers,
+otherwise mongomock, which has no network round trips and understates the gap.
+
+Usage: python benchmarks/bench_import.py [--items N] [--mongomock]
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime
+
+from bench_utils import add_backend_to_path, connect_clothes
+
+add_backend_to_path()
+
+from bulk import import_items, iter_array  # noqa: E402
+
+BATCH_SIZES = [50, 500, 2000]
+
+
+def make_items(count):
+    """Synthetic items shaped like the ones the frontend stores"""
+    rng = random.Random(11)
+    return [{
+        'name': f'Item {i}',
+        'category': rng.choice(['topwear', 'bottomwear', 'footwear', 'outerwear']),
+        'color': rng.choice(['black', 'white', 'blue', 'red', 'beige']),
+        'season': rng.choice(['summer', 'winter', 'all-season']),
+        'occasion': ['casual'],
+        'favorite': False,
+        'image': f'assets/uploads/item{i}.jpg'
+    } for i in range(count)]
+
+
+def one_at_a_time(collection, items):
+    """The add_clothes path: one insert_one per item"""
+    for item in items:
+        document = dict(item)
+        document['created_at'] = datetime.now().isoformat()
+        collection.insert_one(document)
+
+
+def timed(label, collection, run, count):
+    """Run against an empty collection and print items/s"""
+    collection.delete_many({})
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    stored = collection.count_documents({})
+    print(f"{label:<24}{elapsed:>10.2f}{count / elapsed:>14,.0f}{stored:>10}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=20_000)
+    parser.add_argument('--mongomock', action='store_true', help='Use mongomock even if a server is available')
+    args = parser.parse_args()
+
+    collection, backend = connect_clothes(args.mongomock)
+    items = make_items(args.items)
+    print(f"Backend: {backend}")
+    print(f"{'path':<24}{'seconds':>10}{'items/s':>14}{'stored':>10}")
+
+    baseline = timed('insert_one per item', collection, lambda: one_at_a_time(collection, items), args.items)
+    for batch_size in BATCH_SIZES:
+        elapsed = timed(f'import_items batch={batch_size}', collection,
+                        lambda: import_items(collection, iter_array(items), batch_size), args.items)
+        print(f"{'':<24}{'speedup':>10}{baseline / elapsed:>13.1f}x")
+
+    collection.drop()
+
+
+if __name__ == '__main__':
+    main()
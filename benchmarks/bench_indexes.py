@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Index Benchmark
+Seeds a throwaway database with wardrobe items and times the listing
+queries of EXPLAIN_PATTERNS without indexes and after ensure_indexes(),
+together with the documents each plan examined.
+
+Needs a MongoDB server for meaningful numbers (BENCH_MONGODB_URI, default
+mongodb://localhost:27017). Without one it falls back to mongomock, which
+ignores indexes, so both columns only show the in-process query cost.
+
+Usage: python benchmarks/bench_indexes.py [--items N] [--repeat N] [--mongomock]
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from bench_utils import add_backend_to_path, connect_clothes
+
+add_backend_to_path()
+
+from wardrobe import EXPLAIN_PATTERNS, build_list_query, ensure_indexes, explain_query, fetch_page  # noqa: E402
+
+CATEGORIES = ['shirt', 'tshirt', 'jeans', 'trousers', 'jacket', 'dress', 'skirt', 'shoes', 'sweater', 'shorts']
+COLORS = ['blue', 'black', 'white', 'red', 'green', 'grey', 'beige', 'brown', 'pink', 'yellow']
+SEASONS = ['summer', 'winter', 'spring', 'autumn', 'all']
+OWNERS = 200
+
+
+def seed(collection, count):
+    """Insert count synthetic items"""
+    rng = random.Random(7)
+    start = datetime(2024, 1, 1)
+    batch = []
+    for i in range(count):
+        batch.append({
+            'name': f'Item {i}',
+            'owner': f'owner{rng.randrange(OWNERS)}',
+            'category': rng.choice(CATEGORIES),
+            'color': rng.choice(COLORS),
+            'season': rng.choice(SEASONS),
+            'image': f'/assets/uploads/item{i}.png',
+            'created_at': (start + timedelta(minutes=rng.randrange(600_000))).isoformat()
+        })
+        if len(batch) == 5000:
+            collection.insert_many(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch)
+
+
+def pattern_args(args):
+    """EXPLAIN_PATTERNS use placeholder owners; point them at a seeded owner"""
+    return {key: ('owner7' if key == 'owner' else value) for key, value in args.items()}
+
+
+def measure(collection, args, repeat):
+    """Best time for the first page of a pattern, plus its plan summary"""
+    query = build_list_query(pattern_args(args))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fetch_page(collection, query)
+        timings.append(time.perf_counter() - start)
+    try:
+        plan = explain_query(collection, query)
+    except Exception:
+        plan = {}
+    return min(timings) * 1000, plan
+
+
+def describe(plan):
+    """Short plan description for the table"""
+    if not plan:
+        return '-', '-'
+    kind = 'COLLSCAN' if plan['collection_scan'] else ('covered' if plan['covered'] else 'IXSCAN')
+    if plan['in_memory_sort']:
+        kind += '+SORT'
+    return kind, plan['docs_examined']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--mongomock', action='store_true', help='Use mongomock even if a server is available')
+    args = parser.parse_args()
+
+    collection, backend = connect_clothes(args.mongomock)
+    print(f"Backend: {backend}" + (' (indexes are not used)' if backend == 'mongomock' else ''))
+    collection.drop()
+    start = time.perf_counter()
+    seed(collection, args.items)
+    print(f"Seeded {args.items:,} items in {time.perf_counter() - start:.1f}s")
+
+    baseline = {name: measure(collection, pattern, args.repeat) for name, pattern in EXPLAIN_PATTERNS.items()}
+    start = time.perf_counter()
+    ensure_indexes(collection)
+    print(f"Built indexes in {time.perf_counter() - start:.1f}s\n")
+    indexed = {name: measure(collection, pattern, args.repeat) for name, pattern in EXPLAIN_PATTERNS.items()}
+
+    print(f"{'pattern':<28}{'no index ms':>12}{'plan':>14}{'docs':>8}{'indexed ms':>12}{'plan':>14}{'docs':>8}")
+    for name in EXPLAIN_PATTERNS:
+        before_ms, before_plan = baseline[name]
+        after_ms, after_plan = indexed[name]
+        before_kind, before_docs = describe(before_plan)
+        after_kind, after_docs = describe(after_plan)
+        print(f"{name:<28}{before_ms:>12.2f}{before_kind:>14}{before_docs:>8}"
+              f"{after_ms:>12.2f}{after_kind:>14}{after_docs:>8}")
+
+    collection.drop()
+
+
+if __name__ == '__main__':
+    main()
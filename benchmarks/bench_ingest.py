@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Image Ingest Benchmark
+Compares the original decode path (full decode -> RGBA -> thumbnail) with
+ingest.load_image (draft decode -> thumbnail -> RGBA) on synthetic photos.
+Each measurement runs in a fresh interpreter so peak RSS is per request.
+
+Usage: python benchmarks/bench_ingest.py [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_utils import add_backend_to_path, peak_rss_kb
+
+add_backend_to_path()
+
+from PIL import Image  # noqa: E402
+
+SIZES = [(1200, 900), (3000, 2000), (4000, 3000), (6000, 4000)]
+MAX_SIZE = 1024
+
+
+def legacy_load(path):
+    """The decode path mock_ai_cloth_change used before ingest.load_image"""
+    image = Image.open(path).convert('RGBA')
+    if image.width > MAX_SIZE or image.height > MAX_SIZE:
+        image.thumbnail((MAX_SIZE, MAX_SIZE), Image.Resampling.LANCZOS)
+    return image
+
+
+def ingest_load(path):
+    """The current decode path"""
+    from ingest import load_image
+    return load_image(path, MAX_SIZE)
+
+
+def make_photo(path, size, fmt):
+    """Write a synthetic photo-like image (noise over a gradient)"""
+    noise = Image.effect_noise(size, 48)
+    gradient = Image.linear_gradient('L').resize(size)
+    image = Image.merge('RGB', (noise, gradient, Image.blend(noise, gradient, 0.5)))
+    image.save(path, fmt, quality=90) if fmt == 'JPEG' else image.save(path, fmt)
+
+
+def run_child(variant, path, repeat):
+    """Measure one variant in this (fresh) process and print JSON"""
+    loader = legacy_load if variant == 'legacy' else ingest_load
+    if variant == 'ingest':
+        import ingest  # noqa: F401
+    baseline_kb = peak_rss_kb()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        image = loader(path)
+        timings.append(time.perf_counter() - start)
+        size = image.size
+        del image
+    peak_kb = peak_rss_kb()
+    print(json.dumps({
+        'best_ms': round(min(timings) * 1000, 2),
+        'peak_rss_delta_mb': round((peak_kb - baseline_kb) / 1024, 1),
+        'output_size': size
+    }))
+
+
+def measure(variant, path, repeat):
+    """Run a variant in a subprocess and parse its JSON report"""
+    output = subprocess.run(
+        [sys.executable, __file__, '--child', variant, path, '--repeat', str(repeat)],
+        check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', nargs=2, metavar=('VARIANT', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], args.child[1], args.repeat)
+        return
+
+    print(f"{'input':<18}{'variant':<9}{'best ms':>10}{'peak RSS MB':>14}  output")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt, ext in (('JPEG', 'jpg'), ('PNG', 'png')):
+            for size in SIZES:
+                path = os.path.join(tmp, f'photo_{size[0]}x{size[1]}.{ext}')
+                make_photo(path, size, fmt)
+                label = f'{size[0]}x{size[1]} {ext}'
+                for variant in ('legacy', 'ingest'):
+                    report = measure(variant, path, args.repeat)
+                    print(f"{label:<18}{variant:<9}{report['best_ms']:>10}"
+                          f"{report['peak_rss_delta_mb']:>14}  {tuple(report['output_size'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Outfit Ranking Benchmark
+Compares OutfitScorer.rank (best-first search) and OutfitGenerator
+(NumPy blocks with branch and bound) with a naive ranking that scores
+every top x bottom x footwear combination by scanning the combination and
+pattern rule lists (what the AI stylist page does per candidate).
+Checks that all return the same top scores, then times wardrobes of
+growing size; the naive scan is skipped once the product gets too large.
+
+Usage: python benchmarks/bench_outfits.py [--limit K] [--naive-max N]
+"""
+
+import argparse
+import os
+import random
+import time
+
+from bench_utils import BACKEND_DIR, add_backend_to_path
+
+add_backend_to_path()
+
+from outfit_generator import OutfitGenerator  # noqa: E402
+from outfits import (BASE_SCORE, OUTFIT_SLOTS, SOLID_PATTERN_POINTS, UNMATCHED_COLOR_POINTS,  # noqa: E402
+                     OutfitScorer)
+
+DATA_PATH = os.path.join(os.path.dirname(BACKEND_DIR), 'frontend', 'outfit-intelligence-data.js')
+
+COLORS = ['white', 'black', 'navy', 'light-blue', 'yellow', 'maroon', 'light-green', 'bottle-green', 'red',
+          'blue', 'grey', 'beige', 'olive', 'pink', 'brown', 'blackish-white', 'canvas', 'sandal']
+NAMES = {
+    'topwear': ['t-shirt', 'polo', 'shirt', 'checked shirt', 'striped tee', 'printed shirt', 'hoodie', 'kurta', 'blazer'],
+    'bottomwear': ['jeans', 'baggy-jeans', 'dress-pants', 'chinos', 'check-pattern trousers', 'shorts', 'pajamas'],
+    'footwear': ['canvas', 'sandal', 'chelsea-boots', 'sneakers', 'loafers']
+}
+SEASONS = ['summer', 'winter', 'all-season']
+SIZES = [(10, 10, 5), (30, 30, 15), (100, 100, 50), (1000, 1000, 500), (3000, 3000, 1500), (10000, 10000, 5000)]
+
+
+def make_wardrobe(tops, bottoms, shoes):
+    """Random wardrobe with the given number of items per slot"""
+    rng = random.Random(3)
+    items = []
+    for slot, count in zip(OUTFIT_SLOTS, (tops, bottoms, shoes)):
+        for i in range(count):
+            items.append({
+                'id': f'{slot}-{i}',
+                'name': f'{rng.choice(COLORS)} {rng.choice(NAMES[slot])}',
+                'category': slot,
+                'color': rng.choice(COLORS),
+                'season': rng.choice(SEASONS)
+            })
+    return items
+
+
+def naive_rank(scorer, items, context, limit):
+    """Score the full cross-product with linear rule scans, then sort"""
+    slots = [[item for item in items if item['category'] == slot] for slot in OUTFIT_SLOTS]
+    scored = []
+    for top in slots[0]:
+        for bottom in slots[1]:
+            for shoe in slots[2]:
+                outfit = (top, bottom, shoe)
+                colors = [(item.get('color') or '').lower() for item in outfit]
+                score = BASE_SCORE + UNMATCHED_COLOR_POINTS
+                for combination, points, _ in scorer.combinations:
+                    if all(not combination.get(key) or combination[key].lower() in color
+                           for key, color in zip(('top', 'bottom', 'footwear'), colors)):
+                        score += points - UNMATCHED_COLOR_POINTS
+                        break
+
+                patterns = [scorer.pattern_of(item['name']) for item in outfit]
+                pattern_points = SOLID_PATTERN_POINTS
+                for rule in scorer.pattern_rules:
+                    if all(scorer._pattern_matches(rule.get(key), pattern)
+                           for key, pattern in zip(('top', 'bottom', 'footwear'), patterns)):
+                        pattern_points = rule.get('score', 0)
+                        break
+                score += pattern_points
+
+                for item in outfit:
+                    score += scorer.item_points(item, context)[0]
+                scored.append(max(0, min(100, round(score))))
+    scored.sort(reverse=True)
+    return scored[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--naive-max', type=int, default=200_000, help='Largest cross-product to run the naive scan on')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    OutfitScorer.from_file(DATA_PATH)
+    print(f"Loading and compiling rules: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    print(f"{'tops x bottoms x shoes':<24}{'combinations':>16}{'naive ms':>12}{'rank ms':>10}"
+          f"{'generate ms':>13}{'same top-K':>12}")
+    for size in SIZES:
+        items = make_wardrobe(*size)
+        combinations = size[0] * size[1] * size[2]
+
+        # A fresh scorer per size so memoised lookups do not carry over
+        scorer = OutfitScorer.from_file(DATA_PATH)
+        context = scorer.context(temperature=28, event='hangout')
+        start = time.perf_counter()
+        _, best = scorer.rank(items, context, args.limit)
+        rank_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        generated = [outfit for chunk in OutfitGenerator(scorer, items, context).iter_outfits(args.limit)
+                     for outfit in chunk]
+        generate_ms = (time.perf_counter() - start) * 1000
+
+        ranked = [score for score, _, _ in best]
+        same = ranked == [score for score, _, _ in generated]
+        naive_ms = '-'
+        if combinations <= args.naive_max:
+            start = time.perf_counter()
+            expected = naive_rank(scorer, items, context, args.limit)
+            naive_ms = f'{(time.perf_counter() - start) * 1000:.1f}'
+            same = same and expected == ranked
+
+        label = ' x '.join(str(count) for count in size)
+        print(f"{label:<24}{combinations:>16,}{naive_ms:>12}{rank_ms:>10.1f}{generate_ms:>13.1f}{str(same):>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Similarity Index Benchmark
+Builds similarity indexes of synthetic feature rows and times opening
+(memory-mapping) them, one query at a time and batched queries, next to
+describing every image on each query (what "find similar" would cost
+without an index).
+
+Usage: python benchmarks/bench_similarity.py [--rows 10000,100000,1000000] [--batch 16]
+"""
+
+import argparse
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from bench_utils import add_backend_to_path, peak_rss_kb
+
+add_backend_to_path()
+
+from PIL import Image  # noqa: E402
+
+from similarity import HASH_BYTES, HISTOGRAM_BINS, SimilarityIndex, image_features  # noqa: E402
+
+
+def random_rows(count, rng):
+    """Feature rows with random hashes and random sqrt-normalised histograms"""
+    hashes = rng.integers(0, 256, (count, HASH_BYTES), dtype=np.uint8)
+    counts = rng.random((count, HISTOGRAM_BINS)) ** 4
+    hists = np.rint(np.sqrt(counts / counts.sum(axis=1, keepdims=True)) * 255).astype(np.uint8)
+    return np.concatenate([hashes, hists], axis=1)
+
+
+def build_index(path, count, rng):
+    """Write an index file pair directly (appending row by row would dominate the run)"""
+    SimilarityIndex(path)  # header
+    with open(path, 'ab') as f:
+        for start in range(0, count, 100000):
+            f.write(random_rows(min(100000, count - start), rng).tobytes())
+    with open(path + '.keys', 'w') as f:
+        f.writelines(f'assets/uploads/{index:02x}/item_{index}.jpg\n' for index in range(count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', default='10000,100000,1000000')
+    parser.add_argument('--batch', type=int, default=16)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+    rng = np.random.default_rng(11)
+
+    photo = io.BytesIO()
+    Image.effect_noise((688, 1024), 40).convert('RGB').save(photo, 'JPEG', quality=88)
+    start = time.perf_counter()
+    for _ in range(20):
+        image_features(photo.getvalue())
+    describe_ms = (time.perf_counter() - start) / 20 * 1000
+    print(f'Describing one 688x1024 JPEG: {describe_ms:.2f} ms (an index-less query repeats this per image)\n')
+
+    print(f"{'rows':>9}{'open ms':>9}{'1 query ms':>12}{f'{args.batch} queries ms':>16}{'per query':>11}"
+          f"{'no index s':>12}{'RSS MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in [int(value) for value in args.rows.split(',')]:
+            path = os.path.join(tmp, f'index_{count}')
+            build_index(path, count, rng)
+            queries = [row.tobytes() for row in random_rows(args.batch, rng)]
+
+            start = time.perf_counter()
+            index = SimilarityIndex(path)
+            open_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            for query in queries:
+                index.search([query], args.k)
+            single_ms = (time.perf_counter() - start) / len(queries) * 1000
+            start = time.perf_counter()
+            index.search(queries, args.k)
+            batch_ms = (time.perf_counter() - start) * 1000
+
+            print(f'{count:>9}{open_ms:>9.1f}{single_ms:>12.2f}{batch_ms:>16.2f}{batch_ms / len(queries):>11.2f}'
+                  f'{describe_ms * count / 1000:>12.1f}{peak_rss_kb() / 1024:>8.0f}')
+
+
+if __name__ == '__main__':
+    main()
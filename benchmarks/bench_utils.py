@@ -0,0 +1,53 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+
+import os
+import resource
+import sys
+
+BENCH_DATABASE = 'smartwardrobe_bench'
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+
+
+def add_backend_to_path():
+    """Make backend modules importable from the benchmark scripts"""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+
+
+def peak_rss_kb():
+    """
+    Peak resident set size of this process in KB
+    Prefers VmHWM, because ru_maxrss survives exec on Linux and would
+    report the parent's peak (which generated the large test images)
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def connect_clothes(use_mongomock=False):
+    """
+    Clothes collection in a throwaway benchmark database
+    Uses BENCH_MONGODB_URI (default mongodb://localhost:27017) when a server answers,
+    otherwise mongomock; returns (collection, backend description)
+    """
+    if not use_mongomock:
+        from pymongo import MongoClient
+        from pymongo.errors import PyMongoError
+        client = MongoClient(os.environ.get('BENCH_MONGODB_URI', 'mongodb://localhost:27017'), serverSelectionTimeoutMS=2000)
+        try:
+            client.admin.command('ping')
+            return client[BENCH_DATABASE]['clothes'], 'mongod ' + client.server_info()['version']
+        except PyMongoError as e:
+            print(f"No MongoDB server ({e.__class__.__name__}); falling back to mongomock")
+
+    import mongomock
+    return mongomock.MongoClient()[BENCH_DATABASE]['clothes'], 'mongomock'
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Image Variant Benchmark
+Shows what the wardrobe grid saves by loading 240px/480px variants
+instead of the original photos: bytes per image, render time for the
+first request, and the cached path (store lookup) afterwards.
+
+Usage: python benchmarks/bench_variants.py [--repeat N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from bench_utils import add_backend_to_path
+
+add_backend_to_path()
+
+from PIL import Image  # noqa: E402
+
+from storage import FileStore  # noqa: E402
+from variants import VariantCache, render_variant, variant_key  # noqa: E402
+
+SIZES = [(800, 1000), (2000, 2500), (3000, 4000)]
+WIDTHS = [240, 480]
+
+
+def make_photo(path, size):
+    """Noisy gradient JPEG, compressing roughly like a product photo"""
+    width, height = size
+    rng = np.random.default_rng(7)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+    pixels = np.clip(pixels + rng.integers(-12, 12, pixels.shape), 0, 255).astype(np.uint8)
+    Image.fromarray(pixels).save(path, 'JPEG', quality=90)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = VariantCache(FileStore(os.path.join(directory, 'derived'), None, 1 << 30), 2)
+        print(f"{'source':<14}{'original KB':>13}{'width':>7}{'webp KB':>9}{'jpeg KB':>9}{'render ms':>11}{'cached ms':>11}")
+        for size in SIZES:
+            source = os.path.join(directory, f'{size[0]}x{size[1]}.jpg')
+            make_photo(source, size)
+            with open(source, 'rb') as f:
+                data = f.read()
+
+            for width in WIDTHS:
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    webp = render_variant(data, width, 'webp')
+                render_ms = (time.perf_counter() - start) / args.repeat * 1000
+                jpeg = render_variant(data, width, 'jpeg')
+
+                key = variant_key(source, width, 'webp')
+                cache.request(key, source, width, 'webp').result()
+                start = time.perf_counter()
+                for _ in range(args.repeat * 20):
+                    cache.request(variant_key(source, width, 'webp'), source, width, 'webp').result()
+                cached_ms = (time.perf_counter() - start) / (args.repeat * 20) * 1000
+
+                label = f'{size[0]}x{size[1]}'
+                print(f"{label:<14}{len(data) / 1024:>13.0f}{width:>7}{len(webp) / 1024:>9.1f}{len(jpeg) / 1024:>9.1f}"
+                      f"{render_ms:>11.1f}{cached_ms:>11.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Weather Dataset Benchmark
+Writes a synthetic dataset (N cities x D days) and compares, each in a
+fresh process, opening it with DatasetWeatherProvider against loading the
+same data as a per-process dict of records (what a StaticWeatherProvider
+over a large JSON file would hold). Reports load time, resident memory
+added (private, and file-backed pages shared by all workers), and
+current/forecast lookup latency.
+
+Usage: python benchmarks/bench_weather.py [--cities N] [--days D]
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+from bench_utils import add_backend_to_path
+
+add_backend_to_path()
+
+from weather_providers import DatasetWeatherProvider, StaticWeatherProvider, write_dataset  # noqa: E402
+
+CONDITIONS = [('Clear', 'clear sky'), ('Clouds', 'few clouds'), ('Clouds', 'overcast clouds'), ('Rain', 'light rain'),
+              ('Rain', 'moderate rain'), ('Snow', 'light snow'), ('Drizzle', 'drizzle'), ('Thunderstorm', 'thunderstorm')]
+LOOKUPS = 20_000
+
+
+def make_cities(count, days):
+    """Synthetic cities with a random walk of daily weather"""
+    rng = random.Random(17)
+    for i in range(count):
+        temp = rng.uniform(-15, 38)
+        city_days = []
+        for _ in range(days):
+            temp += rng.uniform(-3, 3)
+            condition, description = rng.choice(CONDITIONS)
+            city_days.append({
+                'temp': round(temp, 1),
+                'feels_like': round(temp - rng.uniform(0, 4), 1),
+                'humidity': rng.randint(20, 100),
+                'wind_speed': round(rng.uniform(0, 15), 1),
+                'condition': condition,
+                'description': description
+            })
+        yield {'name': f'City {i}', 'population': rng.randint(1000, 10_000_000), 'days': city_days}
+
+
+def rss_kb():
+    """Current (private, file-backed) resident memory in KB; file pages are shared between processes"""
+    usage = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(('RssAnon:', 'RssFile:')):
+                usage[line.split(':')[0]] = int(line.split()[1])
+    return usage.get('RssAnon', 0), usage.get('RssFile', 0)
+
+
+def child(kind, path):
+    """Load one way in this (fresh) process and print a JSON report"""
+    before = rss_kb()
+    start = time.perf_counter()
+    if kind == 'mmap':
+        provider = DatasetWeatherProvider(path)
+        count = provider.city_count
+    else:
+        with open(path) as f:
+            cities = json.load(f)
+        provider = StaticWeatherProvider(cities)
+        count = len(cities)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    rng = random.Random(1)
+    entries = [rng.randrange(count) for _ in range(LOOKUPS)]
+    start = time.perf_counter()
+    for entry in entries:
+        provider.current(entry)
+    current_us = (time.perf_counter() - start) / LOOKUPS * 1e6
+    start = time.perf_counter()
+    for entry in entries[:LOOKUPS // 10]:
+        provider.forecast(entry, 7)
+    forecast_us = (time.perf_counter() - start) / (LOOKUPS // 10) * 1e6
+
+    after = rss_kb()
+    print(json.dumps({'load_ms': load_ms, 'private_mb': (after[0] - before[0]) / 1024,
+                      'shared_mb': (after[1] - before[1]) / 1024,
+                      'current_us': current_us, 'forecast_us': forecast_us}))
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        child(sys.argv[2], sys.argv[3])
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cities', type=int, default=100_000)
+    parser.add_argument('--days', type=int, default=14)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        dataset_path = os.path.join(directory, 'weather.bin')
+        json_path = os.path.join(directory, 'weather.json')
+
+        start = time.perf_counter()
+        write_dataset(dataset_path, make_cities(args.cities, args.days), date.today(), args.days)
+        print(f"Dataset for {args.cities:,} cities x {args.days} days: {os.path.getsize(dataset_path) / 2**20:.1f} MB, "
+              f"written in {time.perf_counter() - start:.1f} s")
+
+        # The dict variant holds today's record per city (the static provider has no forecast)
+        with open(json_path, 'w') as f:
+            json.dump({city['name']: {
+                'main': {key: city['days'][0][key] for key in ('temp', 'feels_like', 'humidity')},
+                'weather': [{'main': city['days'][0]['condition'], 'description': city['days'][0]['description']}],
+                'wind': {'speed': city['days'][0]['wind_speed']}
+            } for city in make_cities(args.cities, 1)}, f)
+        print(f"JSON with today only: {os.path.getsize(json_path) / 2**20:.1f} MB")
+
+        print(f"{'provider':<22}{'load ms':>10}{'private MB':>12}{'shared MB':>11}{'current us':>12}{'forecast us':>13}")
+        for kind, path in (('mmap', dataset_path), ('dict', json_path)):
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', kind, path],
+                                    capture_output=True, text=True, check=True).stdout
+            report = json.loads(output)
+            label = 'DatasetWeatherProvider' if kind == 'mmap' else 'dict (today only)'
+            print(f"{label:<22}{report['load_ms']:>10.1f}{report['private_mb']:>12.1f}{report['shared_mb']:>11.1f}"
+                  f"{report['current_us']:>12.2f}{report['forecast_us']:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+Load Test
+Boots the app in a child process on a free port against a throwaway
+wardrobe, then drives the main endpoints at each concurrency level and
+reports throughput, p50/p95/p99 latency, errors and the peak RSS of the
+server with its worker processes. Each --servers entry is measured in turn:
+- threaded: the Flask app on werkzeug's threaded WSGI server (a thread per
+  connection, everything rendered in the request thread)
+- async: the aiohttp server (async_server.py: Motor for the wardrobe
+  routes, renders in its process pool, other routes bridged to Flask)
+--memory-budget then lists, per scenario and server, the best throughput
+reached without the server exceeding that many MB.
+
+Scenarios:
+- change_cloth@WxH: synthetic person/garment JPEG + PNG pair per
+  resolution; every request carries a distinct garment, so each one renders
+- change_cloth_cached@WxH: the same pair every time (result cache hits)
+- clothes: GET /clothes?limit=50 (first page)
+- wardrobe_items: GET /api/wardrobe/items filtered by a random owner
+- weather_suggest: POST /api/weather/suggest for a random known city
+Wardrobe scenarios run once per --items size (the server is restarted and
+reseeded); the others run against the first size only.
+
+The wardrobe lives in BENCH_MONGODB_URI (default mongodb://localhost:27017,
+database smartwardrobe_bench) when a server answers, otherwise in mongomock
+inside the server process (mongomock_motor over the same data for the async
+server; its calls then block the event loop, so only a real MongoDB shows
+what the async wardrobe routes gain). Rendered results, uploads, image
+variants and the similarity index go to a temporary directory that the
+server removes when it stops, so runs leave the working tree untouched.
+
+--json writes the results (with machine and run details) for later runs to
+be checked against with --compare.
+
+Usage: python benchmarks/load_test.py [--items 100,10000,100000] [--concurrency 1,8,32]
+                                      [--requests N] [--resolutions 640x800,1080x1350,3024x4032]
+                                      [--scenarios a,b] [--servers threaded,async] [--memory-budget MB]
+                                      [--json out.json] [--compare baseline.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+
+import numpy as np
+import requests
+from PIL import Image, ImageDraw
+
+from bench_indexes import OWNERS, seed
+from bench_utils import BENCH_DATABASE, add_backend_to_path
+
+SERVERS = ['threaded', 'async']
+SCENARIOS = ['change_cloth', 'change_cloth_cached', 'clothes', 'wardrobe_items', 'weather_suggest']
+WARDROBE_SCENARIOS = {'clothes', 'wardrobe_items'}
+CITIES = ['London', 'New York', 'Tokyo', 'Paris', 'Dubai', 'Mumbai', 'Sydney', 'Moscow', 'Singapore', 'Los Angeles']
+# Metrics compared by --compare: name -> True when higher is better
+COMPARED = {'throughput_rps': True, 'p50_ms': False, 'p95_ms': False, 'p99_ms': False}
+# A change beyond this fraction is flagged by --compare
+REGRESSION_THRESHOLD = 0.10
+
+
+def make_person(size):
+    """Noisy gradient JPEG, compressing roughly like a photo"""
+    width, height = size
+    rng = np.random.default_rng(11)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+    pixels = np.clip(pixels + rng.integers(-12, 12, pixels.shape), 0, 255).astype(np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def make_garment(size):
+    """Cut-out garment PNG (opaque shape on a transparent background), half the person's width"""
+    width = max(16, size[0] // 2)
+    height = width * 6 // 5
+    garment = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    ImageDraw.Draw(garment).rounded_rectangle((width // 8, 0, width * 7 // 8, height - 1), radius=width // 6,
+                                              fill=(40, 90, 160, 255))
+    buffer = BytesIO()
+    garment.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def process_tree(pid):
+    """pid and the pids of all its descendants (worker pools, forkserver)"""
+    pids = [pid]
+    for parent in pids:
+        try:
+            with open(f'/proc/{parent}/task/{parent}/children') as f:
+                pids += [int(child) for child in f.read().split()]
+        except OSError:
+            pass
+    return pids
+
+
+def server_memory_kb(pid):
+    """
+    (current RSS, peak RSS) in KB of a process and its descendants
+    The peak is the sum of each process's own peak, an upper bound
+    """
+    rss = peak = None
+    for process in process_tree(pid):
+        try:
+            with open(f'/proc/{process}/status') as f:
+                for line in f:
+                    if line.startswith(('VmRSS:', 'VmHWM:')):
+                        key, value = line.split()[:2]
+                        if key == 'VmRSS:':
+                            rss = (rss or 0) + int(value)
+                        else:
+                            peak = (peak or 0) + int(value)
+        except OSError:
+            pass
+    return rss, peak
+
+
+def reset_peak_memory(pid):
+    """Restart peak RSS tracking of a process and its descendants (Linux; best effort)"""
+    for process in process_tree(pid):
+        try:
+            with open(f'/proc/{process}/clear_refs', 'w') as f:
+                f.write('5')
+        except OSError:
+            pass
+
+
+def serve(items, use_mongomock, mode):
+    """Child process: seed the wardrobe, start the app with the mode's server and print its address"""
+    uri = os.environ.get('BENCH_MONGODB_URI', 'mongodb://localhost:27017')
+    if not use_mongomock:
+        from pymongo import MongoClient
+        from pymongo.errors import PyMongoError
+        try:
+            MongoClient(uri, serverSelectionTimeoutMS=2000).admin.command('ping')
+        except PyMongoError:
+            use_mongomock = True
+
+    # The app reads its configuration at import time
+    scratch = tempfile.mkdtemp(prefix='smartwardrobe-bench-')
+    os.environ['SIMILARITY_INDEX_FILE'] = os.path.join(scratch, 'similarity-index')
+    os.environ['MONGODB_URI'] = uri
+    os.environ['MONGO_DATABASE'] = BENCH_DATABASE
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # Overload is the point of the higher concurrency levels; do not log every slow request
+    os.environ.setdefault('SLOW_REQUEST_SECONDS', '60')
+    add_backend_to_path()
+    import app as backend
+    from werkzeug.serving import make_server
+
+    # Stores are created by create_app(), so they can still be pointed at the scratch directory
+    backend.UPLOAD_FOLDER = os.path.join(scratch, 'uploads')
+    backend.RESULTS_FOLDER = os.path.join(scratch, 'results')
+    backend.DERIVED_FOLDER = os.path.join(scratch, 'derived')
+    backend.create_app()
+
+    # werkzeug logs every request at INFO unless its logger already has a level
+    logging.getLogger('werkzeug').setLevel(os.environ['LOG_LEVEL'])
+
+    if use_mongomock:
+        import mongomock
+        backend.mongo.client_class = mongomock.MongoClient
+    clothes = backend.get_clothes_collection()
+    clothes.drop()
+    seed(clothes, items)
+
+    database = 'mongomock' if use_mongomock else uri
+    try:
+        if mode == 'async':
+            asyncio.run(serve_async(backend, use_mongomock, database))
+        else:
+            server = make_server('127.0.0.1', 0, backend.app, threaded=True)
+            # shutdown() waits for serve_forever to return, so it cannot run in the handler itself
+            signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+            print(json.dumps({'port': server.server_port, 'database': database}), flush=True)
+            server.serve_forever()
+    finally:
+        # Stopping the worker pools here lets them release their semaphores and exit with the server
+        backend.job_queue.shutdown()
+        backend.analysis_queue.shutdown()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+async def serve_async(backend, use_mongomock, database):
+    """Run the aiohttp server on a free port until SIGTERM"""
+    from aiohttp import web
+    from async_server import create_app
+
+    application, server = create_app(backend)
+    if use_mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        # Same in-memory data as the Flask routes see
+        client = backend.mongo._connect()
+        server.mongo.client_class = lambda uri, **options: AsyncMongoMockClient(mock_mongo_client=client)
+
+    runner = web.AppRunner(application)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    stopped = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+    print(json.dumps({'port': port, 'database': database}), flush=True)
+    await stopped.wait()
+    # Shuts the render pool down too
+    await runner.cleanup()
+
+
+class Server:
+    """The app running in a child process"""
+
+    def __init__(self, items, use_mongomock, mode):
+        command = [sys.executable, os.path.abspath(__file__), '--serve', str(items), '--servers', mode]
+        if use_mongomock:
+            command.append('--mongomock')
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError(f'Server exited with status {self.process.wait()}')
+        details = json.loads(line)
+        self.url = f"http://127.0.0.1:{details['port']}"
+        self.database = details['database']
+
+    def stop(self):
+        # The server stops its worker pools and removes its scratch directory on SIGTERM
+        self.process.terminate()
+        self.process.wait()
+
+
+def make_requests(name, resolution, images):
+    """Function (session, base url, rng) -> response issuing one request of a scenario"""
+    if name in ('change_cloth', 'change_cloth_cached'):
+        person, garment = images[resolution]
+        unique = name == 'change_cloth'
+
+        def call(session, url, rng):
+            # Trailing bytes after the PNG end are ignored by decoders but change the cache key
+            # (random, so results cached by earlier runs are never hit either)
+            garment_bytes = garment + os.urandom(16) if unique else garment
+            return session.post(f'{url}/api/change_cloth?format=webp',
+                                files={'person': ('person.jpg', person, 'image/jpeg'),
+                                       'garment': ('garment.png', garment_bytes, 'image/png')})
+        return call
+    if name == 'clothes':
+        return lambda session, url, rng: session.get(f'{url}/clothes', params={'limit': 50})
+    if name == 'wardrobe_items':
+        return lambda session, url, rng: session.get(f'{url}/api/wardrobe/items',
+                                                     params={'owner': f'owner{rng.randrange(OWNERS)}', 'limit': 20})
+    if name == 'weather_suggest':
+        return lambda session, url, rng: session.post(f'{url}/api/weather/suggest', json={'city': rng.choice(CITIES)})
+    raise ValueError(f'Unknown scenario {name}')
+
+
+def run_scenario(server, call, concurrency, total, warmup):
+    """Issue total requests from concurrency threads; returns the summary"""
+    local = threading.local()
+    seeds = iter(range(1_000_000))
+    seed_lock = threading.Lock()
+
+    def issue(_):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+            with seed_lock:
+                local.rng = random.Random(next(seeds))
+        start = time.perf_counter()
+        try:
+            response = call(local.session, server.url, local.rng)
+            ok = response.status_code < 400
+            size = len(response.content)
+        except requests.RequestException:
+            ok, size = False, 0
+        return time.perf_counter() - start, ok, size
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(issue, range(warmup)))
+        reset_peak_memory(server.process.pid)
+        start = time.perf_counter()
+        results = list(executor.map(issue, range(total)))
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(seconds * 1000 for seconds, _, _ in results)
+    rss_kb, peak_rss_kb = server_memory_kb(server.process.pid)
+    return {
+        'concurrency': concurrency,
+        'requests': total,
+        'errors': sum(1 for _, ok, _ in results if not ok),
+        'throughput_rps': round(total / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'max_ms': round(latencies[-1], 2),
+        'mean_response_bytes': round(sum(size for _, _, size in results) / total),
+        'server_rss_kb': rss_kb,
+        'server_peak_rss_kb': peak_rss_kb
+    }
+
+
+def parse_resolution(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def result_key(result):
+    # Results written before --servers existed were all measured on the threaded server
+    return result['scenario'], result.get('server', 'threaded'), result['items'], result['concurrency']
+
+
+def compare(results, baseline_path):
+    """Print the change of each compared metric against a previous --json file"""
+    with open(baseline_path) as f:
+        baseline = {result_key(result): result for result in json.load(f)['results']}
+    print(f"\nCompared with {baseline_path} (changes beyond {REGRESSION_THRESHOLD:.0%} flagged):")
+    regressions = 0
+    for result in results:
+        previous = baseline.get(result_key(result))
+        if previous is None:
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED.items():
+            before, after = previous.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = change < -REGRESSION_THRESHOLD if higher_is_better else change > REGRESSION_THRESHOLD
+            regressions += worse
+            changes.append(f"{metric} {change:+.1%}{' !' if worse else ''}")
+        print(f"  {result['scenario']:<30}{result['server']:<10}{result['items']:>8} c={result['concurrency']:<4} "
+              + ', '.join(changes))
+    print(f"{regressions} regressed metric(s)")
+    return regressions
+
+
+def memory_budget_summary(results, budget_mb):
+    """Print, per scenario and server, the best error-free run whose peak RSS stayed within budget_mb"""
+    print(f"\nBest throughput within {budget_mb:.0f} MB peak RSS:")
+    best = {}
+    for result in results:
+        key = result['scenario'], result['items'], result['server']
+        best.setdefault(key, None)
+        peak = result['server_peak_rss_kb']
+        if result['errors'] or peak is None or peak / 1024 > budget_mb:
+            continue
+        if best[key] is None or result['throughput_rps'] > best[key]['throughput_rps']:
+            best[key] = result
+    for (scenario, items, mode), result in best.items():
+        if result is None:
+            print(f"  {scenario:<30}{mode:<10}{items:>8}  over budget at every concurrency level")
+        else:
+            print(f"  {scenario:<30}{mode:<10}{items:>8}  {result['throughput_rps']:>8.1f} req/s at c={result['concurrency']}"
+                  f" ({result['server_peak_rss_kb'] / 1024:.0f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', default='100,10000,100000', help='Wardrobe sizes (comma separated)')
+    parser.add_argument('--concurrency', default='1,8,32', help='Client threads (comma separated)')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario and concurrency')
+    parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests issued first')
+    parser.add_argument('--resolutions', default='640x800,1080x1350,3024x4032', help='Person image sizes for change_cloth')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Scenarios to run (comma separated)')
+    parser.add_argument('--servers', default=','.join(SERVERS), help='Servers to measure (comma separated)')
+    parser.add_argument('--memory-budget', type=float, help='Summarize the best throughput within this peak RSS (MB)')
+    parser.add_argument('--mongomock', action='store_true', help='Use mongomock even if a server is available')
+    parser.add_argument('--json', help='Write the results to this file')
+    parser.add_argument('--compare', help='Previous --json output to compare against')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve is not None:
+        serve(args.serve, args.mongomock, args.servers)
+        return
+
+    sizes = [int(value) for value in args.items.split(',')]
+    levels = [int(value) for value in args.concurrency.split(',')]
+    resolutions = [parse_resolution(value) for value in args.resolutions.split(',')]
+    scenarios = [name for name in args.scenarios.split(',') if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    modes = [name for name in args.servers.split(',') if name]
+    unknown = set(modes) - set(SERVERS)
+    if unknown:
+        parser.error(f"Unknown servers: {', '.join(sorted(unknown))}")
+
+    images = {resolution: (make_person(resolution), make_garment(resolution)) for resolution in resolutions}
+    results = []
+    database = None
+    print(f"{'scenario':<30}{'server':<10}{'items':>8}{'conc':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'errors':>8}{'peak RSS MB':>13}")
+    for position, items in enumerate(sizes):
+        runs = []
+        for name in scenarios:
+            if name not in WARDROBE_SCENARIOS and position > 0:
+                continue
+            if name.startswith('change_cloth'):
+                runs += [(f'{name}@{width}x{height}', make_requests(name, (width, height), images))
+                         for width, height in resolutions]
+            else:
+                runs.append((name, make_requests(name, None, images)))
+        if not runs:
+            continue
+
+        for mode in modes:
+            server = Server(items, args.mongomock, mode)
+            database = server.database
+            try:
+                for label, call in runs:
+                    for concurrency in levels:
+                        summary = run_scenario(server, call, concurrency, args.requests, args.warmup)
+                        summary = dict(scenario=label, server=mode, items=items, **summary)
+                        results.append(summary)
+                        peak = summary['server_peak_rss_kb']
+                        print(f"{label:<30}{mode:<10}{items:>8}{concurrency:>6}{summary['throughput_rps']:>9.1f}"
+                              f"{summary['p50_ms']:>9.1f}{summary['p95_ms']:>9.1f}{summary['p99_ms']:>9.1f}"
+                              f"{summary['errors']:>8}{(peak or 0) / 1024:>13.1f}")
+            finally:
+                server.stop()
+
+    if args.memory_budget:
+        memory_budget_summary(results, args.memory_budget)
+
+    if args.json:
+        report = {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'database': database,
+            'settings': {key: getattr(args, key) for key in ('items', 'concurrency', 'requests', 'warmup', 'resolutions',
+                                                             'servers')},
+            'results': results
+        }
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()